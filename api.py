@@ -1,16 +1,30 @@
 from fastapi import Body, FastAPI, Query, Request
+import asyncio
 import base64
+import bisect
+import contextvars
 import hashlib
+import heapq
+import hmac
 import html
 import httpx
 import io
+import itertools
 import json
 import logging
+import math
+import mmap
 import re
+import sqlite3
+import tempfile
 import threading
 import unicodedata
 import zipfile
-from fastapi.responses import HTMLResponse, JSONResponse
+import zlib
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager, suppress
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 import os
 import time
@@ -24,7 +38,17 @@ logging.basicConfig(
 )
 logger = logging.getLogger("ordina")
 
-app = FastAPI()
+
+@asynccontextmanager
+async def _lifespan(_app: FastAPI):
+    _start_cache_warmer()
+    yield
+    await _close_async_http_clients()
+    _save_sjf_plan_memory()
+    _save_warm_log()
+
+
+app = FastAPI(lifespan=_lifespan)
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -38,23 +62,59 @@ app.add_middleware(
 )
 
 
-@app.middleware("http")
-async def rate_limit_middleware(request: Request, call_next):
-    client_ip = (request.client.host if request.client else None) or "unknown"
-    now = time.time()
-    cutoff = now - _RATE_LIMIT_WINDOW
-    with _rate_lock:
-        timestamps = _rate_buckets.setdefault(client_ip, [])
-        # Evict expired timestamps
-        while timestamps and timestamps[0] < cutoff:
-            timestamps.pop(0)
-        if len(timestamps) >= _RATE_LIMIT_MAX:
-            return JSONResponse(
-                status_code=429,
-                content={"error": "rate limit exceeded", "retryAfterSeconds": _RATE_LIMIT_WINDOW},
-            )
-        timestamps.append(now)
-    return await call_next(request)
+def _upstream_hint_headers(status: int, hints: dict) -> dict[str, str]:
+    # El transporte anota en _response_hints el Retry-After de un circuito abierto y si se sirvio cache stale.
+    headers = {}
+    if status == 503 and hints.get("retryAfter"):
+        headers["retry-after"] = str(hints["retryAfter"])
+    if hints.get("cache"):
+        headers["x-cache"] = hints["cache"]
+        headers["age"] = str(hints["age"])
+    return headers
+
+
+def rate_limit_middleware(asgi_app):
+    # Middleware ASGI puro: evita el coste de BaseHTTPMiddleware en cada peticion. Ademas de la
+    # cuota, expone al cliente las pistas del transporte (_upstream_hint_headers).
+    async def middleware(scope, receive, send):
+        if scope["type"] != "http":
+            await asgi_app(scope, receive, send)
+            return
+        client = scope.get("client")
+        client_ip = (client[0] if client else None) or "unknown"
+        cost = _rate_limit_cost(scope)
+        allowed, remaining, wait = await _rate_limit_acquire(client_ip, cost)
+        if not allowed:
+            await _rate_limit_rejection(wait, remaining, cost)(scope, receive, send)
+            return
+
+        # El handler puede cobrar un coste extra antes de hacer el trabajo (_charge_rate_cost).
+        hints: dict = {"rateClient": client_ip, "rateRemaining": remaining, "rateBase": cost}
+
+        async def send_with_budget(message):
+            if message["type"] == "http.response.start":
+                total, left = cost + hints.get("rateCost", 0), hints["rateRemaining"]
+                extra_headers = {
+                    **{name.lower(): value for name, value in _rate_limit_headers(left, total).items()},
+                    **_upstream_hint_headers(message["status"], hints),
+                }
+                message["headers"] = [
+                    *(item for item in message.get("headers", []) if item[0].decode("latin-1").lower() not in extra_headers),
+                    *((name.encode(), value.encode()) for name, value in extra_headers.items()),
+                ]
+            await send(message)
+
+        token = _response_hints.set(hints)
+        try:
+            await asgi_app(scope, receive, send_with_budget)
+        finally:
+            _response_hints.reset(token)
+
+    return middleware
+
+
+app.add_middleware(rate_limit_middleware)
+
 
 with open(os.path.join(BASE_DIR, "IdLegislaciones.json"), encoding="utf-8") as f:
     leyes = json.load(f)
@@ -157,11 +217,139 @@ _NON_NORMATIVE_STARTS = (
     "la autoridad",
 )
 
-# TTL response cache — only for successful, read-only upstream queries
+# Pistas por peticion (Retry-After, uso de cache stale) que el middleware convierte en headers;
+# fuera de una peticion HTTP (p. ej. desde mcp_server) el valor es None y se ignoran.
+_response_hints: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar("response_hints", default=None)
+# Claves de cache (upstream o respuestas anidadas) consultadas mientras se construye una respuesta
+# normalizada; se guardan en su origen para invalidarla solo cuando se purga una de ellas.
+_response_sources: contextvars.ContextVar[Optional[set]] = contextvars.ContextVar("response_sources", default=None)
+
+# TTL response cache — only for successful, read-only upstream queries.
+# LRU acotado por numero de entradas y por bytes estimados (tamano del JSON serializado);
+# las entradas vencidas se barren de forma proactiva cada CACHE_SWEEP_INTERVAL segundos.
 _CACHE_TTL: int = int(os.getenv("CACHE_TTL", "300"))  # seconds (default 5 min)
-_cache: dict[str, tuple[float, int, Any]] = {}        # key → (timestamp, status, data)
+_CACHE_MAX_ENTRIES: int = int(os.getenv("CACHE_MAX_ENTRIES", "2000"))
+_CACHE_MAX_BYTES: int = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+_CACHE_SWEEP_INTERVAL: int = int(os.getenv("CACHE_SWEEP_INTERVAL", "60"))
+# Tras su TTL una entrada puede seguir sirviendose como "stale": mientras se refresca en
+# segundo plano (CACHE_STALE_WHILE_REVALIDATE) o si el upstream falla (CACHE_STALE_IF_ERROR).
+_CACHE_STALE_WHILE_REVALIDATE: int = int(os.getenv("CACHE_STALE_WHILE_REVALIDATE", "0"))
+_CACHE_STALE_IF_ERROR: int = int(os.getenv("CACHE_STALE_IF_ERROR", "0"))
+# Los valores cuyo JSON supera CACHE_COMPRESS_MIN_BYTES se guardan comprimidos (bytes) y se
+# descomprimen en cada acierto; 0 desactiva la compresion.
+_CACHE_COMPRESS_MIN_BYTES: int = int(os.getenv("CACHE_COMPRESS_MIN_BYTES", str(32 * 1024)))
+_cache: "OrderedDict[str, tuple[float, int, Any]]" = OrderedDict()  # key → (timestamp, status, data), LRU order
+_cache_sizes: dict[str, int] = {}  # key → bytes estimados
+_cache_ttls: dict[str, float] = {}  # key → TTL de su politica (ausente = CACHE_TTL)
+_cache_origins: dict[str, tuple[str, str]] = {}  # key → (politica/ruta, url de origen)
+_cache_access: dict[str, int] = {}  # key → aciertos desde que se guardo (para refresh-ahead)
+_cache_variants: dict[str, str] = {}  # key canonica → clave literal de la peticion que la lleno
+_cache_bytes = 0
+_cache_last_sweep = time.time()
+_cache_stats: dict[str, int] = {
+    "hits": 0,
+    "misses": 0,
+    "expired": 0,
+    "evictions": 0,
+    "oversize": 0,
+    "negativeHits": 0,
+    "staleHits": 0,
+    "staleIfError": 0,
+    "refreshes": 0,
+    "diskHits": 0,
+    "diskWrites": 0,
+    "diskErrors": 0,
+    "snapshotHits": 0,
+    "refreshAhead": 0,
+    "refreshAheadThrottled": 0,
+    "canonicalHits": 0,
+}
+_compression_stats: dict[str, float] = {
+    "compressions": 0,
+    "rawBytes": 0,
+    "storedBytes": 0,
+    "compressSeconds": 0.0,
+    "decompressions": 0,
+    "decompressSeconds": 0.0,
+}
+# Contadores por politica/ruta y por upstream, para /admin/cache/stats.
+_cache_route_stats: dict[str, dict[str, int]] = {}
+_cache_upstream_stats: dict[str, dict[str, int]] = {}
 _cache_lock = threading.Lock()
 
+# Politica de cache por ruta/upstream. ttl None = CACHE_TTL; negativeTtl > 0 cachea los 404
+# durante ese tiempo; maxBytes limita el tamano de una entrada (None = CACHE_MAX_BYTES).
+# Las busquedas viven poco; los documentos por id (tesis, articulos, sentencias) casi no cambian.
+# CACHE_POLICIES acepta un JSON para sobreescribir campos, p. ej. {"sjf.detail": {"ttl": 3600}}.
+_HOUR = 3600
+_DAY = 24 * _HOUR
+_CACHE_POLICIES: dict[str, dict] = {
+    "default": {"cache": True, "ttl": None, "negativeTtl": 0, "maxBytes": None},
+    "sjf.search": {
+        "cache": True,
+        "ttl": None,
+        "negativeTtl": 0,
+        "maxBytes": None,
+        "canonicalText": ["expression"],
+    },
+    "sjf.detail": {"cache": True, "ttl": 7 * _DAY, "negativeTtl": _HOUR, "maxBytes": 1024 * 1024},
+    "bj.search": {
+        "cache": True,
+        "ttl": None,
+        "negativeTtl": 0,
+        "maxBytes": None,
+        "canonicalText": ["q"],
+        "canonicalSets": ["filtros"],
+    },
+    "bj.legislacion": {"cache": True, "ttl": _DAY, "negativeTtl": _HOUR, "maxBytes": 8 * 1024 * 1024},
+    "jurislex.decretos": {"cache": True, "ttl": _DAY, "negativeTtl": _HOUR, "maxBytes": None},
+    "jurislex.articulos": {"cache": True, "ttl": _HOUR, "negativeTtl": 0, "maxBytes": None},
+    "jurislex.detalle": {"cache": True, "ttl": _DAY, "negativeTtl": _HOUR, "maxBytes": None},
+    "tepjf.search": {
+        "cache": True,
+        "ttl": None,
+        "negativeTtl": 0,
+        "maxBytes": None,
+        "canonicalText": ["and", "or"],
+    },
+    "tepjf.documento": {"cache": True, "ttl": 7 * _DAY, "negativeTtl": _HOUR, "maxBytes": 4 * 1024 * 1024},
+}
+
+
+def _load_cache_policies() -> None:
+    raw = os.getenv("CACHE_POLICIES", "")
+    if not raw:
+        return
+    try:
+        overrides = json.loads(raw)
+        for name, values in overrides.items():
+            _CACHE_POLICIES[name] = {**_CACHE_POLICIES.get(name, _CACHE_POLICIES["default"]), **values}
+    except (ValueError, AttributeError, TypeError) as exc:
+        logger.warning("CACHE_POLICIES invalido, se ignora: %s", exc)
+
+
+_load_cache_policies()
+
+
+def _cache_policy(name: Optional[str], use_cache: bool = False) -> Optional[dict]:
+    """Politica efectiva para una llamada; None si no debe cachearse."""
+    if name is None and not use_cache:
+        return None
+    name = name or "default"
+    policy = _CACHE_POLICIES.get(name) or _CACHE_POLICIES["default"]
+    return {**policy, "name": name} if policy.get("cache") else None
+
+
+def _cache_upstream(url: str) -> str:
+    return "response" if url.startswith("response:") else _upstream_for_url(url)
+
+
+def _count_cache_event(route: str, url: str, event: str) -> None:
+    # Requiere _cache_lock.
+    for table, label in ((_cache_route_stats, route), (_cache_upstream_stats, _cache_upstream(url))):
+        counters = table.setdefault(label, {"hits": 0, "misses": 0, "staleHits": 0, "stores": 0, "evictions": 0})
+        counters[event] += 1
+
 
 def _cache_key(url: str, method: str, body: Optional[Any]) -> str:
     body_str = json.dumps(body, sort_keys=True, ensure_ascii=False) if body is not None else ""
@@ -169,34 +357,1283 @@ def _cache_key(url: str, method: str, body: Optional[Any]) -> str:
     return hashlib.md5(raw.encode("utf-8")).hexdigest()
 
 
-def _get_cached(key: str) -> Optional[tuple[int, Any]]:
+# Claves canonicas: los campos "canonicalText" de una politica se comparan sin importar espacios ni
+# mayusculas (y acentos con "foldAccents"); los "canonicalSets" sin importar orden ni duplicados; los
+# campos vacios se omiten. Solo afecta a la clave: al upstream se envia el cuerpo original.
+_SEARCH_OPERATORS = {"Y", "O", "NO", "AND", "OR", "NOT"}
+
+
+def _canonical_search_text(value: str, fold_accents: bool = False) -> str:
+    # Los operadores booleanos en mayusculas conservan su significado.
+    return " ".join(
+        word if word in _SEARCH_OPERATORS else _normalize_text(word) if fold_accents else word.lower()
+        for word in value.split()
+    )
+
+
+def _canonical_value_set(value: Any) -> Any:
+    if isinstance(value, dict):
+        items = ((key, _canonical_value_set(item)) for key, item in value.items())
+        return {key: item for key, item in items if item not in (None, "", [], {})}
+    if isinstance(value, list):
+        return sorted({str(item).strip() for item in value if str(item).strip()})
+    return value.strip() if isinstance(value, str) else value
+
+
+def _canonical_cache_body(body: Any, policy: Optional[dict]) -> Any:
+    text_fields = set((policy or {}).get("canonicalText") or ())
+    set_fields = set((policy or {}).get("canonicalSets") or ())
+    if not text_fields and not set_fields:
+        return body
+    fold_accents = bool(policy.get("foldAccents"))
+
+    def walk(value: Any, field: Optional[str] = None) -> Any:
+        if field in text_fields and isinstance(value, str):
+            return _canonical_search_text(value, fold_accents)
+        if field in set_fields:
+            return _canonical_value_set(value)
+        if isinstance(value, dict):
+            items = ((key, walk(item, key)) for key, item in value.items())
+            return {key: item for key, item in items if item not in (None, "", [], {})}
+        if isinstance(value, list):
+            return [walk(item) for item in value]
+        return value
+
+    return walk(body)
+
+
+def _request_cache_key(
+    url: str, method: str, body: Optional[Any], policy: Optional[dict]
+) -> tuple[str, Optional[str]]:
+    """(clave canonica, clave literal) o (clave, None) si la politica no canonicaliza."""
+    key = _cache_key(url, method, body)
+    canonical_body = _canonical_cache_body(body, policy)
+    if canonical_body is body:
+        return key, None
+    return _cache_key(url, method, canonical_body), key
+
+
+def _cache_retention(ttl: Optional[float] = None) -> float:
+    # TTL "duro": cuanto se conserva una entrada contando las ventanas stale.
+    return (_CACHE_TTL if ttl is None else ttl) + max(_CACHE_STALE_WHILE_REVALIDATE, _CACHE_STALE_IF_ERROR, 0)
+
+
+def _estimate_size(data: Any) -> int:
+    try:
+        return len(json.dumps(data, ensure_ascii=False, default=str).encode("utf-8"))
+    except (TypeError, ValueError):
+        return len(repr(data))
+
+
+def _serialize_cache_value(data: Any) -> Optional[bytes]:
+    """JSON UTF-8 del valor, o None si no es serializable. Se calcula una vez por escritura y sirve
+    para el tamano, la compresion y el segundo nivel."""
+    try:
+        return json.dumps(data, ensure_ascii=False).encode("utf-8")
+    except (TypeError, ValueError):
+        return None
+
+
+try:
+    import zstandard
+
+    _CACHE_CODEC = "zstd"
+except ImportError:
+    zstandard = None
+    _CACHE_CODEC = "zlib"
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+def _compress_cache_value(raw: bytes) -> Optional[bytes]:
+    """JSON ya serializado comprimido con zstd (si esta instalado) o zlib; None si no conviene comprimir."""
+    started = time.perf_counter()
+    if len(raw) < _CACHE_COMPRESS_MIN_BYTES:
+        return None
+    if zstandard is not None:
+        packed = zstandard.ZstdCompressor(level=3).compress(raw)
+    else:
+        packed = zlib.compress(raw, 6)
     with _cache_lock:
-        entry = _cache.get(key)
-        if entry is None:
+        _compression_stats["compressions"] += 1
+        _compression_stats["rawBytes"] += len(raw)
+        _compression_stats["storedBytes"] += len(packed)
+        _compression_stats["compressSeconds"] += time.perf_counter() - started
+    return packed
+
+
+def _cache_value_json(data: bytes) -> bytes:
+    if data.startswith(_ZSTD_MAGIC):
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+def _inflate_cache_value(data: Any) -> Any:
+    # Ningun valor JSON cacheado es bytes: bytes significa valor comprimido.
+    if not isinstance(data, bytes):
+        return data
+    started = time.perf_counter()
+    value = json.loads(_cache_value_json(data))
+    with _cache_lock:
+        _compression_stats["decompressions"] += 1
+        _compression_stats["decompressSeconds"] += time.perf_counter() - started
+    return value
+
+
+def _cache_drop(key: str) -> None:
+    # Requiere _cache_lock.
+    global _cache_bytes
+    _cache.pop(key, None)
+    _cache_ttls.pop(key, None)
+    _cache_origins.pop(key, None)
+    _cache_access.pop(key, None)
+    _cache_variants.pop(key, None)
+    _cache_bytes -= _cache_sizes.pop(key, 0)
+
+
+def _cache_sweep(now: float) -> None:
+    # Requiere _cache_lock.
+    global _cache_last_sweep
+    _cache_last_sweep = now
+    expired = [key for key, (ts, _, _) in _cache.items() if now - ts > _cache_retention(_cache_ttls.get(key))]
+    for key in expired:
+        _cache_drop(key)
+        _cache_stats["expired"] += 1
+
+
+# Segundo nivel opcional en SQLite (CACHE_DISK_PATH): compartido por todos los workers del
+# host y persistente entre reinicios. Respeta los mismos TTL que la memoria.
+_CACHE_DISK_PATH = os.getenv("CACHE_DISK_PATH", "")
+_disk_conn: Optional[sqlite3.Connection] = None
+_disk_last_sweep = 0.0
+_disk_lock = threading.Lock()
+
+
+def _disk_cache_conn() -> Optional[sqlite3.Connection]:
+    # Requiere _disk_lock.
+    global _disk_conn
+    if _disk_conn is None and _CACHE_DISK_PATH:
+        conn = sqlite3.connect(_CACHE_DISK_PATH, timeout=5, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, stored_at REAL NOT NULL, status INTEGER NOT NULL, data TEXT NOT NULL,"
+            " ttl REAL, route TEXT, url TEXT)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS cache_stored_at ON cache (stored_at)")
+        _disk_conn = conn
+    return _disk_conn
+
+
+def _disk_cache_error(action: str, exc: Exception) -> None:
+    logger.warning("disk cache %s failed: %s", action, exc)
+    with _cache_lock:
+        _cache_stats["diskErrors"] += 1
+
+
+def _disk_cache_get(key: str) -> Optional[tuple[float, Optional[float], int, Any, tuple[str, str]]]:
+    if not _CACHE_DISK_PATH:
+        return None
+    try:
+        with _disk_lock:
+            conn = _disk_cache_conn()
+            row = conn.execute(
+                "SELECT stored_at, ttl, status, data, route, url FROM cache"
+                " WHERE key = ? AND stored_at + COALESCE(ttl, ?) >= ?",
+                (key, _CACHE_TTL, time.time() - _cache_retention(0)),
+            ).fetchone()
+        if row is None:
             return None
-        ts, status, data = entry
-        if time.time() - ts > _CACHE_TTL:
-            del _cache[key]
+        return row[0], row[1], row[2], json.loads(row[3]), (row[4] or "default", row[5] or "")
+    except (sqlite3.Error, OSError, ValueError) as exc:
+        _disk_cache_error("read", exc)
+        return None
+
+
+def _disk_cache_set(
+    key: str,
+    ts: float,
+    ttl: Optional[float],
+    status: int,
+    data: Any,
+    origin: tuple[str, str] = ("default", ""),
+    raw: Optional[bytes] = None,
+) -> None:
+    global _disk_last_sweep
+    if not _CACHE_DISK_PATH:
+        return
+    try:
+        payload = raw.decode("utf-8") if raw is not None else json.dumps(data, ensure_ascii=False)
+        with _disk_lock:
+            conn = _disk_cache_conn()
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, stored_at, status, data, ttl, route, url) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, ts, status, payload, ttl, origin[0], origin[1]),
+            )
+            if ts - _disk_last_sweep >= _CACHE_SWEEP_INTERVAL:
+                _disk_last_sweep = ts
+                conn.execute(
+                    "DELETE FROM cache WHERE stored_at + COALESCE(ttl, ?) < ?",
+                    (_CACHE_TTL, ts - _cache_retention(0)),
+                )
+    except (sqlite3.Error, OSError, TypeError, ValueError) as exc:
+        _disk_cache_error("write", exc)
+        return
+    with _cache_lock:
+        _cache_stats["diskWrites"] += 1
+
+
+def _disk_cache_purge(matches) -> list[str]:
+    """Borra las filas cuyo origen cumple ``matches``; devuelve sus claves."""
+    if not _CACHE_DISK_PATH:
+        return []
+    try:
+        with _disk_lock:
+            conn = _disk_cache_conn()
+            rows = conn.execute("SELECT key, route, url FROM cache").fetchall()
+            victims = [row for row in rows if matches((row[1] or "default", row[2] or ""))]
+            conn.executemany("DELETE FROM cache WHERE key = ?", [(row[0],) for row in victims])
+    except (sqlite3.Error, OSError) as exc:
+        _disk_cache_error("purge", exc)
+        return []
+    return [row[0] for row in victims]
+
+
+def _disk_cache_delete(key: str) -> bool:
+    if not _CACHE_DISK_PATH:
+        return False
+    try:
+        with _disk_lock:
+            return _disk_cache_conn().execute("DELETE FROM cache WHERE key = ?", (key,)).rowcount > 0
+    except (sqlite3.Error, OSError) as exc:
+        _disk_cache_error("delete", exc)
+        return False
+
+
+# Backend Redis (o compatible con su protocolo: Valkey, KeyDB, Upstash...) para compartir la cache
+# entre replicas. Requiere `pip install redis`; cada valor se guarda comprimido y con expiracion
+# igual a su _cache_retention(). El origen de cada clave va aparte, en un hash por ruta
+# (<prefijo>origin:<ruta> → {clave: url}), para purgar sin leer ni descomprimir valores; requiere
+# Redis 7+ (EXPIRE NX/GT). Como el hash de una ruta concurrida nunca expira, un ZSET por ruta
+# (<prefijo>expiry:<ruta> → {clave: vencimiento}) permite que cada escritura retire hasta
+# _CACHE_REDIS_PRUNE_BATCH campos de claves ya vencidas. Tras un error se deja de consultar durante
+# CACHE_REDIS_RETRY segundos (solo memoria) para no pagar el timeout en cada peticion.
+_CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "")
+_CACHE_REDIS_PREFIX = os.getenv("CACHE_REDIS_PREFIX", "ordina:cache:")
+_CACHE_REDIS_TIMEOUT = float(os.getenv("CACHE_REDIS_TIMEOUT", "0.5"))
+_CACHE_REDIS_RETRY = float(os.getenv("CACHE_REDIS_RETRY", "30"))
+_CACHE_REDIS_PRUNE_BATCH = 100
+_redis_cache_state = {"retryAt": 0.0}
+_redis_client: Any = None
+_redis_lock = threading.Lock()
+
+
+def _redis_connect(url: str, timeout: float) -> Any:
+    import redis  # dependencia opcional
+
+    return redis.Redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+
+
+def _redis_conn() -> Any:
+    global _redis_client
+    with _redis_lock:
+        if _redis_client is None:
+            _redis_client = _redis_connect(_CACHE_REDIS_URL, _CACHE_REDIS_TIMEOUT)
+        return _redis_client
+
+
+def _redis_cache_available() -> bool:
+    return time.monotonic() >= _redis_cache_state["retryAt"]
+
+
+def _redis_cache_error(action: str, exc: Exception) -> None:
+    _redis_cache_state["retryAt"] = time.monotonic() + _CACHE_REDIS_RETRY
+    _disk_cache_error(action, exc)
+
+
+def _redis_cache_get(key: str) -> Optional[tuple[float, Optional[float], int, Any, tuple[str, str]]]:
+    if not _redis_cache_available():
+        return None
+    try:
+        raw = _redis_conn().get(_CACHE_REDIS_PREFIX + key)
+        if raw is None:
             return None
-        return status, data
+        entry = json.loads(zlib.decompress(raw))
+    except Exception as exc:  # noqa: BLE001 - errores de red, de cliente o de formato
+        _redis_cache_error("redis read", exc)
+        return None
+    ttl = entry.get("ttl")
+    if time.time() - entry["ts"] > _cache_retention(ttl):
+        return None
+    return entry["ts"], ttl, entry["status"], entry["data"], (entry.get("route") or "default", entry.get("url") or "")
+
+
+def _redis_cache_set(
+    key: str,
+    ts: float,
+    ttl: Optional[float],
+    status: int,
+    data: Any,
+    origin: tuple[str, str] = ("default", ""),
+    raw: Optional[bytes] = None,
+) -> None:
+    if not _redis_cache_available():
+        return
+    entry = {"ts": ts, "ttl": ttl, "status": status, "route": origin[0], "url": origin[1]}
+    now = time.time()
+    expire = max(1, math.ceil(ts + _cache_retention(ttl) - now))
+    origins, expiries = _redis_origin_keys(origin[0])
+    try:
+        if raw is None:
+            raw = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        # El valor ya serializado se inserta tal cual como campo "data" del objeto JSON.
+        head = json.dumps(entry, ensure_ascii=False).encode("utf-8")
+        payload = zlib.compress(head[:-1] + b', "data": ' + raw + b"}")
+        conn = _redis_conn()
+        pipe = conn.pipeline()
+        pipe.set(_CACHE_REDIS_PREFIX + key, payload, ex=expire)
+        pipe.hset(origins, key, origin[1])
+        pipe.zadd(expiries, {key: now + expire})
+        # El hash y el ZSET viven tanto como la clave mas duradera de su ruta.
+        for name in (origins, expiries):
+            pipe.expire(name, expire, nx=True)
+            pipe.expire(name, expire, gt=True)
+        pipe.zrangebyscore(expiries, "-inf", now, start=0, num=_CACHE_REDIS_PRUNE_BATCH)
+        expired = [_redis_text(item) for item in pipe.execute()[-1]]
+        if expired:
+            pipe = conn.pipeline()
+            pipe.hdel(origins, *expired)
+            pipe.zrem(expiries, *expired)
+            pipe.execute()
+    except Exception as exc:  # noqa: BLE001
+        _redis_cache_error("redis write", exc)
+        return
+    with _cache_lock:
+        _cache_stats["diskWrites"] += 1
+
+
+def _redis_origin_keys(route: str) -> tuple[str, str]:
+    return f"{_CACHE_REDIS_PREFIX}origin:{route}", f"{_CACHE_REDIS_PREFIX}expiry:{route}"
+
+
+def _redis_text(value: Any) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _redis_cache_purge(matches) -> list[str]:
+    keys: list[str] = []
+    if not _redis_cache_available():
+        return keys
+    try:
+        conn = _redis_conn()
+        origins_prefix = f"{_CACHE_REDIS_PREFIX}origin:"
+        for origins in conn.scan_iter(match=f"{origins_prefix}*"):
+            route = _redis_text(origins)[len(origins_prefix):]
+            origins, expiries = _redis_origin_keys(route)
+            victims = []
+            for key, url in conn.hgetall(origins).items():
+                key = _redis_text(key)
+                if matches((route, _redis_text(url))):
+                    victims.append(key)
+            if not victims:
+                continue
+            # Los campos de claves ya expiradas se limpian igual; solo cuentan las que existian.
+            pipe = conn.pipeline()
+            pipe.hdel(origins, *victims)
+            pipe.zrem(expiries, *victims)
+            for key in victims:
+                pipe.delete(_CACHE_REDIS_PREFIX + key)
+            removed = pipe.execute()[2:]
+            keys.extend(key for key, existed in zip(victims, removed) if existed)
+    except Exception as exc:  # noqa: BLE001
+        _redis_cache_error("redis purge", exc)
+    return keys
+
+
+def _redis_cache_delete(key: str) -> bool:
+    if not _redis_cache_available():
+        return False
+    try:
+        conn = _redis_conn()
+        raw = conn.get(_CACHE_REDIS_PREFIX + key)
+        if raw is None:
+            return False
+        # La ruta va dentro del valor: hace falta para retirar la clave de su hash de origenes.
+        origins, expiries = _redis_origin_keys(json.loads(zlib.decompress(raw)).get("route") or "default")
+        pipe = conn.pipeline()
+        pipe.delete(_CACHE_REDIS_PREFIX + key)
+        pipe.hdel(origins, key)
+        pipe.zrem(expiries, key)
+        return bool(pipe.execute()[0])
+    except Exception as exc:  # noqa: BLE001
+        _redis_cache_error("redis delete", exc)
+        return False
+
+
+# Segundo nivel de cache detras de la memoria del proceso. CACHE_BACKEND elige memory, sqlite o
+# redis; sin valor se usa redis si hay CACHE_REDIS_URL, sqlite si hay CACHE_DISK_PATH y si no
+# solo memoria. Cada backend implementa get/set/purge/delete con las firmas de SQLite; set recibe
+# ademas el JSON ya serializado por _set_cached.
+_CACHE_BACKEND = os.getenv("CACHE_BACKEND", "").strip().lower()
+_CACHE_BACKENDS: dict[str, dict] = {
+    "sqlite": {
+        "get": _disk_cache_get,
+        "set": _disk_cache_set,
+        "purge": _disk_cache_purge,
+        "delete": _disk_cache_delete,
+    },
+    "redis": {
+        "get": _redis_cache_get,
+        "set": _redis_cache_set,
+        "purge": _redis_cache_purge,
+        "delete": _redis_cache_delete,
+    },
+}
+
+
+def _shared_cache_name() -> str:
+    return _CACHE_BACKEND or ("redis" if _CACHE_REDIS_URL else "sqlite" if _CACHE_DISK_PATH else "memory")
+
+
+def _shared_cache() -> Optional[dict]:
+    return _CACHE_BACKENDS.get(_shared_cache_name())
+
+
+# Snapshot portable de la cache para arranques en frio (p. ej. Vercel): un archivo con un indice
+# comprimido al inicio y cada valor comprimido por separado. Al importar solo se lee el indice; los
+# valores se descomprimen desde el mmap la primera vez que se piden y pasan a memoria.
+_CACHE_SNAPSHOT_PATH = os.getenv("CACHE_SNAPSHOT_PATH", "")
+_SNAPSHOT_MAGIC = b"ORDSNAP1"
+_snapshot_map: Optional[mmap.mmap] = None
+_snapshot_index: dict[str, list] = {}  # key → [offset, length, ts, ttl, status, route, url]
+_snapshot_lock = threading.Lock()
+
+
+def _build_cache_snapshot() -> bytes:
+    """Serializa las entradas vigentes de la cache en memoria y la memoria de planes SJF."""
+    now = time.time()
+    with _cache_lock:
+        entries = [
+            (key, ts, _cache_ttls.get(key), status, data, _cache_origins.get(key, ("default", "")))
+            for key, (ts, status, data) in _cache.items()
+            if now - ts <= _cache_retention(_cache_ttls.get(key, _CACHE_TTL))
+        ]
+    index: dict[str, list] = {}
+    blobs: list[bytes] = []
+    offset = 0
+    for key, ts, ttl, status, data, (route, url) in entries:
+        try:
+            if isinstance(data, bytes):
+                # Los valores comprimidos con zlib ya tienen el formato del snapshot.
+                blob = zlib.compress(_cache_value_json(data)) if data.startswith(_ZSTD_MAGIC) else data
+            else:
+                blob = zlib.compress(json.dumps(data, ensure_ascii=False).encode("utf-8"))
+        except (TypeError, ValueError, zlib.error):
+            continue
+        index[key] = [offset, len(blob), ts, ttl, status, route, url]
+        blobs.append(blob)
+        offset += len(blob)
+    header = zlib.compress(
+        json.dumps({"createdAt": now, "entries": index, "sjfPlans": _sjf_plan_payload()}).encode("utf-8")
+    )
+    return b"".join([_SNAPSHOT_MAGIC, len(header).to_bytes(8, "big"), header, *blobs])
+
+
+def _load_cache_snapshot(path: str) -> int:
+    """Mapea el snapshot y carga su indice; devuelve el numero de entradas disponibles."""
+    global _snapshot_map
+    mapped = None
+    try:
+        with open(path, "rb") as fh:
+            mapped = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        if mapped[: len(_SNAPSHOT_MAGIC)] != _SNAPSHOT_MAGIC:
+            raise ValueError("formato desconocido")
+        start = len(_SNAPSHOT_MAGIC) + 8
+        header_len = int.from_bytes(mapped[len(_SNAPSHOT_MAGIC) : start], "big")
+        header = json.loads(zlib.decompress(mapped[start : start + header_len]))
+    except (OSError, ValueError, zlib.error) as exc:
+        logger.warning("snapshot de cache invalido en %s: %s", path, exc)
+        if mapped is not None:
+            mapped.close()
+        return 0
+    base = start + header_len
+    with _snapshot_lock:
+        _snapshot_map = mapped
+        _snapshot_index.clear()
+        for key, meta in (header.get("entries") or {}).items():
+            _snapshot_index[key] = [base + meta[0], *meta[1:]]
+    _merge_sjf_plan_payload(header.get("sjfPlans") or {})
+    return len(_snapshot_index)
+
+
+def _snapshot_get(key: str) -> Optional[tuple[float, Optional[float], int, Any, tuple[str, str]]]:
+    # Cada entrada se lee una sola vez: despues vive en la cache en memoria.
+    with _snapshot_lock:
+        meta = _snapshot_index.pop(key, None)
+        mapped = _snapshot_map
+    if meta is None or mapped is None:
+        return None
+    offset, length, ts, ttl, status, route, url = meta
+    if time.time() - ts > _cache_retention(_CACHE_TTL if ttl is None else ttl):
+        return None
+    try:
+        data = json.loads(zlib.decompress(mapped[offset : offset + length]))
+    except (ValueError, zlib.error) as exc:
+        logger.warning("entrada de snapshot invalida %s: %s", key, exc)
+        return None
+    return ts, ttl, status, data, (route, url)
+
+
+def _memory_cached_entry(key: str, now: float) -> Optional[tuple[float, float, int, Any]]:
+    hit = None
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is not None:
+            ts, status, data = entry
+            ttl = _cache_ttls.get(key, _CACHE_TTL)
+            if now - ts <= _cache_retention(ttl):
+                _cache.move_to_end(key)
+                hit = now - ts, ttl, status, data
+            else:
+                _cache_drop(key)
+                _cache_stats["expired"] += 1
+    if hit is None:
+        return None
+    return hit[0], hit[1], hit[2], _inflate_cache_value(hit[3])
 
 
-def _set_cached(key: str, status: int, data: Any) -> None:
+def _tier_cached_entry(key: str, now: float) -> Optional[tuple[float, float, int, Any]]:
+    """Busca en el backend compartido y en el snapshot; un acierto se promueve a memoria."""
+    backend = _shared_cache()
+    tier_entry, source = (backend["get"](key) if backend is not None else None), "diskHits"
+    if tier_entry is None:
+        tier_entry, source = _snapshot_get(key), "snapshotHits"
+    if tier_entry is None:
+        return None
+    ts, ttl, status, data, origin = tier_entry
+    _cache_store(key, ts, status, data, ttl, origin=origin)  # se promueve a memoria conservando su antiguedad
+    with _cache_lock:
+        _cache_stats[source] += 1
+    return now - ts, _CACHE_TTL if ttl is None else ttl, status, data
+
+
+def _get_cached_entry(key: str) -> Optional[tuple[float, float, int, Any]]:
+    """Devuelve (edad, ttl, status, data) si la entrada sigue dentro de su _cache_retention()."""
+    now = time.time()
+    return _memory_cached_entry(key, now) or _tier_cached_entry(key, now)
+
+
+async def _get_cached_entry_async(key: str) -> Optional[tuple[float, float, int, Any]]:
+    # El backend compartido hace E/S bloqueante (SQLite, Redis): desde el loop va al threadpool.
+    now = time.time()
+    entry = _memory_cached_entry(key, now)
+    if entry is None and (_shared_cache() is not None or _snapshot_index):
+        entry = await run_in_threadpool(_tier_cached_entry, key, now)
+    return entry
+
+
+def _count_cached_hit(entry: Optional[tuple[float, float, int, Any]]) -> Optional[tuple[int, Any]]:
+    fresh = entry is not None and entry[0] <= entry[1]
+    with _cache_lock:
+        _cache_stats["hits" if fresh else "misses"] += 1
+    if not fresh:
+        return None
+    return entry[2], entry[3]
+
+
+def _get_cached(key: str) -> Optional[tuple[int, Any]]:
+    return _count_cached_hit(_get_cached_entry(key))
+
+
+async def _get_cached_async(key: str) -> Optional[tuple[int, Any]]:
+    return _count_cached_hit(await _get_cached_entry_async(key))
+
+
+def _cache_store(
+    key: str,
+    ts: float,
+    status: int,
+    data: Any,
+    ttl: Optional[float] = None,
+    max_bytes: Optional[int] = None,
+    origin: Optional[tuple[str, str]] = None,
+    raw: Optional[bytes] = None,
+) -> bool:
+    global _cache_bytes
+    if raw is None:
+        raw = _serialize_cache_value(data)
+    size = _estimate_size(data) if raw is None else len(raw)
+    packed = _compress_cache_value(raw) if raw is not None and 0 < _CACHE_COMPRESS_MIN_BYTES <= size else None
+    now = time.time()
+    with _cache_lock:
+        if size > min(max_bytes or _CACHE_MAX_BYTES, _CACHE_MAX_BYTES):
+            _cache_stats["oversize"] += 1
+            _cache_drop(key)
+            return False
+        if packed is not None:
+            data, size = packed, len(packed)  # el presupuesto de bytes cuenta lo que ocupa en memoria
+        if now - _cache_last_sweep >= _CACHE_SWEEP_INTERVAL:
+            _cache_sweep(now)
+        _cache_drop(key)
+        _cache[key] = (ts, status, data)
+        _cache_sizes[key] = size
+        if ttl is not None:
+            _cache_ttls[key] = ttl
+        if origin is not None:
+            _cache_origins[key] = origin
+        _cache_bytes += size
+        while len(_cache) > 1 and (len(_cache) > _CACHE_MAX_ENTRIES or _cache_bytes > _CACHE_MAX_BYTES):
+            victim = next(iter(_cache))
+            victim_origin = _cache_origins.get(victim)
+            if victim_origin is not None:
+                _count_cache_event(*victim_origin, "evictions")
+            _cache_drop(victim)
+            _cache_stats["evictions"] += 1
+        return True
+
+
+def _set_cached(key: str, status: int, data: Any, policy: Optional[dict] = None, url: str = "") -> None:
+    ttl = (policy or {}).get("ttl")
     if status >= 400:
-        return  # never cache errors
+        # Los errores nunca se cachean, salvo los 404 de una politica con negativeTtl.
+        negative_ttl = (policy or {}).get("negativeTtl") or 0
+        if status != 404 or negative_ttl <= 0:
+            return
+        ttl = negative_ttl
+    now = time.time()
+    origin = ((policy or {}).get("name") or "default", url)
+    raw = _serialize_cache_value(data)
+    if _cache_store(key, now, status, data, ttl, (policy or {}).get("maxBytes"), origin, raw):
+        with _cache_lock:
+            _count_cache_event(*origin, "stores")
+        backend = _shared_cache()
+        if backend is not None:
+            # La copia en memoria ya sirve las lecturas y el backend captura sus propios errores.
+            _run_off_loop(backend["set"], key, now, ttl, status, data, origin, raw)
+
+
+def _run_off_loop(call, *args) -> None:
+    """Ejecuta ``call`` (E/S bloqueante) en un hilo, sin esperarla, si hay un event loop en curso."""
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        call(*args)
+        return
+    loop.run_in_executor(None, call, *args)
+
+
+def _write_json_atomic(path: str, payload: Any) -> None:
+    # Temporal unico en el mismo directorio: dos escritores (workers, hilos) no pisan el mismo .tmp.
+    fh = tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=os.path.dirname(path) or ".", suffix=".tmp", delete=False)
+    try:
+        with fh:
+            json.dump(payload, fh, ensure_ascii=False)
+        os.replace(fh.name, path)
+    except BaseException:
+        with suppress(OSError):
+            os.unlink(fh.name)
+        raise
+
+
+def _cache_snapshot() -> dict:
+    with _cache_lock:
+        return {
+            "entries": len(_cache),
+            "bytes": _cache_bytes,
+            "maxEntries": _CACHE_MAX_ENTRIES,
+            "maxBytes": _CACHE_MAX_BYTES,
+            "ttlSeconds": _CACHE_TTL,
+            "backend": _shared_cache_name(),
+            "disk": _CACHE_DISK_PATH or None,
+            "snapshot": _CACHE_SNAPSHOT_PATH or None,
+            "snapshotPending": len(_snapshot_index),
+            "compression": {
+                "codec": _CACHE_CODEC,
+                "minBytes": _CACHE_COMPRESS_MIN_BYTES,
+                "entries": sum(1 for _, _, data in _cache.values() if isinstance(data, bytes)),
+                "savedBytes": _compression_stats["rawBytes"] - _compression_stats["storedBytes"],
+                **_compression_stats,
+            },
+            "policies": {name: dict(policy) for name, policy in _CACHE_POLICIES.items()},
+            **_cache_stats,
+        }
+
+
+# Administracion de cache (/admin/cache/*). Sin CACHE_ADMIN_TOKEN la API queda deshabilitada.
+_CACHE_ADMIN_TOKEN = os.getenv("CACHE_ADMIN_TOKEN", "")
+
+
+def _cache_admin_denied(request: Request) -> Optional[JSONResponse]:
+    if not _CACHE_ADMIN_TOKEN:
+        return JSONResponse(status_code=404, content={"error": "admin API disabled"})
+    token = str(request.headers.get("x-admin-token") or "")
+    authorization = str(request.headers.get("authorization") or "")
+    if authorization.lower().startswith("bearer "):
+        token = authorization[7:].strip()
+    if not hmac.compare_digest(token.encode(), _CACHE_ADMIN_TOKEN.encode()):
+        return JSONResponse(status_code=401, content={"error": "invalid admin token"})
+    return None
+
+
+def _cache_breakdown() -> dict:
+    """Entradas, bytes y contadores agrupados por politica/ruta y por upstream."""
+    by_route: dict[str, dict] = {}
+    by_upstream: dict[str, dict] = {}
+    with _cache_lock:
+        for key in _cache:
+            route, url = _cache_origins.get(key, ("default", ""))
+            for table, label in ((by_route, route), (by_upstream, _cache_upstream(url))):
+                group = table.setdefault(label, {"entries": 0, "bytes": 0})
+                group["entries"] += 1
+                group["bytes"] += _cache_sizes.get(key, 0)
+        for table, counters in ((by_route, _cache_route_stats), (by_upstream, _cache_upstream_stats)):
+            for label, values in counters.items():
+                table.setdefault(label, {"entries": 0, "bytes": 0}).update(values)
+    return {"byRoute": by_route, "byUpstream": by_upstream}
+
+
+def _cache_keys_snapshot(matches, limit: int) -> list[dict]:
+    now = time.time()
+    keys = []
+    with _cache_lock:
+        for key in reversed(_cache):  # mas recientes primero
+            origin = _cache_origins.get(key, ("default", ""))
+            if not matches(origin):
+                continue
+            ts, status, data = _cache[key]
+            keys.append(
+                {
+                    "key": key,
+                    "route": origin[0],
+                    "url": origin[1],
+                    "upstream": _cache_upstream(origin[1]),
+                    "status": status,
+                    "ageSeconds": round(now - ts, 1),
+                    "ttlSeconds": _cache_ttls.get(key, _CACHE_TTL),
+                    "bytes": _cache_sizes.get(key, 0),
+                    "compressed": isinstance(data, bytes),
+                    "hits": _cache_access.get(key, 0),
+                }
+            )
+            if len(keys) >= limit:
+                break
+    return keys
+
+
+def _cache_origin_matcher(prefix: Optional[str] = None, upstream: Optional[str] = None, route: Optional[str] = None):
+    def matches(origin: tuple[str, str]) -> bool:
+        entry_route, url = origin
+        if route is not None and entry_route != route:
+            return False
+        if prefix is not None and not url.startswith(prefix):
+            return False
+        return upstream is None or _cache_upstream(url) == upstream
+
+    return matches
+
+
+def _cache_purge_where(matches) -> tuple[int, int, set[str]]:
+    """Borra de memoria y disco las entradas cuyo origen cumple ``matches``; devuelve tambien sus claves."""
+    with _cache_lock:
+        victims = [key for key in _cache if matches(_cache_origins.get(key, ("default", "")))]
+        for key in victims:
+            _cache_drop(key)
+    backend = _shared_cache()
+    shared_victims = backend["purge"](matches) if backend is not None else []
+    return len(victims), len(shared_victims), {*victims, *shared_victims}
+
+
+def _response_origin_url(route: str, sources: set) -> str:
+    return f"response:{route}#{','.join(sorted(sources))}"
+
+
+def _response_origin_sources(url: str) -> set[str]:
+    if not url.startswith("response:") or "#" not in url:
+        return set()
+    return set(filter(None, url.split("#", 1)[1].split(",")))
+
+
+def _cache_purge(matches) -> dict:
+    memory_removed, disk_removed, purged = _cache_purge_where(matches)
+    # Solo se invalidan las respuestas normalizadas construidas con alguna clave purgada; como una
+    # respuesta puede depender de otra, se repite hasta que no caiga ninguna mas.
+    while purged:
+        extra_memory, extra_disk, purged = _cache_purge_where(
+            lambda origin, purged=purged: not purged.isdisjoint(_response_origin_sources(origin[1]))
+        )
+        memory_removed += extra_memory
+        disk_removed += extra_disk
+    return {"memory": memory_removed, "disk": disk_removed}
+
+
+def _cache_delete(key: str) -> dict:
     with _cache_lock:
-        _cache[key] = (time.time(), status, data)
+        memory_removed = key in _cache
+        _cache_drop(key)
+    backend = _shared_cache()
+    disk_removed = backend is not None and backend["delete"](key)
+    return {"memory": int(memory_removed), "disk": int(disk_removed)}
 
 
-# Persistent HTTP client — reuses connections across requests
+# Persistent HTTP clients — one connection pool per upstream host so a slow upstream cannot
+# exhaust the keep-alive slots of the others. There is a single async transport: the FastAPI
+# routes await it and the sync functions that mcp_server.py calls run it through _run_sync.
 _HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "35"))
-_http_client = httpx.Client(timeout=_HTTP_TIMEOUT, follow_redirects=True)
 
-# Rate limiting — sliding window, no external deps
+try:
+    import h2  # noqa: F401  (habilita httpx http2=True)
+
+    _HTTP2_AVAILABLE = True
+except ImportError:
+    _HTTP2_AVAILABLE = False
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+def _upstream_pool_config(prefix: str) -> dict:
+    """Lee limites de pool de <PREFIX>_POOL_* con HTTP_POOL_* como valores por defecto."""
+    max_connections = _env_int(f"{prefix}_POOL_MAX_CONNECTIONS", _env_int("HTTP_POOL_MAX_CONNECTIONS", 100))
+    max_keepalive = _env_int(f"{prefix}_POOL_MAX_KEEPALIVE", _env_int("HTTP_POOL_MAX_KEEPALIVE", 20))
+    keepalive_expiry = _env_float(f"{prefix}_POOL_KEEPALIVE_EXPIRY", _env_float("HTTP_POOL_KEEPALIVE_EXPIRY", 5.0))
+    http2_requested = os.getenv(f"{prefix}_HTTP2", os.getenv("HTTP_HTTP2", "false")).lower() == "true"
+    if http2_requested and not _HTTP2_AVAILABLE:
+        logger.warning("%s_HTTP2 solicitado pero el paquete h2 no esta instalado; se usa HTTP/1.1", prefix)
+    return {
+        "maxConnections": max_connections,
+        "maxKeepalive": min(max_keepalive, max_connections),
+        "keepaliveExpiry": keepalive_expiry,
+        "http2": http2_requested and _HTTP2_AVAILABLE,
+    }
+
+
+_UPSTREAM_POOLS: dict[str, dict] = {
+    "sjf": _upstream_pool_config("SJF"),
+    "jurislex": _upstream_pool_config("JURISLEX"),
+    "bj_scjn": _upstream_pool_config("BJ_SCJN"),
+    "tepjf": _upstream_pool_config("TEPJF"),
+    "default": _upstream_pool_config("HTTP"),
+}
+_UPSTREAM_HOSTS: dict[str, str] = {
+    parse.urlsplit(base).netloc: upstream
+    for upstream, base in [
+        ("sjf", SJF_BASE),
+        ("jurislex", JURISLEX_BASE),
+        ("bj_scjn", BJ_SCJN_BASE),
+        ("tepjf", TEPJF_BASE),
+        ("tepjf", TEPJF_CONVERT_PDF),
+    ]
+}
+# Un cliente por (fuente, event loop): un AsyncClient no puede usarse desde otro loop.
+_async_http_clients: dict[tuple[str, asyncio.AbstractEventLoop], httpx.AsyncClient] = {}
+_pool_stats: dict[str, dict[str, int]] = {
+    upstream: {"inFlight": 0, "peakInFlight": 0, "requests": 0} for upstream in _UPSTREAM_POOLS
+}
+_pool_stats_lock = threading.Lock()
+
+
+def _upstream_for_url(url: str) -> str:
+    return _UPSTREAM_HOSTS.get(parse.urlsplit(url).netloc, "default")
+
+
+def _client_options(upstream: str) -> dict:
+    config = _UPSTREAM_POOLS.get(upstream) or _UPSTREAM_POOLS["default"]
+    return {
+        "timeout": _HTTP_TIMEOUT,
+        "follow_redirects": True,
+        "http2": config["http2"],
+        "limits": httpx.Limits(
+            max_connections=config["maxConnections"],
+            max_keepalive_connections=config["maxKeepalive"],
+            keepalive_expiry=config["keepaliveExpiry"],
+        ),
+    }
+
+
+def _get_async_http_client(upstream: str) -> httpx.AsyncClient:
+    # Se crea de forma perezosa: Vercel puede importar el modulo sin ciclo de vida ASGI.
+    loop = asyncio.get_running_loop()
+    client = _async_http_clients.get((upstream, loop))
+    if client is None or client.is_closed:
+        for key in [key for key in _async_http_clients if key[1].is_closed()]:
+            del _async_http_clients[key]
+        client = httpx.AsyncClient(**_client_options(upstream))
+        _async_http_clients[(upstream, loop)] = client
+    return client
+
+
+async def _close_async_http_clients() -> None:
+    loop = asyncio.get_running_loop()
+    keys = [key for key in _async_http_clients if key[1] is loop]
+    for key in keys:
+        client = _async_http_clients.pop(key)
+        if not client.is_closed:
+            await client.aclose()
+
+
+# Loop dedicado para las funciones sincronas que importa mcp_server.py: ejecutan la misma
+# implementacion async que las rutas y conservan sus clientes (keep-alive) entre llamadas.
+_sync_loop: Optional[asyncio.AbstractEventLoop] = None
+_sync_loop_lock = threading.Lock()
+
+
+def _run_sync(coro) -> Any:
+    global _sync_loop
+    with _sync_loop_lock:
+        if _sync_loop is None:
+            _sync_loop = asyncio.new_event_loop()
+            threading.Thread(target=_sync_loop.run_forever, name="ordina-sync", daemon=True).start()
+        loop = _sync_loop
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        coro.close()
+        raise RuntimeError("_run_sync no puede llamarse desde su propio loop; usa la variante async")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+
+@contextmanager
+def _track_upstream_request(upstream: str):
+    with _pool_stats_lock:
+        stats = _pool_stats.setdefault(upstream, {"inFlight": 0, "peakInFlight": 0, "requests": 0})
+        stats["inFlight"] += 1
+        stats["requests"] += 1
+        stats["peakInFlight"] = max(stats["peakInFlight"], stats["inFlight"])
+    try:
+        yield
+    finally:
+        with _pool_stats_lock:
+            stats["inFlight"] -= 1
+
+
+def _client_connections(client: Any) -> dict:
+    # httpx no expone el pool publicamente; se lee el pool de httpcore cuando esta disponible.
+    pool = getattr(getattr(client, "_transport", None), "_pool", None)
+    try:
+        connections = list(getattr(pool, "connections", None) or [])
+        idle = sum(1 for connection in connections if connection.is_idle())
+    except Exception:
+        return {"open": None, "idle": None}
+    return {"open": len(connections), "idle": idle}
+
+
+def _pool_connections(upstream: str) -> dict:
+    totals = {"open": 0, "idle": 0}
+    for (client_upstream, _), client in list(_async_http_clients.items()):
+        if client_upstream != upstream:
+            continue
+        connections = _client_connections(client)
+        if connections["open"] is None:
+            return connections
+        totals["open"] += connections["open"]
+        totals["idle"] += connections["idle"]
+    return totals
+
+
+def _pool_snapshot() -> dict:
+    with _pool_stats_lock:
+        stats = {upstream: dict(values) for upstream, values in _pool_stats.items()}
+    snapshot = {}
+    for upstream, config in _UPSTREAM_POOLS.items():
+        snapshot[upstream] = {
+            "config": config,
+            **stats.get(upstream, {}),
+            "async": _pool_connections(upstream),
+        }
+    return snapshot
+
+# Circuit breaker por upstream — tras N fallos consecutivos (5xx, timeouts, errores de red)
+# se responde 503 de inmediato durante CIRCUIT_BREAKER_RESET_SECONDS; despues se deja pasar
+# una sola sonda (half-open) que cierra o reabre el circuito.
+_BREAKER_FAILURE_THRESHOLD = _env_int("CIRCUIT_BREAKER_FAILURES", 5)
+_BREAKER_RESET_SECONDS = _env_float("CIRCUIT_BREAKER_RESET_SECONDS", 30.0)
+_breakers: dict[str, dict] = {}
+_breakers_lock = threading.Lock()
+
+
+def _new_breaker() -> dict:
+    return {"state": "closed", "failures": 0, "openedAt": None, "probe": None, "opens": 0, "rejected": 0}
+
+
+_breaker_probe_ids = itertools.count(1)
+
+
+def _breaker_acquire(upstream: str) -> tuple[Optional[int], Optional[int]]:
+    """Devuelve (Retry-After o None si la peticion puede salir, token de sonda si es la unica admitida en half-open)."""
+    now = time.time()
+    with _breakers_lock:
+        breaker = _breakers.setdefault(upstream, _new_breaker())
+        if breaker["state"] == "closed":
+            return None, None
+        if breaker["state"] == "open":
+            remaining = breaker["openedAt"] + _BREAKER_RESET_SECONDS - now
+            if remaining > 0:
+                breaker["rejected"] += 1
+                return max(1, math.ceil(remaining)), None
+            breaker["state"] = "half_open"
+        if breaker["probe"] is not None:
+            breaker["rejected"] += 1
+            return 1, None
+        breaker["probe"] = next(_breaker_probe_ids)
+        return None, breaker["probe"]
+
+
+def _breaker_record(upstream: str, success: Optional[bool], probe: Optional[int] = None) -> None:
+    # success=None (p. ej. cancelacion) solo libera la sonda sin cambiar el estado. Fuera de closed
+    # solo el portador del token de sonda decide; las peticiones que salieron antes de abrirse no
+    # cierran el circuito ni alargan su apertura.
+    with _breakers_lock:
+        breaker = _breakers.setdefault(upstream, _new_breaker())
+        was_probe = probe is not None and breaker["probe"] == probe
+        if was_probe:
+            breaker["probe"] = None
+        if success is None or (breaker["state"] != "closed" and not was_probe):
+            return
+        if success:
+            if breaker["state"] != "closed":
+                logger.info("circuit breaker for %s closed", upstream)
+            breaker.update(state="closed", failures=0, openedAt=None)
+            return
+        breaker["failures"] += 1
+        if breaker["state"] != "closed" or breaker["failures"] >= _BREAKER_FAILURE_THRESHOLD:
+            if breaker["state"] != "open":
+                breaker["opens"] += 1
+                logger.warning("circuit breaker for %s opened after %s failures", upstream, breaker["failures"])
+            breaker.update(state="open", openedAt=time.time())
+
+
+def _breaker_rejection(upstream: str, retry_after: int) -> tuple[int, Any]:
+    hints = _response_hints.get()
+    if hints is not None:
+        hints["retryAfter"] = max(hints.get("retryAfter", 0), retry_after)
+    return 503, {
+        "error": "upstream circuit open",
+        "upstream": upstream,
+        "retryAfterSeconds": retry_after,
+    }
+
+
+def _breaker_snapshot() -> dict:
+    now = time.time()
+    with _breakers_lock:
+        breakers = {upstream: dict(values) for upstream, values in _breakers.items()}
+    snapshot = {}
+    for upstream in _UPSTREAM_POOLS:
+        breaker = breakers.get(upstream) or _new_breaker()
+        opened_at = breaker.pop("openedAt")
+        breaker["probeInFlight"] = breaker.pop("probe") is not None
+        if breaker["state"] == "open" and opened_at is not None:
+            breaker["retryAfterSeconds"] = max(0, math.ceil(opened_at + _BREAKER_RESET_SECONDS - now))
+        snapshot[upstream] = breaker
+    return snapshot
+
+# Rate limiting — token bucket per IP, no external deps. Each bucket holds up to RATE_LIMIT_MAX
+# tokens and refills fully in RATE_LIMIT_WINDOW seconds. Solo se usa desde el event loop, asi que
+# no necesita lock; los buckets se guardan en orden LRU y los inactivos se olvidan.
 _RATE_LIMIT_WINDOW: int = int(os.getenv("RATE_LIMIT_WINDOW", "60"))   # seconds
 _RATE_LIMIT_MAX: int = int(os.getenv("RATE_LIMIT_MAX", "120"))         # requests per window per IP
-_rate_buckets: dict[str, list[float]] = {}
-_rate_lock = threading.Lock()
+_rate_buckets: "OrderedDict[str, list[float]]" = OrderedDict()  # ip → [tokens, ultimo uso]
+
+
+def _token_bucket(tokens: Optional[float], updated: float, now: float, cost: float) -> tuple[bool, float, float]:
+    """Rellena y descuenta ``cost``; devuelve (permitido, tokens restantes, segundos de espera)."""
+    rate = _RATE_LIMIT_MAX / _RATE_LIMIT_WINDOW
+    tokens = float(_RATE_LIMIT_MAX) if tokens is None else min(_RATE_LIMIT_MAX, tokens + max(0.0, now - updated) * rate)
+    allowed = tokens >= cost
+    if allowed:
+        tokens -= cost
+    return allowed, tokens, 0.0 if allowed else (cost - tokens) / rate
+
+
+def _rate_limit_take(client: str, now: float, cost: float = 1.0) -> tuple[bool, float, float]:
+    """Bucket local del proceso, en O(1)."""
+    bucket = _rate_buckets.pop(client, None)
+    result = _token_bucket(bucket[0] if bucket else None, bucket[1] if bucket else now, now, cost)
+    _rate_buckets[client] = [result[1], now]
+    # Un bucket inactivo durante una ventana completa ya estaria lleno: equivale a no tenerlo.
+    while now - next(iter(_rate_buckets.values()))[1] >= _RATE_LIMIT_WINDOW:
+        _rate_buckets.popitem(last=False)
+    return result
+
+
+# Store compartido para que el limite sea por cliente y no por worker: SQLite para los workers de
+# un host (en /dev/shm queda en memoria compartida) o Redis para varias replicas. RATE_LIMIT_STORE
+# elige local, sqlite o redis; sin valor se deduce de RATE_LIMIT_REDIS_URL / RATE_LIMIT_SQLITE_PATH.
+# Si el store falla se usan los buckets locales y se reintenta tras RATE_LIMIT_STORE_RETRY segundos.
+_RATE_LIMIT_STORE = os.getenv("RATE_LIMIT_STORE", "").strip().lower()
+_RATE_LIMIT_SQLITE_PATH = os.getenv("RATE_LIMIT_SQLITE_PATH", "")
+_RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "")
+_RATE_LIMIT_REDIS_PREFIX = os.getenv("RATE_LIMIT_REDIS_PREFIX", "ordina:rate:")
+_RATE_LIMIT_STORE_RETRY = float(os.getenv("RATE_LIMIT_STORE_RETRY", "30"))
+_rate_store_state = {"retryAt": 0.0, "errors": 0}
+_rate_sqlite_conn: Optional[sqlite3.Connection] = None
+_rate_sqlite_last_sweep = 0.0
+_rate_sqlite_lock = threading.Lock()
+_rate_redis_client: Any = None
+# Token bucket atomico en Redis: misma formula que _token_bucket y expiracion cuando se rellena.
+_RATE_REDIS_SCRIPT = """
+local capacity, rate = tonumber(ARGV[1]), tonumber(ARGV[2])
+local now, cost = tonumber(ARGV[3]), tonumber(ARGV[4])
+local state = redis.call("HMGET", KEYS[1], "tokens", "updated")
+local tokens = tonumber(state[1])
+if tokens == nil then
+  tokens = capacity
+else
+  tokens = math.min(capacity, tokens + math.max(0, now - tonumber(state[2])) * rate)
+end
+local allowed = 0
+if tokens >= cost then
+  tokens = tokens - cost
+  allowed = 1
+end
+redis.call("HSET", KEYS[1], "tokens", tostring(tokens), "updated", tostring(now))
+redis.call("EXPIRE", KEYS[1], math.ceil((capacity - tokens) / rate) + 1)
+return {allowed, tostring(tokens)}
+"""
+
+
+def _rate_sqlite_take(client: str, now: float, cost: float) -> tuple[bool, float, float]:
+    global _rate_sqlite_conn, _rate_sqlite_last_sweep
+    with _rate_sqlite_lock:
+        if _rate_sqlite_conn is None:
+            conn = sqlite3.connect(_RATE_LIMIT_SQLITE_PATH, timeout=1, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS buckets (client TEXT PRIMARY KEY, tokens REAL, updated REAL)")
+            _rate_sqlite_conn = conn
+        conn = _rate_sqlite_conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE client = ?", (client,)).fetchone()
+            result = _token_bucket(row[0] if row else None, row[1] if row else now, now, cost)
+            conn.execute("INSERT OR REPLACE INTO buckets VALUES (?, ?, ?)", (client, result[1], now))
+            if now - _rate_sqlite_last_sweep >= _RATE_LIMIT_WINDOW:
+                _rate_sqlite_last_sweep = now
+                rate = _RATE_LIMIT_MAX / _RATE_LIMIT_WINDOW
+                conn.execute("DELETE FROM buckets WHERE updated + (? - tokens) / ? < ?", (_RATE_LIMIT_MAX, rate, now))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    return result
+
+
+def _rate_redis_take(client: str, now: float, cost: float) -> tuple[bool, float, float]:
+    global _rate_redis_client
+    with _redis_lock:
+        if _rate_redis_client is None:
+            _rate_redis_client = _redis_connect(_RATE_LIMIT_REDIS_URL, _CACHE_REDIS_TIMEOUT)
+        conn = _rate_redis_client
+    rate = _RATE_LIMIT_MAX / _RATE_LIMIT_WINDOW
+    allowed, tokens = conn.eval(
+        _RATE_REDIS_SCRIPT, 1, _RATE_LIMIT_REDIS_PREFIX + client, _RATE_LIMIT_MAX, rate, now, cost
+    )
+    tokens = float(tokens)
+    return bool(allowed), tokens, 0.0 if allowed else (cost - tokens) / rate
+
+
+_RATE_LIMIT_STORES = {"sqlite": _rate_sqlite_take, "redis": _rate_redis_take}
+
+
+def _rate_limit_store_name() -> str:
+    return _RATE_LIMIT_STORE or ("redis" if _RATE_LIMIT_REDIS_URL else "sqlite" if _RATE_LIMIT_SQLITE_PATH else "local")
+
+
+async def _rate_limit_acquire(client: str, cost: float) -> tuple[bool, float, float]:
+    store = _RATE_LIMIT_STORES.get(_rate_limit_store_name())
+    if store is not None and time.monotonic() >= _rate_store_state["retryAt"]:
+        try:
+            # El store hace I/O: fuera del event loop.
+            return await run_in_threadpool(store, client, time.time(), cost)
+        except Exception as exc:  # noqa: BLE001 - red, SQLite o cliente Redis ausente
+            _rate_store_state["errors"] += 1
+            _rate_store_state["retryAt"] = time.monotonic() + _RATE_LIMIT_STORE_RETRY
+            logger.warning("rate limit store %s no disponible, se usan buckets locales: %s", _rate_limit_store_name(), exc)
+    return _rate_limit_take(client, time.monotonic(), cost)
+
+
+# Coste por ruta: las rutas sin upstream valen menos que una busqueda y /health/deep consulta
+# tres fuentes. Los POST suman un token por cada RATE_LIMIT_BYTES_PER_TOKEN bytes de cuerpo, y
+# /citas/extraer cobra RATE_LIMIT_CITA_COST por consulta a las fuentes antes de hacerla.
+_RATE_LIMIT_COSTS: dict[str, float] = {
+    "/": 0.2,
+    "/health": 0.2,
+    "/health/cache": 0.2,
+    "/health/pools": 0.2,
+    "/health/deep": 3.0,
+}
+_RATE_LIMIT_BYTES_PER_TOKEN: int = max(1, int(os.getenv("RATE_LIMIT_BYTES_PER_TOKEN", str(64 * 1024))))
+_RATE_LIMIT_CITA_COST: float = float(os.getenv("RATE_LIMIT_CITA_COST", "1"))
+try:
+    _RATE_LIMIT_COSTS.update({path: float(cost) for path, cost in json.loads(os.getenv("RATE_LIMIT_COSTS", "{}")).items()})
+except (ValueError, AttributeError, TypeError) as exc:
+    logger.warning("RATE_LIMIT_COSTS invalido, se ignora: %s", exc)
+
+
+def _rate_limit_cost(scope: dict) -> float:
+    cost = _RATE_LIMIT_COSTS.get(scope.get("path") or "", 1.0)
+    if scope.get("method") == "POST":
+        for name, value in scope.get("headers") or []:
+            if name == b"content-length" and value.isdigit():
+                cost += int(value) // _RATE_LIMIT_BYTES_PER_TOKEN
+    # Un coste mayor que la capacidad nunca podria pagarse.
+    return min(cost, float(_RATE_LIMIT_MAX))
+
+
+def _rate_limit_headers(remaining: float, cost: float) -> dict[str, str]:
+    rate = _RATE_LIMIT_MAX / _RATE_LIMIT_WINDOW
+    return {
+        "X-RateLimit-Limit": str(_RATE_LIMIT_MAX),
+        "X-RateLimit-Remaining": str(max(0, math.floor(remaining))),
+        "X-RateLimit-Reset": str(math.ceil((_RATE_LIMIT_MAX - remaining) / rate)),
+        "X-RateLimit-Cost": f"{cost:g}",
+    }
+
+
+def _rate_limit_rejection(wait: float, remaining: float, cost: float, requested: Optional[float] = None) -> JSONResponse:
+    retry_after = max(1, math.ceil(wait))
+    content: dict[str, Any] = {"error": "rate limit exceeded", "retryAfterSeconds": retry_after}
+    if requested is not None:
+        content["requestedCost"] = requested
+    return JSONResponse(
+        status_code=429,
+        content=content,
+        headers={"Retry-After": str(retry_after), **_rate_limit_headers(remaining, cost)},
+    )
+
+
+async def _charge_rate_cost(units: float) -> Optional[JSONResponse]:
+    """Cobra un coste extra de la peticion en curso antes del trabajo; devuelve un 429 si el bucket no alcanza."""
+    hints = _response_hints.get()
+    if hints is None or units <= 0:
+        return None
+    # X-RateLimit-Cost informa lo descontado del bucket: el coste base y los cargos extra aceptados.
+    charged = hints["rateBase"] + hints.get("rateCost", 0)
+    if units > _RATE_LIMIT_MAX:
+        # Nunca cabria en el bucket: se rechaza sin cobrar en lugar de recortar el coste.
+        return JSONResponse(
+            status_code=413,
+            content={"error": "el coste de la peticion excede la capacidad del limite", "requestedCost": units},
+            headers=_rate_limit_headers(hints["rateRemaining"], charged),
+        )
+    allowed, remaining, wait = await _rate_limit_acquire(hints["rateClient"], units)
+    hints["rateRemaining"] = remaining
+    if not allowed:
+        return _rate_limit_rejection(wait, remaining, charged, requested=units)
+    hints["rateCost"] = hints.get("rateCost", 0) + units
+    return None
 
 
 def _parse_bool(value: Any, default: bool = False) -> bool:
@@ -317,17 +1754,254 @@ def _canonical_article_text(articulo_fragmento: str, ley_fragmento: str, *, cons
     return f"{articulo} {_article_connector(ley)} {ley}".strip()
 
 
-_LEYES_INDEX = [
-    {
-        "id": ley.get("id"),
-        "categoria": ley.get("categoria"),
-        "nombre": ley.get("nombre") or "",
-        "nombreNormalizado": _normalize_text(ley.get("nombre") or ""),
+# Estructuras derivadas del catalogo `leyes` (indice por longitud de nombre, blob de nombres,
+# automata, bitsets, trigramas e indice invertido). Se construyen juntas en _build_leyes_catalog al
+# primer uso y se reconstruyen juntas si `leyes` se reemplaza o cambia de tamano.
+_LEYES_TOKEN_EXPANSIONS_MAX = 4096  # expansiones de tokens parciales memorizadas por catalogo
+_LEY_TRIGRAM_THRESHOLD = float(os.getenv("LEY_TRIGRAM_THRESHOLD", "0.65"))
+# Similitud a partir de la cual /normas/buscar responde con el nombre parecido sin consultar el SIL.
+_LEY_TRIGRAM_SKIP_SIL = float(os.getenv("LEY_TRIGRAM_SKIP_SIL", "0.8"))
+_LEY_TRIGRAM_MIN_CHARS = 6
+_leyes_catalog_state: Optional[dict] = None
+_leyes_catalog_lock = threading.Lock()
+
+
+def _trigrams(value: str) -> set[str]:
+    text = _normalize_search_text(value)
+    if not text:
+        return set()
+    text = f" {text} "
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+def _build_leyes_automaton(index: list[dict]) -> tuple[dict[int, int], list[int], list[int]]:
+    """Transiciones (nodo << 21 | caracter) -> nodo, enlaces de fallo y, por nodo, la primera ley de
+    `index` que termina ahi o en alguno de sus sufijos."""
+    missing = len(index)
+    goto: dict[int, int] = {}
+    best = [missing]
+    children: list[list[tuple[int, int]]] = [[]]
+    for position, candidate in enumerate(index):
+        node = 0
+        for ch in candidate["nombreNormalizado"]:
+            key = node << 21 | ord(ch)
+            child = goto.get(key)
+            if child is None:
+                child = goto[key] = len(best)
+                best.append(missing)
+                children.append([])
+                children[node].append((ord(ch), child))
+            node = child
+        best[node] = min(best[node], position)
+    fail = [0] * len(best)
+    queue = [child for _, child in children[0]]
+    for node in queue:
+        for code, child in children[node]:
+            state = fail[node]
+            while state and (state << 21 | code) not in goto:
+                state = fail[state]
+            fail[child] = goto.get(state << 21 | code, 0)
+            best[child] = min(best[child], best[fail[child]])
+            queue.append(child)
+    return goto, fail, best
+
+
+def _build_leyes_catalog(catalog: list) -> dict:
+    index = [
+        {
+            "id": ley.get("id"),
+            "categoria": ley.get("categoria"),
+            "nombre": ley.get("nombre") or "",
+            "nombreNormalizado": _normalize_text(ley.get("nombre") or ""),
+        }
+        for ley in catalog
+        if isinstance(ley, dict) and str(ley.get("nombre") or "").strip()
+    ]
+    index.sort(key=lambda item: len(item["nombreNormalizado"]), reverse=True)
+
+    by_name: dict[str, dict] = {}
+    # Nombres normalizados concatenados: "consulta contenida en algun nombre" se resuelve con
+    # str.find sobre un solo bloque en lugar de una comparacion por ley.
+    offsets: list[int] = []
+    offset = 0
+    # Bitsets palabra -> leyes de `index` (bit i = posicion i) para puntuar todo el catalogo con
+    # operaciones sobre enteros en lugar de un recorrido por candidato.
+    word_bits: dict[str, int] = {}
+    trigram_counts: list[int] = []
+    trigram_postings: dict[str, list[int]] = {}
+    for position, candidate in enumerate(index):
+        name = candidate["nombreNormalizado"]
+        by_name.setdefault(name, candidate)
+        offsets.append(offset)
+        offset += len(name) + 1
+        for word in set(name.split(" ")):
+            word_bits[word] = word_bits.get(word, 0) | (1 << position)
+        grams = _trigrams(candidate["nombre"])
+        trigram_counts.append(len(grams))
+        for gram in grams:
+            trigram_postings.setdefault(gram, []).append(position)
+
+    # Indice invertido token -> posiciones (ordenadas) en `catalog`, para /ley?nombre=.
+    postings: dict[str, list[int]] = {}
+    for pos, ley in enumerate(catalog):
+        for token in set(_normalize_text(ley.get("nombre", "")).split(" ")):
+            if token:
+                postings.setdefault(token, []).append(pos)
+
+    return {
+        "source": catalog,
+        "size": len(catalog),
+        "index": index,
+        "byName": by_name,
+        "nameBlob": "\n".join(candidate["nombreNormalizado"] for candidate in index),
+        "nameOffsets": offsets,
+        "automaton": _build_leyes_automaton(index),
+        "wordBits": word_bits,
+        "tokenBits": {},
+        "trigramCounts": trigram_counts,
+        "trigramPostings": trigram_postings,
+        "postings": postings,
+        "expansions": {},
     }
-    for ley in leyes
-    if isinstance(ley, dict) and str(ley.get("nombre") or "").strip()
-]
-_LEYES_INDEX.sort(key=lambda item: len(item["nombreNormalizado"]), reverse=True)
+
+
+def _leyes_catalog() -> dict:
+    """Estructuras vigentes; se reconstruyen si el catalogo `leyes` fue reemplazado o modificado."""
+    global _leyes_catalog_state
+    state = _leyes_catalog_state
+    if state is None or state["source"] is not leyes or state["size"] != len(leyes):
+        with _leyes_catalog_lock:
+            state = _leyes_catalog_state
+            if state is None or state["source"] is not leyes or state["size"] != len(leyes):
+                state = _leyes_catalog_state = _build_leyes_catalog(leyes)
+    return state
+
+
+def _leyes_contained_in(text_norm: str) -> Optional[dict]:
+    """Primera ley del indice (la de nombre mas largo) cuyo nombre aparece dentro del texto."""
+    catalog = _leyes_catalog()
+    index = catalog["index"]
+    goto, fail, best = catalog["automaton"]
+    found = len(index)
+    node = 0
+    for ch in text_norm:
+        code = ord(ch)
+        while node and (node << 21 | code) not in goto:
+            node = fail[node]
+        node = goto.get(node << 21 | code, 0)
+        if best[node] < found:
+            found = best[node]
+    return index[found] if found < len(index) else None
+
+
+def _leyes_containing(text_norm: str) -> Optional[dict]:
+    """Ley de nombre mas corto que contiene el texto; en empate, la primera del indice."""
+    catalog = _leyes_catalog()
+    index, blob, offsets = catalog["index"], catalog["nameBlob"], catalog["nameOffsets"]
+    match = None
+    start = blob.find(text_norm)
+    while start >= 0:
+        position = bisect.bisect_right(offsets, start) - 1
+        candidate = index[position]
+        if match is None or len(candidate["nombreNormalizado"]) < len(match["nombreNormalizado"]):
+            match = candidate
+        start = blob.find(text_norm, offsets[position] + len(candidate["nombreNormalizado"]) + 1)
+    return match
+
+
+def _leyes_token_bits(catalog: dict, token: str) -> int:
+    """Leyes cuyo nombre contiene `token` (tambien como fragmento de palabra)."""
+    cache = catalog["tokenBits"]
+    bits = cache.get(token)
+    if bits is None:
+        bits = 0
+        for word, word_bits in catalog["wordBits"].items():
+            if token in word:
+                bits |= word_bits
+        if len(cache) >= _LEYES_TOKEN_EXPANSIONS_MAX:
+            cache.clear()
+        cache[token] = bits
+    return bits
+
+
+def _leyes_best_token_overlap(tokens: list[str]) -> tuple[int, int]:
+    """Mayor numero de tokens contenidos en un nombre y bitset de las leyes que lo alcanzan.
+
+    Los conteos se acumulan en un sumador por planos de bits (plano i = bit i del conteo de
+    cada ley), y el maximo se obtiene recorriendo los planos de mayor a menor."""
+    catalog = _leyes_catalog()
+    planes: list[int] = []
+    for token in tokens:
+        carry = _leyes_token_bits(catalog, token)
+        for index, plane in enumerate(planes):
+            if not carry:
+                break
+            planes[index], carry = plane ^ carry, plane & carry
+        if carry:
+            planes.append(carry)
+    best_bits = (1 << len(catalog["index"])) - 1
+    best_score = 0
+    for index in range(len(planes) - 1, -1, -1):
+        bits = best_bits & planes[index]
+        if bits:
+            best_bits = bits
+            best_score |= 1 << index
+    return best_score, best_bits if best_score else 0
+
+
+# Similitud de trigramas de caracteres para tolerar erratas ("Codigo Civil Federla") sin consultar el SIL.
+def _leyes_similares(raw_ley: str, limit: int = 5, threshold: Optional[float] = None) -> list[tuple[float, dict]]:
+    """Leyes del catalogo por similitud de trigramas (coeficiente de Dice) sobre el umbral, de mayor a menor."""
+    if len(_normalize_search_text(raw_ley)) < _LEY_TRIGRAM_MIN_CHARS:
+        return []
+    catalog = _leyes_catalog()
+    index, counts, trigram_postings = catalog["index"], catalog["trigramCounts"], catalog["trigramPostings"]
+    grams = _trigrams(raw_ley)
+    shared: dict[int, int] = {}
+    for gram in grams:
+        for position in trigram_postings.get(gram, ()):
+            shared[position] = shared.get(position, 0) + 1
+    minimum = _LEY_TRIGRAM_THRESHOLD if threshold is None else threshold
+    scored = []
+    for position, count in shared.items():
+        similarity = 2 * count / (len(grams) + counts[position])
+        if similarity >= minimum:
+            scored.append((similarity, position))
+    best = heapq.nsmallest(limit, scored, key=lambda item: (-item[0], len(index[item[1]]["nombre"]), item[1]))
+    return [(round(similarity, 3), index[position]) for similarity, position in best]
+
+
+def _resolve_ley_trigram(raw_ley: str) -> Optional[dict]:
+    matches = _leyes_similares(raw_ley, limit=1)
+    return matches[0][1] if matches else None
+
+
+def _leyes_token_postings(catalog: dict, token: str) -> list[int]:
+    """Posiciones cuyo nombre contiene `token`, incluso como fragmento de una palabra ("civ" -> "civil")."""
+    expansions = catalog["expansions"]
+    found = expansions.get(token)
+    if found is None:
+        postings = catalog["postings"]
+        matched = [postings[word] for word in postings if token in word]
+        found = matched[0] if len(matched) == 1 else sorted(set().union(*matched))
+        if len(expansions) >= _LEYES_TOKEN_EXPANSIONS_MAX:
+            expansions.clear()
+        expansions[token] = found
+    return found
+
+
+def _leyes_matching_name(nombre: str) -> list[int]:
+    catalog = _leyes_catalog()
+    tokens = {token for token in _normalize_text(nombre).split(" ") if token}
+    if not tokens:
+        return []
+    postings = sorted((_leyes_token_postings(catalog, token) for token in tokens), key=len)
+    hits = set(postings[0])
+    for positions in postings[1:]:
+        if not hits:
+            break
+        hits.intersection_update(positions)
+    return sorted(hits)
 
 
 def _default_sjf_payload(q: str) -> dict:
@@ -443,70 +2117,369 @@ def _tepjf_headers() -> dict:
     )
 
 
-def _http_json(
+def _parse_upstream_body(resp: httpx.Response) -> Any:
+    try:
+        return resp.json()
+    except Exception:
+        return {"rawText": resp.text}
+
+
+def _upstream_result(
+    resp: httpx.Response,
+    method: str,
     url: str,
-    method: str = "GET",
-    body: Optional[Any] = None,
-    headers: Optional[dict] = None,
-    use_cache: bool = False,
+    cache_key: Optional[str] = None,
+    cache_policy: Optional[dict] = None,
 ) -> tuple[int, Any]:
-    cache_key = _cache_key(url, method, body) if use_cache else None
+    parsed = _parse_upstream_body(resp)
+    status = resp.status_code
     if cache_key:
-        cached = _get_cached(cache_key)
-        if cached is not None:
-            return cached
+        _set_cached(cache_key, status, parsed, cache_policy, url)
+    if status >= 400:
+        logger.warning("upstream HTTP error %s for %s %s", status, method, url)
+    return status, parsed
 
-    content = json.dumps(body).encode("utf-8") if body is not None else None
-    try:
-        resp = _http_client.request(method=method, url=url, content=content, headers=headers or {})
-        try:
-            parsed: Any = resp.json()
-        except Exception:
-            parsed = {"rawText": resp.text}
-        status = resp.status_code
-        if status < 400 and cache_key:
-            _set_cached(cache_key, status, parsed)
-        elif status >= 400:
-            logger.warning("upstream HTTP error %s for %s %s", status, method, url)
-        return status, parsed
-    except httpx.TimeoutException as exc:
+
+def _upstream_failure(exc: Exception, method: str, url: str) -> tuple[int, Any]:
+    if isinstance(exc, httpx.TimeoutException):
         logger.error("upstream timeout for %s %s", method, url)
         return 504, {"error": "upstream request timed out", "errorType": type(exc).__name__, "detail": str(exc)}
-    except httpx.RequestError as exc:
+    if isinstance(exc, httpx.RequestError):
         logger.error("upstream request error for %s %s: %s", method, url, exc)
-        return 502, {"error": "upstream request failed", "errorType": type(exc).__name__, "detail": str(exc)}
-    except Exception as exc:
+    else:
         logger.error("unexpected error for %s %s: %s", method, url, exc)
-        return 502, {"error": "upstream request failed", "errorType": type(exc).__name__, "detail": str(exc)}
+    return 502, {"error": "upstream request failed", "errorType": type(exc).__name__, "detail": str(exc)}
+
+
+def _multipart_files(fields: Optional[dict]) -> dict:
+    # httpx envia multipart/form-data cuando se pasa files=; usar (None, valor) lo trata
+    # como campo de texto sin nombre de archivo.
+    return {key: (None, "" if value is None else str(value)) for key, value in (fields or {}).items()}
+
+
+# Single-flight — peticiones identicas concurrentes (misma _cache_key) esperan a una sola
+# llamada al upstream y comparten su resultado mediante un future del loop que la lanzo.
+_inflight_lock = threading.Lock()
+_inflight_async: dict[str, asyncio.Future] = {}
+_single_flight_stats: dict[str, int] = {"leaders": 0, "coalesced": 0}
+
+
+async def _single_flight_async(key: str, call) -> tuple[int, Any]:
+    future = _inflight_async.get(key)
+    # Un future solo puede esperarse desde su propio loop (app o _run_sync).
+    if future is not None and not future.done() and future.get_loop() is asyncio.get_running_loop():
+        with _inflight_lock:
+            _single_flight_stats["coalesced"] += 1
+        # asyncio.wait no propaga la cancelacion de este seguidor al future compartido.
+        await asyncio.wait({future})
+        if not future.cancelled() and future.exception() is None:
+            return future.result()
+        return await call()
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight_async[key] = future
+    with _inflight_lock:
+        _single_flight_stats["leaders"] += 1
+    try:
+        result = await call()
+        future.set_result(result)
+        return result
+    finally:
+        if _inflight_async.get(key) is future:
+            del _inflight_async[key]
+        if not future.done():
+            future.cancel()
+
+
+async def _send_json_async(
+    url: str,
+    method: str,
+    body: Optional[Any],
+    headers: Optional[dict],
+    cache_key: Optional[str],
+    cache_policy: Optional[dict] = None,
+) -> tuple[int, Any]:
+    content = json.dumps(body).encode("utf-8") if body is not None else None
+    upstream = _upstream_for_url(url)
+    retry_after, probe = _breaker_acquire(upstream)
+    if retry_after is not None:
+        return _breaker_rejection(upstream, retry_after)
+    success = None
+    try:
+        with _track_upstream_request(upstream):
+            resp = await _get_async_http_client(upstream).request(
+                method=method, url=url, content=content, headers=headers or {}
+            )
+        success = resp.status_code < 500
+        return _upstream_result(resp, method, url, cache_key, cache_policy)
+    except Exception as exc:
+        success = False
+        return _upstream_failure(exc, method, url)
+    finally:
+        _breaker_record(upstream, success, probe)
+
+
+async def _send_multipart_async(
+    url: str,
+    fields: Optional[dict],
+    headers: Optional[dict],
+    cache_key: Optional[str] = None,
+    cache_policy: Optional[dict] = None,
+) -> tuple[int, Any]:
+    upstream = _upstream_for_url(url)
+    retry_after, probe = _breaker_acquire(upstream)
+    if retry_after is not None:
+        return _breaker_rejection(upstream, retry_after)
+    success = None
+    try:
+        with _track_upstream_request(upstream):
+            resp = await _get_async_http_client(upstream).request(
+                method="POST", url=url, files=_multipart_files(fields), headers=headers or {}
+            )
+        success = resp.status_code < 500
+        return _upstream_result(resp, "POST", url, cache_key, cache_policy)
+    except Exception as exc:
+        success = False
+        return _upstream_failure(exc, "POST", url)
+    finally:
+        _breaker_record(upstream, success, probe)
+
+
+async def _cache_lookup(key: str, route: str, url: str) -> tuple[str, Optional[tuple[float, float, int, Any]]]:
+    """Clasifica la entrada: hit (fresca), revalidate (stale servible), stale (solo respaldo) o miss."""
+    entry = await _get_cached_entry_async(key)
+    if entry is None:
+        state = "miss"
+    elif entry[0] <= entry[1]:
+        state = "hit"
+    elif entry[0] <= entry[1] + _CACHE_STALE_WHILE_REVALIDATE:
+        state = "revalidate"
+    else:
+        state = "stale"
+    event = "hits" if state == "hit" else "staleHits" if state == "revalidate" else "misses"
+    with _cache_lock:
+        _cache_stats[event] += 1
+        _count_cache_event(route, url, event)
+        if state == "hit" and entry[2] >= 400:
+            _cache_stats["negativeHits"] += 1
+        if state == "hit":
+            _cache_access[key] = _cache_access.get(key, 0) + 1
+    if state == "revalidate":
+        _note_stale_response(entry[0], "STALE")
+    return state, entry
+
+
+def _note_stale_response(age: float, kind: str) -> None:
+    hints = _response_hints.get()
+    if hints is not None:
+        hints["cache"] = kind
+        hints["age"] = int(age)
+
+
+def _serve_stale_on_error(result: tuple[int, Any], entry: Optional[tuple[float, float, int, Any]]) -> tuple[int, Any]:
+    if entry is None or result[0] < 500 or entry[0] > entry[1] + _CACHE_STALE_IF_ERROR:
+        return result
+    logger.warning("serving stale cache entry (%ss old) after upstream status %s", int(entry[0]), result[0])
+    with _cache_lock:
+        _cache_stats["staleIfError"] += 1
+    _note_stale_response(entry[0], "STALE-IF-ERROR")
+    return entry[2], entry[3]
+
+
+_refreshing: set[str] = set()
+_background_tasks: set = set()
+# Los refrescos en segundo plano son tareas del loop; CACHE_REFRESH_WORKERS acota cuantas llaman
+# al upstream a la vez.
+_CACHE_REFRESH_WORKERS = max(1, _env_int("CACHE_REFRESH_WORKERS", 4))
+# Cupos por (grupo, loop): un asyncio.Semaphore queda ligado al loop donde se usa por primera vez.
+_loop_slots: dict[tuple[str, asyncio.AbstractEventLoop], asyncio.Semaphore] = {}
+# Refresh-ahead: una entrada con al menos CACHE_REFRESH_AHEAD_HITS aciertos desde que se guardo
+# se vuelve a pedir en segundo plano cuando le queda menos de CACHE_REFRESH_AHEAD_FRACTION de su
+# TTL, con su propio cupo de tareas y un presupuesto de CACHE_REFRESH_AHEAD_RATE peticiones por segundo.
+_CACHE_REFRESH_AHEAD_HITS = _env_int("CACHE_REFRESH_AHEAD_HITS", 0)  # 0 desactiva
+_CACHE_REFRESH_AHEAD_FRACTION = _env_float("CACHE_REFRESH_AHEAD_FRACTION", 0.1)
+_CACHE_REFRESH_AHEAD_RATE = _env_float("CACHE_REFRESH_AHEAD_RATE", 2.0)
+_CACHE_REFRESH_AHEAD_WORKERS = max(1, _env_int("CACHE_REFRESH_AHEAD_WORKERS", 2))
+_refresh_ahead_budget = {"tokens": 0.0, "updated": time.monotonic()}
+
+
+def _claim_refresh(key: str) -> bool:
+    with _cache_lock:
+        if key in _refreshing:
+            return False
+        _refreshing.add(key)
+        _cache_stats["refreshes"] += 1
+        return True
+
+
+def _release_refresh(key: str) -> None:
+    with _cache_lock:
+        _refreshing.discard(key)
+
+
+def _slots_for(pool: str, workers: int) -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    slots = _loop_slots.get((pool, loop))
+    if slots is None:
+        for stale in [stale for stale in _loop_slots if stale[1].is_closed()]:
+            del _loop_slots[stale]
+        slots = _loop_slots[(pool, loop)] = asyncio.Semaphore(workers)
+    return slots
+
+
+def _refresh_in_background(key: str, call, pool: str = "cache-refresh", workers: int = _CACHE_REFRESH_WORKERS) -> None:
+    if not _claim_refresh(key):
+        return
+    loop = asyncio.get_running_loop()
+    slots = _slots_for(pool, workers)
+
+    async def run() -> None:
+        try:
+            async with slots:
+                await _single_flight_async(key, call)
+        finally:
+            _release_refresh(key)
+
+    task = loop.create_task(run())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
 
 
-def _http_multipart(
+def _refresh_ahead_due(key: str, entry: tuple[float, float, int, Any]) -> bool:
+    """True si una entrada fresca y popular esta por vencer y queda presupuesto para refrescarla."""
+    age, ttl, status, _ = entry
+    if _CACHE_REFRESH_AHEAD_HITS <= 0 or status >= 400 or ttl - age > ttl * _CACHE_REFRESH_AHEAD_FRACTION:
+        return False
+    with _cache_lock:
+        if key in _refreshing or _cache_access.get(key, 0) < _CACHE_REFRESH_AHEAD_HITS:
+            return False
+        # Token bucket: rafaga maxima de un segundo de presupuesto.
+        now = time.monotonic()
+        refill = (now - _refresh_ahead_budget["updated"]) * _CACHE_REFRESH_AHEAD_RATE
+        _refresh_ahead_budget["tokens"] = min(max(1.0, _CACHE_REFRESH_AHEAD_RATE), _refresh_ahead_budget["tokens"] + refill)
+        _refresh_ahead_budget["updated"] = now
+        if _refresh_ahead_budget["tokens"] < 1:
+            _cache_stats["refreshAheadThrottled"] += 1
+            return False
+        _refresh_ahead_budget["tokens"] -= 1
+        _cache_stats["refreshAhead"] += 1
+        return True
+
+
+def _note_cache_variant(key: str, variant: Optional[str], state: str) -> None:
+    # Mide la ganancia de las claves canonicas: aciertos servidos a una forma literal distinta
+    # de la que lleno la entrada (sin canonicalizar habrian sido fallos).
+    if variant is None:
+        return
+    with _cache_lock:
+        if state in ("hit", "revalidate"):
+            if _cache_variants.get(key, variant) != variant:
+                _cache_stats["canonicalHits"] += 1
+        elif key in _cache:
+            _cache_variants.setdefault(key, variant)
+
+
+async def _cached_upstream_call_async(
+    key: str, url: str, policy: Optional[dict], send, variant: Optional[str] = None
+) -> tuple[int, Any]:
+    # Cache (con stale-while-revalidate) -> single-flight -> upstream -> stale-if-error.
+    entry = None
+    if policy is not None:
+        sources = _response_sources.get()
+        if sources is not None:
+            sources.add(key)
+        state, entry = await _cache_lookup(key, policy["name"], url)
+        if state == "revalidate":
+            _refresh_in_background(key, send)
+        elif state == "hit" and _refresh_ahead_due(key, entry):
+            _refresh_in_background(key, send, "cache-refresh-ahead", _CACHE_REFRESH_AHEAD_WORKERS)
+        if state in ("hit", "revalidate"):
+            _note_cache_variant(key, variant, state)
+            return entry[2], entry[3]
+    result = _serve_stale_on_error(await _single_flight_async(key, send), entry)
+    _note_cache_variant(key, variant, "miss")
+    return result
+
+
+async def _http_json_async(
+    url: str,
+    method: str = "GET",
+    body: Optional[Any] = None,
+    headers: Optional[dict] = None,
+    use_cache: bool = False,
+    cache_policy: Optional[str] = None,
+) -> tuple[int, Any]:
+    policy = _cache_policy(cache_policy, use_cache)
+    key, variant = _request_cache_key(url, method, body, policy)
+    cache_key = key if policy is not None else None
+    return await _cached_upstream_call_async(
+        key, url, policy, lambda: _send_json_async(url, method, body, headers, cache_key, policy), variant
+    )
+
+
+async def _http_multipart_async(
     url: str,
     fields: Optional[dict] = None,
     headers: Optional[dict] = None,
+    cache_policy: Optional[str] = None,
 ) -> tuple[int, Any]:
-    # httpx envia multipart/form-data cuando se pasa files=; usar (None, valor) lo trata
-    # como campo de texto sin nombre de archivo.
-    files = {key: (None, "" if value is None else str(value)) for key, value in (fields or {}).items()}
+    policy = _cache_policy(cache_policy)
+    key, variant = _request_cache_key(url, "POST", fields, policy)
+    cache_key = key if policy is not None else None
+    return await _cached_upstream_call_async(
+        key, url, policy, lambda: _send_multipart_async(url, fields, headers, cache_key, policy), variant
+    )
+
+
+# Segunda capa: respuesta final ya normalizada, por (ruta, parametros, includeRaw). Un acierto
+# evita _normalize_doc/_strip_html por completo. Usa el mismo LRU y la politica de la ruta;
+# no se guardan errores (JSONResponse) ni respuestas construidas con datos stale.
+def _response_cache_key(route: str, params: Any) -> str:
+    return _cache_key(f"response:{route}", "RESPONSE", params)
+
+
+def _begin_stale_watch() -> tuple[dict, Optional[contextvars.Token]]:
+    hints = _response_hints.get()
+    if hints is not None:
+        return hints, None
+    hints = {}
+    return hints, _response_hints.set(hints)
+
+
+def _store_response(key: str, route: str, policy: dict, response: Any, hints: dict, sources: set) -> Any:
+    if not isinstance(response, JSONResponse) and not hints.get("cache"):
+        _set_cached(key, 200, response, policy, _response_origin_url(route, sources))
+    return response
+
+
+async def _get_cached_response(key: str, route: str) -> Optional[tuple[int, Any]]:
+    cached = await _get_cached_async(key)
+    with _cache_lock:
+        _count_cache_event(route, f"response:{route}", "hits" if cached is not None else "misses")
+    return cached
+
+
+async def _response_cached_async(route: str, params: Any, build) -> Any:
+    policy = _cache_policy(route)
+    if policy is None:
+        return await build()
+    key = _response_cache_key(route, params)
+    outer_sources = _response_sources.get()
+    if outer_sources is not None:
+        outer_sources.add(key)
+    cached = await _get_cached_response(key, route)
+    if cached is not None:
+        return cached[1]
+    hints, token = _begin_stale_watch()
+    sources: set = set()
+    sources_token = _response_sources.set(sources)
     try:
-        resp = _http_client.request(method="POST", url=url, files=files, headers=headers or {})
-        try:
-            parsed: Any = resp.json()
-        except Exception:
-            parsed = {"rawText": resp.text}
-        status = resp.status_code
-        if status >= 400:
-            logger.warning("upstream HTTP error %s for POST %s", status, url)
-        return status, parsed
-    except httpx.TimeoutException as exc:
-        logger.error("upstream timeout for POST %s", url)
-        return 504, {"error": "upstream request timed out", "errorType": type(exc).__name__, "detail": str(exc)}
-    except httpx.RequestError as exc:
-        logger.error("upstream request error for POST %s: %s", url, exc)
-        return 502, {"error": "upstream request failed", "errorType": type(exc).__name__, "detail": str(exc)}
-    except Exception as exc:
-        logger.error("unexpected error for POST %s: %s", url, exc)
-        return 502, {"error": "upstream request failed", "errorType": type(exc).__name__, "detail": str(exc)}
+        response = await build()
+    finally:
+        _response_sources.reset(sources_token)
+        if token is not None:
+            _response_hints.reset(token)
+    return _store_response(key, route, policy, response, hints, sources)
 
 
 def _redact_headers(headers: Optional[dict]) -> dict:
@@ -519,7 +2492,7 @@ def _redact_headers(headers: Optional[dict]) -> dict:
     return safe_headers
 
 
-def _sjf_detail_attempt(ius: int, host_name: str, is_semanal, include_host_name: bool):
+def _sjf_detail_url(ius: int, host_name: str, is_semanal, include_host_name: bool) -> str:
     params = {}
     if include_host_name:
         params["hostName"] = host_name
@@ -528,43 +2501,243 @@ def _sjf_detail_attempt(ius: int, host_name: str, is_semanal, include_host_name:
     elif is_semanal is False:
         params["isSemanal"] = "false"
 
-    query = parse.urlencode(params)
-    url = f"{SJF_BASE}/tesis/{ius}"
-    if query:
-        url = f"{url}?{query}"
+    query = parse.urlencode(params)
+    url = f"{SJF_BASE}/tesis/{ius}"
+    if query:
+        url = f"{url}?{query}"
+    return url
+
+
+# Memoria de planes: la mayoria de los IUS solo resuelven con un valor de isSemanal, asi que se
+# recuerda el plan ganador por IUS y, como respaldo, el mas frecuente por rango de IUS
+# (los registros digitales son correlativos por epoca). Con SJF_PLAN_MEMORY_PATH se guarda en disco.
+_SJF_PLAN_MEMORY_MAX = _env_int("SJF_PLAN_MEMORY_MAX", 50000)
+_SJF_PLAN_BUCKET_SIZE = max(1, _env_int("SJF_PLAN_BUCKET_SIZE", 10000))
+_SJF_PLAN_MEMORY_PATH = os.getenv("SJF_PLAN_MEMORY_PATH", "")
+_SJF_PLAN_SAVE_EVERY = max(1, _env_int("SJF_PLAN_SAVE_EVERY", 50))
+_sjf_plan_by_ius: "OrderedDict[int, tuple[bool, bool]]" = OrderedDict()
+_sjf_plan_buckets: dict[int, dict[tuple[bool, bool], int]] = {}
+_sjf_plan_lock = threading.Lock()
+_sjf_plan_unsaved = 0
+
+
+def _sjf_plan_for(ius: int) -> tuple[Optional[tuple[bool, bool]], str]:
+    with _sjf_plan_lock:
+        plan = _sjf_plan_by_ius.get(ius)
+        if plan is not None:
+            _sjf_plan_by_ius.move_to_end(ius)
+            return plan, "ius"
+        wins = _sjf_plan_buckets.get(ius // _SJF_PLAN_BUCKET_SIZE)
+        if wins:
+            return max(wins, key=wins.get), "bucket"
+    return None, "default"
+
+
+def _remember_sjf_plan(ius: int, plan: tuple[bool, bool]) -> None:
+    global _sjf_plan_unsaved
+    with _sjf_plan_lock:
+        if _sjf_plan_by_ius.get(ius) == plan:
+            _sjf_plan_by_ius.move_to_end(ius)
+            return
+        _sjf_plan_by_ius[ius] = plan
+        _sjf_plan_by_ius.move_to_end(ius)
+        while len(_sjf_plan_by_ius) > _SJF_PLAN_MEMORY_MAX:
+            _sjf_plan_by_ius.popitem(last=False)
+        wins = _sjf_plan_buckets.setdefault(ius // _SJF_PLAN_BUCKET_SIZE, {})
+        wins[plan] = wins.get(plan, 0) + 1
+        _sjf_plan_unsaved += 1
+        should_save = _SJF_PLAN_MEMORY_PATH and _sjf_plan_unsaved >= _SJF_PLAN_SAVE_EVERY
+        if should_save:
+            _sjf_plan_unsaved = 0
+    if should_save:
+        # Se llama desde la ruta async de detalle: el volcado a disco va a un hilo.
+        _run_off_loop(_save_sjf_plan_memory)
+
+
+def _sjf_plan_payload() -> dict:
+    with _sjf_plan_lock:
+        return {
+            "ius": {str(ius): list(plan) for ius, plan in _sjf_plan_by_ius.items()},
+            "buckets": {
+                str(bucket): [[*plan, count] for plan, count in wins.items()]
+                for bucket, wins in _sjf_plan_buckets.items()
+            },
+        }
+
+
+def _merge_sjf_plan_payload(payload: dict) -> None:
+    with _sjf_plan_lock:
+        for ius, plan in (payload.get("ius") or {}).items():
+            _sjf_plan_by_ius.setdefault(int(ius), (bool(plan[0]), bool(plan[1])))
+        for bucket, entries in (payload.get("buckets") or {}).items():
+            wins = _sjf_plan_buckets.setdefault(int(bucket), {})
+            for sem, host, count in entries:
+                wins[(bool(sem), bool(host))] = max(wins.get((bool(sem), bool(host)), 0), int(count))
+
+
+def _save_sjf_plan_memory() -> None:
+    global _sjf_plan_unsaved
+    if not _SJF_PLAN_MEMORY_PATH:
+        return
+    payload = _sjf_plan_payload()
+    with _sjf_plan_lock:
+        _sjf_plan_unsaved = 0
+    try:
+        _write_json_atomic(_SJF_PLAN_MEMORY_PATH, payload)
+    except OSError as exc:
+        logger.warning("no se pudo guardar la memoria de planes SJF en %s: %s", _SJF_PLAN_MEMORY_PATH, exc)
+
+
+def _load_sjf_plan_memory() -> None:
+    if not _SJF_PLAN_MEMORY_PATH or not os.path.exists(_SJF_PLAN_MEMORY_PATH):
+        return
+    try:
+        with open(_SJF_PLAN_MEMORY_PATH, encoding="utf-8") as fh:
+            _merge_sjf_plan_payload(json.load(fh))
+    except (OSError, ValueError, TypeError, IndexError) as exc:
+        logger.warning("memoria de planes SJF invalida en %s: %s", _SJF_PLAN_MEMORY_PATH, exc)
+
 
-    headers = _sjf_headers(content_type=False)
-    started_at = time.time()
-    status, data = _http_json(url, method="GET", headers=headers)
-    elapsed_ms = int((time.time() - started_at) * 1000)
+_load_sjf_plan_memory()
+if _CACHE_SNAPSHOT_PATH and os.path.exists(_CACHE_SNAPSHOT_PATH):
+    _load_cache_snapshot(_CACHE_SNAPSHOT_PATH)
 
+
+def _sjf_detail_plans(is_semanal: Optional[bool], ius: Optional[int] = None) -> list[tuple[bool, bool]]:
+    if is_semanal is None:
+        plans = [(True, True), (False, True), (True, False), (False, False)]
+    else:
+        plans = [(bool(is_semanal), True), (bool(is_semanal), False)]
+    learned, _ = _sjf_plan_for(ius) if ius is not None else (None, "default")
+    if learned in plans:
+        plans.remove(learned)
+        plans.insert(0, learned)
+    return plans
+
+
+def _sjf_detail_attempt_record(
+    status: int,
+    data: Any,
+    url: str,
+    is_semanal,
+    include_host_name: bool,
+    started_at: float,
+    headers: dict,
+) -> dict:
     return {
         "status": status,
         "data": data,
         "url": url,
         "isSemanal": is_semanal,
         "hostNameIncluded": include_host_name,
-        "durationMs": elapsed_ms,
+        "durationMs": int((time.time() - started_at) * 1000),
         "requestHeaders": _redact_headers(headers),
     }
 
 
-def _sjf_detail_attempts(ius: int, host_name: str, is_semanal: Optional[bool]):
-    if is_semanal is None:
-        plans = [(True, True), (False, True), (True, False), (False, False)]
-    else:
-        plans = [(bool(is_semanal), True), (bool(is_semanal), False)]
+async def _sjf_detail_attempt_async(ius: int, host_name: str, is_semanal, include_host_name: bool):
+    url = _sjf_detail_url(ius, host_name, is_semanal, include_host_name)
+    headers = _sjf_headers(content_type=False)
+    started_at = time.time()
+    status, data = await _http_json_async(url, method="GET", headers=headers, cache_policy="sjf.detail")
+    return _sjf_detail_attempt_record(status, data, url, is_semanal, include_host_name, started_at, headers)
+
 
+async def _sjf_detail_attempts_sequential_async(ius: int, host_name: str, is_semanal: Optional[bool]):
     attempts = []
-    for sem_value, include_host_name in plans:
-        attempt = _sjf_detail_attempt(ius, host_name, sem_value, include_host_name)
+    for sem_value, include_host_name in _sjf_detail_plans(is_semanal, ius):
+        attempt = await _sjf_detail_attempt_async(ius, host_name, sem_value, include_host_name)
         attempts.append(attempt)
         if attempt["status"] < 400:
+            attempt["outcome"] = "won"
             return attempt, attempts
+        attempt["outcome"] = "failed"
 
     return attempts[-1], attempts
 
 
+# Modo hedged: se lanza el siguiente plan si el anterior no respondio en SJF_DETAIL_HEDGE_DELAY_MS
+# (0 = todos a la vez) o en cuanto falla; gana el primer 2xx y el resto se cancela.
+# Un valor negativo (por defecto) conserva la ejecucion secuencial.
+_SJF_DETAIL_HEDGE_DELAY_MS = _env_int("SJF_DETAIL_HEDGE_DELAY_MS", -1)
+
+
+def _sjf_detail_next_plans(plans: list[tuple[bool, bool]], launched: int, delay: float) -> list[tuple[bool, bool]]:
+    # Con retardo 0 se lanzan todos los planes restantes de una vez.
+    return plans[launched:] if delay <= 0 else plans[launched:launched + 1]
+
+
+def _sjf_detail_hedge_report(
+    ius: int,
+    host_name: str,
+    launched: list[tuple[tuple[bool, bool], Any, float]],
+    winner: Any,
+    started_at: float,
+    outcome_of,
+) -> tuple[dict, list[dict]]:
+    """Arma el reporte de intentos en orden de plan; outcome_of(handle) -> (registro | None, estado)."""
+    attempts = []
+    result = None
+    for (sem_value, include_host_name), handle, launched_at in launched:
+        record, state = outcome_of(handle)
+        if record is None:
+            url = _sjf_detail_url(ius, host_name, sem_value, include_host_name)
+            record = _sjf_detail_attempt_record(
+                None, None, url, sem_value, include_host_name, launched_at, _sjf_headers(content_type=False)
+            )
+        record["outcome"] = "won" if handle is winner else state
+        record["startedAfterMs"] = int((launched_at - started_at) * 1000)
+        attempts.append(record)
+        if handle is winner:
+            result = record
+    return result or attempts[-1], attempts
+
+
+async def _sjf_detail_attempts_hedged_async(ius: int, host_name: str, is_semanal: Optional[bool], delay: float):
+    plans = _sjf_detail_plans(is_semanal, ius)
+    started_at = time.time()
+    launched = []
+    pending: set = set()
+    winner = None
+    while winner is None:
+        for plan in _sjf_detail_next_plans(plans, len(launched), delay):
+            task = asyncio.create_task(_sjf_detail_attempt_async(ius, host_name, *plan))
+            launched.append((plan, task, time.time()))
+            pending.add(task)
+        if not pending:
+            break
+        timeout = delay if len(launched) < len(plans) else None
+        done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        winner = next((t for _, t, _ in launched if t in done and t.result()["status"] < 400), None)
+
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+
+    def outcome_of(task):
+        if task in pending:
+            return None, "cancelled"
+        return task.result(), "failed"
+
+    return _sjf_detail_hedge_report(ius, host_name, launched, winner, started_at, outcome_of)
+
+
+def _sjf_detail_learn(ius: int, result: dict) -> None:
+    if result.get("status") is not None and result["status"] < 400:
+        _remember_sjf_plan(ius, (result["isSemanal"], result["hostNameIncluded"]))
+
+
+async def _sjf_detail_attempts_async(ius: int, host_name: str, is_semanal: Optional[bool]):
+    if _SJF_DETAIL_HEDGE_DELAY_MS < 0:
+        result, attempts = await _sjf_detail_attempts_sequential_async(ius, host_name, is_semanal)
+    else:
+        result, attempts = await _sjf_detail_attempts_hedged_async(
+            ius, host_name, is_semanal, _SJF_DETAIL_HEDGE_DELAY_MS / 1000
+        )
+    _sjf_detail_learn(ius, result)
+    return result, attempts
+
+
 def _extract_results(payload: Any, *keys: str) -> list:
     """Return the first list found in payload (or payload["data"]) under any of the given keys."""
     if not isinstance(payload, dict):
@@ -929,38 +3102,30 @@ def _resolve_ley_reference(raw_ley: str) -> Optional[dict]:
     if not ley_norm:
         return None
 
-    exact_matches = [candidate for candidate in _LEYES_INDEX if candidate["nombreNormalizado"] == ley_norm]
-    if exact_matches:
-        return min(exact_matches, key=lambda item: len(item["nombreNormalizado"]))
+    exact_match = _leyes_catalog()["byName"].get(ley_norm)
+    if exact_match is not None:
+        return exact_match
 
-    contains_matches = [candidate for candidate in _LEYES_INDEX if ley_norm and ley_norm in candidate["nombreNormalizado"]]
-    if contains_matches:
-        return min(contains_matches, key=lambda item: len(item["nombreNormalizado"]))
+    contains_match = _leyes_containing(ley_norm)
+    if contains_match is not None:
+        return contains_match
 
-    for candidate in _LEYES_INDEX:
-        candidate_norm = candidate["nombreNormalizado"]
-        if candidate_norm in ley_norm:
-            return candidate
+    contained_match = _leyes_contained_in(ley_norm)
+    if contained_match is not None:
+        return contained_match
 
     tokens = [token for token in ley_norm.split(" ") if len(token) > 2]
     if not tokens:
         return None
 
-    best_match = None
-    best_score = 0
-    for candidate in _LEYES_INDEX:
-        score = sum(1 for token in tokens if token in candidate["nombreNormalizado"])
-        if score > best_score and score >= min(3, len(tokens)):
-            best_match = candidate
-            best_score = score
-    return best_match
+    best_score, best_bits = _leyes_best_token_overlap(tokens)
+    if not best_score or best_score < min(3, len(tokens)):
+        return None
+    return _leyes_catalog()["index"][(best_bits & -best_bits).bit_length() - 1]
 
 
 def _resolve_constitucion_reference() -> Optional[dict]:
-    for candidate in _LEYES_INDEX:
-        if candidate["nombreNormalizado"] == "constitucion politica de los estados unidos mexicanos":
-            return candidate
-    return None
+    return _leyes_catalog()["byName"].get("constitucion politica de los estados unidos mexicanos")
 
 
 def _resolve_document_law_reference(raw_ley: str) -> Optional[dict]:
@@ -989,7 +3154,7 @@ def _resolve_document_law_reference(raw_ley: str) -> Optional[dict]:
     }
     if raw_norm in manual_aliases:
         return manual_aliases[raw_norm]
-    return _resolve_ley_reference(raw)
+    return _resolve_ley_reference(raw) or _resolve_ley_trigram(raw)
 
 
 def _clean_abbreviation(value: str) -> str:
@@ -1152,17 +3317,17 @@ def _append_split_article_citas(
         )
 
 
-def _sjf_exact_match_for_clave(clave: str) -> Optional[dict]:
+async def _sjf_exact_match_for_clave(clave: str) -> Optional[dict]:
     clave_norm = _normalize_search_text(_normalize_cita_clave(clave))
     if not clave_norm:
         return None
 
-    status, data = _http_json(
+    status, data = await _http_json_async(
         f"{SJF_BASE}/tesis?page=0&size=5",
         method="POST",
         body=_default_sjf_payload(clave),
         headers=_sjf_headers(content_type=True),
-        use_cache=True,
+        cache_policy="sjf.search",
     )
     if status >= 400:
         return None
@@ -1183,18 +3348,18 @@ def _sjf_exact_match_for_clave(clave: str) -> Optional[dict]:
     return None
 
 
-def _sjf_best_match_for_rubro(rubro: str) -> Optional[dict]:
+async def _sjf_best_match_for_rubro(rubro: str) -> Optional[dict]:
     rubro_limpio = _strip_html(rubro)
     rubro_norm = _normalize_search_text(rubro_limpio)
     if len(rubro_norm) < 20:
         return None
 
-    status, data = _http_json(
+    status, data = await _http_json_async(
         f"{SJF_BASE}/tesis?page=0&size=10",
         method="POST",
         body=_default_sjf_payload(rubro_limpio),
         headers=_sjf_headers(content_type=True),
-        use_cache=True,
+        cache_policy="sjf.search",
     )
     if status >= 400:
         return None
@@ -1233,7 +3398,7 @@ def _sjf_best_match_for_rubro(rubro: str) -> Optional[dict]:
     return best_match
 
 
-def _enrich_jurisprudencial_cita(item: dict) -> dict:
+def _normalize_jurisprudencial_cita(item: dict) -> dict:
     clave = _normalize_cita_clave(str(item.get("clave") or ""))
     rubro = _strip_html(item.get("rubro") or "")
     item["clave"] = clave
@@ -1245,9 +3410,13 @@ def _enrich_jurisprudencial_cita(item: dict) -> dict:
         item["requiereConfirmacion"] = True
         item["motivoConfirmacion"] = "cita jurisprudencial sin clave ni rubro verificable"
         item["resuelta"] = False
-        return item
+    return item
 
-    match = _sjf_exact_match_for_clave(clave) if clave else None
+
+async def _enrich_jurisprudencial_cita(item: dict) -> dict:
+    clave = item.get("clave") or ""
+    rubro = item.get("rubro") or ""
+    match = await _sjf_exact_match_for_clave(clave) if clave else None
     if match is not None:
         item["resuelta"] = True
         item["confianza"] = "alta"
@@ -1259,7 +3428,7 @@ def _enrich_jurisprudencial_cita(item: dict) -> dict:
         item["localizacion"] = match.get("localizacion")
         return item
 
-    rubro_match = _sjf_best_match_for_rubro(rubro) if rubro else None
+    rubro_match = await _sjf_best_match_for_rubro(rubro) if rubro else None
     if rubro_match is not None:
         item["resuelta"] = True
         item["confianza"] = "media"
@@ -1282,7 +3451,32 @@ def _enrich_jurisprudencial_cita(item: dict) -> dict:
     return item
 
 
-def _resolve_cita_articulo(cita: dict) -> Optional[dict]:
+# Consultas simultaneas a SJF/Jurislex por peticion de /citas/extraer; un documento largo no debe
+# disparar cientos de llamadas a la vez (throttling del upstream y circuito abriendose).
+_CITAS_CONCURRENCY = max(1, _env_int("CITAS_CONCURRENCY", 4))
+
+
+async def _gather_citas(call, citas: list[dict]) -> list:
+    slots = _slots_for("citas", _CITAS_CONCURRENCY)
+
+    async def run(cita: dict):
+        async with slots:
+            return await call(cita)
+
+    return await asyncio.gather(*(run(cita) for cita in citas))
+
+
+def _citas_por_enriquecer(citas: list[dict]) -> list[dict]:
+    return [cita for cita in citas if cita.get("tipo") in {"jurisprudencia", "tesis"} and "resuelta" not in cita]
+
+
+async def _enrich_citas(citas: list[dict]) -> list[dict]:
+    # La extraccion no toca la red; aqui se buscan en SJF las claves y rubros pendientes.
+    await _gather_citas(_enrich_jurisprudencial_cita, _citas_por_enriquecer(citas))
+    return citas
+
+
+async def _resolve_cita_articulo(cita: dict) -> Optional[dict]:
     articulos = cita.get("articulos") or []
     if not articulos:
         return None
@@ -1291,7 +3485,7 @@ def _resolve_cita_articulo(cita: dict) -> Optional[dict]:
     if not nombre:
         return None
 
-    detail = _normas_articulos_detalle_core(
+    detail = await _normas_articulos_detalle_core_async(
         nombre=nombre,
         articulo=articulo,
         q=None,
@@ -1318,7 +3512,7 @@ def _resolve_cita_articulo(cita: dict) -> Optional[dict]:
     }
 
 
-def _resolve_cita_jurisprudencial(cita: dict) -> Optional[dict]:
+async def _resolve_cita_jurisprudencial(cita: dict) -> Optional[dict]:
     ius = cita.get("ius") or cita.get("registroDigital")
     if ius is None:
         return None
@@ -1327,7 +3521,9 @@ def _resolve_cita_jurisprudencial(cita: dict) -> Optional[dict]:
     except Exception:
         return None
 
-    detail = sjf_detail(ius=ius_value, isSemanal=None, hostName="https://sjf2.scjn.gob.mx", includeRaw=False, debug=False)
+    detail = await sjf_detail_async(
+        ius=ius_value, isSemanal=None, hostName="https://sjf2.scjn.gob.mx", includeRaw=False, debug=False
+    )
     if isinstance(detail, JSONResponse):
         return None
 
@@ -1343,11 +3539,11 @@ def _resolve_cita_jurisprudencial(cita: dict) -> Optional[dict]:
     }
 
 
-def _resolve_cita_detalle(cita: dict) -> Optional[dict]:
+async def _resolve_cita_detalle(cita: dict) -> Optional[dict]:
     if cita.get("tipo") == "articulo":
-        return _resolve_cita_articulo(cita)
+        return await _resolve_cita_articulo(cita)
     if cita.get("tipo") in {"jurisprudencia", "tesis"}:
-        return _resolve_cita_jurisprudencial(cita)
+        return await _resolve_cita_jurisprudencial(cita)
     return None
 
 
@@ -1374,19 +3570,17 @@ def _merge_cita_with_detalle(cita: dict, detalle: Optional[dict]) -> dict:
     return enriched
 
 
-def _build_citas_report(citas: list[dict]) -> dict:
+def _build_citas_report(citas: list[dict], detalles: list[Optional[dict]]) -> dict:
     articulos_citados = []
     criterios_citados = []
     pendientes = []
 
-    for cita in citas:
+    for cita, resolved in zip(citas, detalles):
         if cita.get("tipo") == "articulo":
-            resolved = _resolve_cita_detalle(cita)
             if resolved is not None:
                 articulos_citados.append(resolved)
                 continue
         elif cita.get("tipo") in {"jurisprudencia", "tesis"}:
-            resolved = _resolve_cita_detalle(cita)
             if resolved is not None:
                 criterios_citados.append(resolved)
                 continue
@@ -1729,7 +3923,7 @@ def _extract_citas(texto: str, abbreviations: Optional[list[dict]] = None) -> li
         _append_cita_if_not_contained(
             citas,
             seen,
-            _enrich_jurisprudencial_cita({
+            _normalize_jurisprudencial_cita({
                 "tipo": "tesis",
                 "subtipo": "criterioAislado",
                 "textoOriginal": match.group(0),
@@ -1748,7 +3942,7 @@ def _extract_citas(texto: str, abbreviations: Optional[list[dict]] = None) -> li
         _append_cita_if_not_contained(
             citas,
             seen,
-            _enrich_jurisprudencial_cita({
+            _normalize_jurisprudencial_cita({
                 "tipo": subtipo,
                 "subtipo": subtype_label,
                 "textoOriginal": match.group(0),
@@ -1765,7 +3959,7 @@ def _extract_citas(texto: str, abbreviations: Optional[list[dict]] = None) -> li
         _append_cita_if_not_contained(
             citas,
             seen,
-            _enrich_jurisprudencial_cita({
+            _normalize_jurisprudencial_cita({
                 "tipo": "jurisprudencia",
                 "subtipo": "clave",
                 "textoOriginal": match.group(0),
@@ -1782,7 +3976,7 @@ def _extract_citas(texto: str, abbreviations: Optional[list[dict]] = None) -> li
         _append_cita_if_not_contained(
             citas,
             seen,
-            _enrich_jurisprudencial_cita({
+            _normalize_jurisprudencial_cita({
                 "tipo": "tesis",
                 "subtipo": "claveCompacta",
                 "textoOriginal": match.group(0),
@@ -1814,9 +4008,17 @@ def _extract_citas(texto: str, abbreviations: Optional[list[dict]] = None) -> li
     return citas
 
 
-def _sjf_search_core(sjf_payload: dict, page: int, size: int, include_raw: bool) -> Any:
-    url = f"{SJF_BASE}/tesis?page={page}&size={size}"
-    status, data = _http_json(url, method="POST", body=sjf_payload, headers=_sjf_headers(content_type=True), use_cache=True)
+def _sjf_search_request(sjf_payload: dict, page: int, size: int) -> dict:
+    return {
+        "url": f"{SJF_BASE}/tesis?page={page}&size={size}",
+        "method": "POST",
+        "body": sjf_payload,
+        "headers": _sjf_headers(content_type=True),
+        "cache_policy": "sjf.search",
+    }
+
+
+def _sjf_search_response(status: int, data: Any, page: int, size: int, include_raw: bool) -> Any:
     if status >= 400:
         return JSONResponse(
             status_code=status,
@@ -1839,25 +4041,47 @@ def _sjf_search_core(sjf_payload: dict, page: int, size: int, include_raw: bool)
     }
 
 
+async def _sjf_search_core_async(sjf_payload: dict, page: int, size: int, include_raw: bool) -> Any:
+    _record_warm_query("sjf.search", [sjf_payload, page, size, include_raw])
+
+    async def build():
+        status, data = await _http_json_async(**_sjf_search_request(sjf_payload, page, size))
+        return _sjf_search_response(status, data, page, size, include_raw)
+
+    return await _response_cached_async("sjf.search", [sjf_payload, page, size, include_raw], build)
+
+
+def sjf_search(
+    q: str = Query(default=""),
+    page: int = Query(default=0, ge=0),
+    size: int = Query(default=10, ge=1, le=50),
+    includeRaw: bool = Query(default=False),
+):
+    return _run_sync(sjf_search_async(q=q, page=page, size=size, includeRaw=includeRaw))
+
+
 @app.get("/sjf/search")
 @app.get("/jurisprudencia/buscar")
-def sjf_search(
+async def sjf_search_async(
     q: str = Query(default=""),
     page: int = Query(default=0, ge=0),
     size: int = Query(default=10, ge=1, le=50),
     includeRaw: bool = Query(default=False),
 ):
-    return _sjf_search_core(_default_sjf_payload(q), page, size, includeRaw)
+    return await _sjf_search_core_async(_default_sjf_payload(q), page, size, includeRaw)
 
 
-def _bj_buscar_core(req_payload: dict, include_raw: bool, normalizer) -> Any:
-    status, data = _http_json(
-        f"{BJ_SCJN_BASE}/busqueda",
-        method="POST",
-        body=req_payload,
-        headers=_bj_scjn_headers(content_type=True),
-        use_cache=True,
-    )
+def _bj_buscar_request(req_payload: dict) -> dict:
+    return {
+        "url": f"{BJ_SCJN_BASE}/busqueda",
+        "method": "POST",
+        "body": req_payload,
+        "headers": _bj_scjn_headers(content_type=True),
+        "cache_policy": "bj.search",
+    }
+
+
+def _bj_buscar_response(status: int, data: Any, req_payload: dict, include_raw: bool, normalizer) -> Any:
     if status >= 400:
         return JSONResponse(
             status_code=status,
@@ -1887,21 +4111,32 @@ def _bj_buscar_core(req_payload: dict, include_raw: bool, normalizer) -> Any:
     }
 
 
-def _precedentes_buscar_core(req_payload: dict, include_raw: bool) -> Any:
-    return _bj_buscar_core(req_payload, include_raw, _normalize_bj_item)
+async def _bj_buscar_core_async(req_payload: dict, include_raw: bool, normalizer) -> Any:
+    async def build():
+        status, data = await _http_json_async(**_bj_buscar_request(req_payload))
+        return _bj_buscar_response(status, data, req_payload, include_raw, normalizer)
 
+    return await _response_cached_async("bj.search", [req_payload, include_raw, normalizer.__name__], build)
 
-def _legislacion_buscar_core(req_payload: dict, include_raw: bool) -> Any:
-    return _bj_buscar_core(req_payload, include_raw, _normalize_bj_legislacion_item)
 
+async def _precedentes_buscar_core_async(req_payload: dict, include_raw: bool) -> Any:
+    return await _bj_buscar_core_async(req_payload, include_raw, _normalize_bj_item)
 
-def _legislacion_detalle_core(documento_id: int, include_raw: bool) -> Any:
-    status, data = _http_json(
-        f"{BJ_SCJN_BASE}/documento/legislacion/{documento_id}",
-        method="GET",
-        headers=_bj_scjn_headers(content_type=False),
-        use_cache=True,
-    )
+
+async def _legislacion_buscar_core_async(req_payload: dict, include_raw: bool) -> Any:
+    return await _bj_buscar_core_async(req_payload, include_raw, _normalize_bj_legislacion_item)
+
+
+def _legislacion_detalle_request(documento_id: int) -> dict:
+    return {
+        "url": f"{BJ_SCJN_BASE}/documento/legislacion/{documento_id}",
+        "method": "GET",
+        "headers": _bj_scjn_headers(content_type=False),
+        "cache_policy": "bj.legislacion",
+    }
+
+
+def _legislacion_detalle_response(status: int, data: Any, documento_id: int, include_raw: bool) -> Any:
     if status >= 400:
         return JSONResponse(
             status_code=status,
@@ -1912,22 +4147,35 @@ def _legislacion_detalle_core(documento_id: int, include_raw: bool) -> Any:
     return _normalize_bj_legislacion_detail(data, documento_id, include_raw=include_raw)
 
 
+async def _legislacion_detalle_core_async(documento_id: int, include_raw: bool) -> Any:
+    _record_warm_query("bj.legislacion", [documento_id, include_raw])
+
+    async def build():
+        status, data = await _http_json_async(**_legislacion_detalle_request(documento_id))
+        return _legislacion_detalle_response(status, data, documento_id, include_raw)
+
+    return await _response_cached_async("bj.legislacion", [documento_id, include_raw], build)
+
+
 def _is_legislacion_articulo(bloque: dict) -> bool:
     referencia = _normalize_text(bloque.get("referencia") or "")
     contenido = _normalize_text(bloque.get("contenidoPlano") or bloque.get("contenido") or "")
     return bool(bloque.get("numero") is not None or referencia.startswith("articulo") or contenido.startswith("articulo "))
 
 
-def _legislacion_articulos_buscar_core(
+async def _legislacion_articulos_buscar_core_async(
     documento_id: int,
     articulo: Optional[str],
     q: Optional[str],
     include_raw: bool,
 ) -> Any:
-    detail = _legislacion_detalle_core(documento_id, include_raw)
+    detail = await _legislacion_detalle_core_async(documento_id, include_raw)
     if isinstance(detail, JSONResponse):
         return detail
+    return _filter_legislacion_articulos(detail, articulo, q)
 
+
+def _filter_legislacion_articulos(detail: dict, articulo: Optional[str], q: Optional[str]) -> dict:
     bloques = detail.get("bloques") or []
     articulos = [bloque for bloque in bloques if isinstance(bloque, dict) and _is_legislacion_articulo(bloque)]
 
@@ -2015,23 +4263,14 @@ def _build_bj_legislacion_payload(
 
 def _buscar_ley_core(id: Optional[int] = None, categoria: Optional[int] = None, nombre: Optional[str] = None) -> list[dict]:
     resultados = leyes
+    if nombre is not None:
+        # Todo token de la consulta debe aparecer en el nombre; si la frase completa
+        # esta contenida, tambien lo estan sus tokens, asi que basta la interseccion.
+        resultados = [leyes[pos] for pos in _leyes_matching_name(nombre)]
     if id is not None:
         resultados = [l for l in resultados if l["id"] == id]
     if categoria is not None:
         resultados = [l for l in resultados if l["categoria"] == categoria]
-    if nombre is not None:
-        nombre_norm = _normalize_text(nombre)
-        tokens = [token for token in nombre_norm.split(" ") if token]
-
-        def matches(item):
-            item_norm = _normalize_text(item.get("nombre", ""))
-            if not item_norm:
-                return False
-            if nombre_norm and nombre_norm in item_norm:
-                return True
-            return bool(tokens) and all(token in item_norm for token in tokens)
-
-        resultados = [l for l in resultados if matches(l)]
     return resultados
 
 
@@ -2161,7 +4400,7 @@ def _merge_norma_sources(local_results: list[dict], sil_items: list[dict], query
     return merged
 
 
-def _normas_buscar_core(
+def _normas_sil_payload(
     nombre: str,
     page: int,
     size: int,
@@ -2171,11 +4410,8 @@ def _normas_buscar_core(
     materia: Optional[str] = None,
     vigencia: Optional[str] = None,
     semantica: int = 0,
-    include_raw: bool = False,
-) -> Any:
-    sil_only_filters_active = any([categoria_ordenamiento, ambito, estado, materia, vigencia])
-    local_results = [] if sil_only_filters_active else _buscar_ley_core(nombre=nombre)
-    sil_payload = _build_bj_legislacion_payload(
+) -> dict:
+    return _build_bj_legislacion_payload(
         q=nombre,
         page=page,
         size=max(size, 50),
@@ -2188,7 +4424,9 @@ def _normas_buscar_core(
             vigencia=vigencia,
         ),
     )
-    sil_response = _legislacion_buscar_core(sil_payload, include_raw)
+
+
+def _normas_buscar_response(nombre: str, page: int, size: int, local_results: list[dict], sil_response: Any) -> Any:
     if isinstance(sil_response, JSONResponse):
         return sil_response
     sil_items = sil_response.get("items") or []
@@ -2213,6 +4451,42 @@ def _normas_buscar_core(
     }
 
 
+def _normas_local_results(nombre: str) -> tuple[list[dict], bool]:
+    """Resultados del catalogo local y si el mejor nombre parecido es tan seguro que sobra el SIL."""
+    resultados = _buscar_ley_core(nombre=nombre)
+    if resultados:
+        return resultados, False
+    # Sin coincidencia por tokens: se prueban nombres parecidos del catalogo antes de depender del SIL.
+    similares = _leyes_similares(nombre)
+    seguro = bool(similares) and similares[0][0] >= _LEY_TRIGRAM_SKIP_SIL
+    return [
+        {"categoria": ley.get("categoria"), "id": ley.get("id"), "nombre": ley.get("nombre") or ""}
+        for _, ley in similares
+    ], seguro
+
+
+async def _normas_buscar_core_async(
+    nombre: str,
+    page: int,
+    size: int,
+    categoria_ordenamiento: Optional[str] = None,
+    ambito: Optional[str] = None,
+    estado: Optional[str] = None,
+    materia: Optional[str] = None,
+    vigencia: Optional[str] = None,
+    semantica: int = 0,
+    include_raw: bool = False,
+) -> Any:
+    sil_only_filters_active = any([categoria_ordenamiento, ambito, estado, materia, vigencia])
+    local_results, local_seguro = ([], False) if sil_only_filters_active else _normas_local_results(nombre)
+    if local_seguro:
+        # Errata con un nombre del catalogo muy parecido: se responde sin esperar al SIL.
+        return _normas_buscar_response(nombre, page, size, local_results, {"items": []})
+    sil_payload = _normas_sil_payload(nombre, page, size, categoria_ordenamiento, ambito, estado, materia, vigencia, semantica)
+    sil_response = await _legislacion_buscar_core_async(sil_payload, include_raw)
+    return _normas_buscar_response(nombre, page, size, local_results, sil_response)
+
+
 def _extract_articulo_numero(value: Optional[str]) -> Optional[int]:
     if value is None:
         return None
@@ -2225,7 +4499,56 @@ def _extract_articulo_numero(value: Optional[str]) -> Optional[int]:
         return None
 
 
-def _normas_articulos_buscar_core(
+def _normas_first_item(normas: dict) -> Optional[dict]:
+    items = normas.get("items") or []
+    return items[0] if items else None
+
+
+def _normas_articulos_sources(norma: dict) -> list[str]:
+    sugerida = norma.get("rutaSugerida")
+    ordered = [sugerida] + [source for source in ["jurislex", "sil"] if source != sugerida]
+    return [source for source in ordered if source in ("jurislex", "sil")]
+
+
+def _normas_jurislex_search_args(
+    ref: dict,
+    q: Optional[str],
+    size: int,
+    articulo_numero: Optional[int],
+    include_raw: bool,
+) -> dict:
+    return {
+        "categoria": int(ref["categoria"]),
+        "id_legislacion": int(ref["idLegislacion"]),
+        "desc": str(q or ""),
+        "solo_articulo": True,
+        "indice": 0,
+        "elementos": size,
+        "articulo_numero": articulo_numero,
+        "include_raw": include_raw,
+    }
+
+
+def _normas_articulos_sin_resultado(
+    nombre: str,
+    articulo: Optional[str],
+    q: Optional[str],
+    norma: Optional[dict],
+    fuentes_intentadas: list[str],
+) -> dict:
+    return {
+        "nombre": nombre,
+        "articulo": articulo or "",
+        "query": q or "",
+        "fuenteUsada": "",
+        "fuentesIntentadas": fuentes_intentadas,
+        "norma": norma,
+        "count": 0,
+        "items": [],
+    }
+
+
+async def _normas_articulos_buscar_core_async(
     nombre: str,
     articulo: Optional[str],
     q: Optional[str],
@@ -2239,7 +4562,7 @@ def _normas_articulos_buscar_core(
     semantica: int = 0,
     include_raw: bool = False,
 ) -> Any:
-    normas = _normas_buscar_core(
+    normas = await _normas_buscar_core_async(
         nombre=nombre,
         page=page,
         size=size,
@@ -2254,62 +4577,35 @@ def _normas_articulos_buscar_core(
     if isinstance(normas, JSONResponse):
         return normas
 
-    items = normas.get("items") or []
-    if not items:
-        return {
-            "nombre": nombre,
-            "articulo": articulo or "",
-            "query": q or "",
-            "fuenteUsada": "",
-            "fuentesIntentadas": [],
-            "norma": None,
-            "count": 0,
-            "items": [],
-        }
+    norma = _normas_first_item(normas)
+    if norma is None:
+        return _normas_articulos_sin_resultado(nombre, articulo, q, None, [])
 
-    norma = items[0]
     articulo_numero = _extract_articulo_numero(articulo)
     fuentes_intentadas = []
-
-    def try_jurislex() -> Optional[dict]:
-        if not norma.get("jurislex"):
-            return None
-        ref = norma["jurislex"]
-        response = jurislex_buscar_articulos(
-            categoria=int(ref["categoria"]),
-            idLegislacion=int(ref["idLegislacion"]),
-            desc=str(q or ""),
-            soloArticulo=True,
-            indice=0,
-            elementos=size,
-            articuloNumero=articulo_numero,
-            includeRaw=include_raw,
-        )
-        if isinstance(response, JSONResponse):
-            return None
-        return {
-            "fuenteUsada": "jurislex",
-            "fuentesIntentadas": list(fuentes_intentadas),
-            "norma": norma,
-            "count": response.get("count", 0),
-            "items": response.get("items") or [],
-            "upstream": response,
-        }
-
-    def try_sil() -> Optional[dict]:
-        if not norma.get("sil"):
-            return None
-        ref = norma["sil"]
-        response = _legislacion_articulos_buscar_core(
-            documento_id=int(ref["id"]),
-            articulo=articulo,
-            q=q,
-            include_raw=include_raw,
-        )
-        if isinstance(response, JSONResponse):
-            return None
+    for source in _normas_articulos_sources(norma):
+        fuentes_intentadas.append(source)
+        ref = norma.get(source)
+        if not ref:
+            continue
+        if source == "jurislex":
+            response = await _jurislex_buscar_articulos_core_async(
+                **_normas_jurislex_search_args(ref, q, size, articulo_numero, include_raw)
+            )
+        else:
+            response = await _legislacion_articulos_buscar_core_async(
+                documento_id=int(ref["id"]),
+                articulo=articulo,
+                q=q,
+                include_raw=include_raw,
+            )
+        if isinstance(response, JSONResponse) or response.get("count", 0) <= 0:
+            continue
         return {
-            "fuenteUsada": "sil",
+            "nombre": nombre,
+            "articulo": articulo or "",
+            "query": q or "",
+            "fuenteUsada": source,
             "fuentesIntentadas": list(fuentes_intentadas),
             "norma": norma,
             "count": response.get("count", 0),
@@ -2317,34 +4613,7 @@ def _normas_articulos_buscar_core(
             "upstream": response,
         }
 
-    ordered_sources = [norma.get("rutaSugerida")] + [source for source in ["jurislex", "sil"] if source != norma.get("rutaSugerida")]
-    for source in ordered_sources:
-        if source == "jurislex":
-            fuentes_intentadas.append("jurislex")
-            result = try_jurislex()
-        elif source == "sil":
-            fuentes_intentadas.append("sil")
-            result = try_sil()
-        else:
-            continue
-        if result and result.get("count", 0) > 0:
-            return {
-                "nombre": nombre,
-                "articulo": articulo or "",
-                "query": q or "",
-                **result,
-            }
-
-    return {
-        "nombre": nombre,
-        "articulo": articulo or "",
-        "query": q or "",
-        "fuenteUsada": "",
-        "fuentesIntentadas": fuentes_intentadas,
-        "norma": norma,
-        "count": 0,
-        "items": [],
-    }
+    return _normas_articulos_sin_resultado(nombre, articulo, q, norma, fuentes_intentadas)
 
 
 def _clean_optional_text(value: Any) -> str:
@@ -2383,7 +4652,89 @@ def _sil_article_structure(detail: dict, article_id: Optional[int], article_nume
     return structure
 
 
-def _normas_articulos_detalle_core(
+def _normas_articulo_jurislex_detalle(
+    nombre: str,
+    articulo: Optional[str],
+    q: Optional[str],
+    search: dict,
+    selected: dict,
+    ref: dict,
+    detail: Any,
+    include_raw: bool,
+) -> Any:
+    if isinstance(detail, JSONResponse):
+        return detail
+    return {
+        "nombre": nombre,
+        "articuloSolicitado": articulo or "",
+        "query": q or "",
+        "fuenteUsada": "jurislex",
+        "norma": search.get("norma") or {},
+        "articulo": {
+            "numero": selected.get("numeroArticulo"),
+            "referencia": f"Artículo {selected.get('numeroArticulo')}" if selected.get("numeroArticulo") is not None else "",
+            "ley": detail.get("ley") or selected.get("ley") or "",
+            "libro": _clean_optional_text(detail.get("libro") or ((detail.get("raw") or {}).get("sLibro") if include_raw else "")),
+            "titulo": _clean_optional_text(detail.get("titulo") or ((detail.get("raw") or {}).get("sTitulo") if include_raw else "")),
+            "capitulo": _clean_optional_text(detail.get("capitulo") or ((detail.get("raw") or {}).get("sCapitulo") if include_raw else "")),
+            "texto": _clean_optional_text(detail.get("texto") or selected.get("texto") or ""),
+            "textoPlano": detail.get("textoPlano") or selected.get("textoPlano") or "",
+            "meta": {
+                "idArticulo": detail.get("idArticulo") or selected.get("idArticulo"),
+                "idLegislacion": detail.get("idLegislacion") or selected.get("idLegislacion"),
+                "categoria": detail.get("categoria") or ref.get("categoria"),
+            },
+        },
+        "coincidencias": search.get("count", 0),
+        "fuentesIntentadas": search.get("fuentesIntentadas") or [],
+        "rawSearch": search.get("upstream") if include_raw else None,
+    }
+
+
+def _normas_articulo_sil_detalle(
+    nombre: str,
+    articulo: Optional[str],
+    q: Optional[str],
+    search: dict,
+    selected: dict,
+    sil_ref: dict,
+    detail: Any,
+    include_raw: bool,
+) -> Any:
+    if isinstance(detail, JSONResponse):
+        return detail
+    norma = search.get("norma") or {}
+    structure = _sil_article_structure(detail, selected.get("id"), selected.get("numero"))
+    return {
+        "nombre": nombre,
+        "articuloSolicitado": articulo or "",
+        "query": q or "",
+        "fuenteUsada": "sil",
+        "norma": norma,
+        "articulo": {
+            "numero": selected.get("numero"),
+            "referencia": selected.get("referencia") or "",
+            "ley": detail.get("ordenamiento") or norma.get("nombre") or "",
+            "libro": structure.get("libro") or "",
+            "titulo": structure.get("titulo") or "",
+            "capitulo": structure.get("capitulo") or "",
+            "texto": selected.get("contenido") or "",
+            "textoPlano": selected.get("contenidoPlano") or "",
+            "meta": {
+                "id": selected.get("id"),
+                "documentoId": detail.get("id") or sil_ref.get("id"),
+                "orden": selected.get("orden"),
+                "vigencia": selected.get("vigencia") or "",
+                "fechaActualizacion": selected.get("fechaActualizacion") or "",
+            },
+        },
+        "coincidencias": search.get("count", 0),
+        "fuentesIntentadas": search.get("fuentesIntentadas") or [],
+        "rawSearch": search.get("upstream") if include_raw else None,
+    }
+
+
+async def _normas_articulos_detalle_core_async(
     nombre: str,
     articulo: Optional[str],
     q: Optional[str],
@@ -2397,7 +4748,7 @@ def _normas_articulos_detalle_core(
     semantica: int = 0,
     include_raw: bool = False,
 ) -> Any:
-    search = _normas_articulos_buscar_core(
+    search = await _normas_articulos_buscar_core_async(
         nombre=nombre,
         articulo=articulo,
         q=q,
@@ -2423,91 +4774,25 @@ def _normas_articulos_detalle_core(
     norma = search.get("norma") or {}
 
     if fuente == "jurislex":
-        ref = norma.get("jurislex") or {}
-        detail = jurislex_detalle_articulo(
-            categoria=int(ref.get("categoria")),
-            idLegislacion=int(ref.get("idLegislacion")),
-            idArticulo=int(selected.get("idArticulo")),
-            includeRaw=include_raw,
-        )
-        if isinstance(detail, JSONResponse):
-            return detail
-        return {
-            "nombre": nombre,
-            "articuloSolicitado": articulo or "",
-            "query": q or "",
-            "fuenteUsada": "jurislex",
-            "norma": norma,
-            "articulo": {
-                "numero": selected.get("numeroArticulo"),
-                "referencia": f"Artículo {selected.get('numeroArticulo')}" if selected.get("numeroArticulo") is not None else "",
-                "ley": detail.get("ley") or selected.get("ley") or "",
-                "libro": _clean_optional_text(detail.get("libro") or ((detail.get("raw") or {}).get("sLibro") if include_raw else "")),
-                "titulo": _clean_optional_text(detail.get("titulo") or ((detail.get("raw") or {}).get("sTitulo") if include_raw else "")),
-                "capitulo": _clean_optional_text(detail.get("capitulo") or ((detail.get("raw") or {}).get("sCapitulo") if include_raw else "")),
-                "texto": _clean_optional_text(detail.get("texto") or selected.get("texto") or ""),
-                "textoPlano": detail.get("textoPlano") or selected.get("textoPlano") or "",
-                "meta": {
-                    "idArticulo": detail.get("idArticulo") or selected.get("idArticulo"),
-                    "idLegislacion": detail.get("idLegislacion") or selected.get("idLegislacion"),
-                    "categoria": detail.get("categoria") or ref.get("categoria"),
-                },
-            },
-            "coincidencias": search.get("count", 0),
-            "fuentesIntentadas": search.get("fuentesIntentadas") or [],
-            "rawSearch": search.get("upstream") if include_raw else None,
-        }
-
-    if fuente == "sil":
-        sil_ref = norma.get("sil") or {}
-        detail = _legislacion_detalle_core(int(sil_ref.get("id")), include_raw)
-        if isinstance(detail, JSONResponse):
-            return detail
-        structure = _sil_article_structure(detail, selected.get("id"), selected.get("numero"))
-        return {
-            "nombre": nombre,
-            "articuloSolicitado": articulo or "",
-            "query": q or "",
-            "fuenteUsada": "sil",
-            "norma": norma,
-            "articulo": {
-                "numero": selected.get("numero"),
-                "referencia": selected.get("referencia") or "",
-                "ley": detail.get("ordenamiento") or norma.get("nombre") or "",
-                "libro": structure.get("libro") or "",
-                "titulo": structure.get("titulo") or "",
-                "capitulo": structure.get("capitulo") or "",
-                "texto": selected.get("contenido") or "",
-                "textoPlano": selected.get("contenidoPlano") or "",
-                "meta": {
-                    "id": selected.get("id"),
-                    "documentoId": detail.get("id") or sil_ref.get("id"),
-                    "orden": selected.get("orden"),
-                    "vigencia": selected.get("vigencia") or "",
-                    "fechaActualizacion": selected.get("fechaActualizacion") or "",
-                },
-            },
-            "coincidencias": search.get("count", 0),
-            "fuentesIntentadas": search.get("fuentesIntentadas") or [],
-            "rawSearch": search.get("upstream") if include_raw else None,
-        }
+        ref = norma.get("jurislex") or {}
+        detail = await _jurislex_detalle_articulo_core_async(
+            int(ref.get("categoria")),
+            int(ref.get("idLegislacion")),
+            int(selected.get("idArticulo")),
+            include_raw,
+        )
+        return _normas_articulo_jurislex_detalle(nombre, articulo, q, search, selected, ref, detail, include_raw)
+
+    if fuente == "sil":
+        sil_ref = norma.get("sil") or {}
+        detail = await _legislacion_detalle_core_async(int(sil_ref.get("id")), include_raw)
+        return _normas_articulo_sil_detalle(nombre, articulo, q, search, selected, sil_ref, detail, include_raw)
 
     return JSONResponse(status_code=404, content={"error": "articulo no encontrado"})
 
 
-@app.get("/precedentes/buscar")
-@app.get("/scjn/precedentes/buscar")
-def scjn_precedentes_buscar(
-    q: str = Query(default=""),
-    page: int = Query(default=1, ge=1),
-    size: int = Query(default=10, ge=1, le=50),
-    indice: str = Query(default="ejecutorias"),
-    fuente: str = Query(default="SJF"),
-    extractos: int = Query(default=200, ge=0, le=1000),
-    semantica: int = Query(default=0, ge=0, le=1),
-    includeRaw: bool = Query(default=False),
-):
-    req_payload = {
+def _precedentes_payload(q: str, page: int, size: int, indice: str, fuente: str, extractos: int, semantica: int) -> dict:
+    return {
         "q": str(q or ""),
         "page": page,
         "size": size,
@@ -2519,19 +4804,10 @@ def scjn_precedentes_buscar(
         "sortField": "",
         "sortDireccion": "",
     }
-    return _precedentes_buscar_core(req_payload, includeRaw)
 
 
-@app.post("/precedentes/buscar")
-@app.post("/scjn/precedentes/buscar")
-def scjn_precedentes_buscar_post(
-    includeRaw: bool = Query(default=False),
-    payload: dict = Body(default={}),
-):
-    if not isinstance(payload, dict):
-        return JSONResponse(status_code=400, content={"error": "Invalid payload"})
-
-    req_payload = {
+def _precedentes_post_payload(payload: dict) -> dict:
+    return {
         "q": str(payload.get("q") or ""),
         "page": max(1, _to_int(payload.get("page"), 1)),
         "size": min(50, max(1, _to_int(payload.get("size"), 10))),
@@ -2543,7 +4819,65 @@ def scjn_precedentes_buscar_post(
         "sortField": str(payload.get("sortField") or ""),
         "sortDireccion": str(payload.get("sortDireccion") or ""),
     }
-    return _precedentes_buscar_core(req_payload, _to_bool(payload.get("includeRaw"), includeRaw))
+
+
+def scjn_precedentes_buscar(
+    q: str = Query(default=""),
+    page: int = Query(default=1, ge=1),
+    size: int = Query(default=10, ge=1, le=50),
+    indice: str = Query(default="ejecutorias"),
+    fuente: str = Query(default="SJF"),
+    extractos: int = Query(default=200, ge=0, le=1000),
+    semantica: int = Query(default=0, ge=0, le=1),
+    includeRaw: bool = Query(default=False),
+):
+    return _run_sync(
+        scjn_precedentes_buscar_async(
+            q=q,
+            page=page,
+            size=size,
+            indice=indice,
+            fuente=fuente,
+            extractos=extractos,
+            semantica=semantica,
+            includeRaw=includeRaw,
+        )
+    )
+
+
+@app.get("/precedentes/buscar")
+@app.get("/scjn/precedentes/buscar")
+async def scjn_precedentes_buscar_async(
+    q: str = Query(default=""),
+    page: int = Query(default=1, ge=1),
+    size: int = Query(default=10, ge=1, le=50),
+    indice: str = Query(default="ejecutorias"),
+    fuente: str = Query(default="SJF"),
+    extractos: int = Query(default=200, ge=0, le=1000),
+    semantica: int = Query(default=0, ge=0, le=1),
+    includeRaw: bool = Query(default=False),
+):
+    req_payload = _precedentes_payload(q, page, size, indice, fuente, extractos, semantica)
+    return await _precedentes_buscar_core_async(req_payload, includeRaw)
+
+
+def scjn_precedentes_buscar_post(
+    includeRaw: bool = Query(default=False),
+    payload: dict = Body(default={}),
+):
+    return _run_sync(scjn_precedentes_buscar_post_async(includeRaw=includeRaw, payload=payload))
+
+
+@app.post("/precedentes/buscar")
+@app.post("/scjn/precedentes/buscar")
+async def scjn_precedentes_buscar_post_async(
+    includeRaw: bool = Query(default=False),
+    payload: dict = Body(default={}),
+):
+    if not isinstance(payload, dict):
+        return JSONResponse(status_code=400, content={"error": "Invalid payload"})
+    include_raw = _to_bool(payload.get("includeRaw"), includeRaw)
+    return await _precedentes_buscar_core_async(_precedentes_post_payload(payload), include_raw)
 
 
 def _extract_tepjf_items(data: Any) -> list:
@@ -2637,8 +4971,7 @@ def _tepjf_form(
     return fields
 
 
-def _tepjf_buscar_core(fields: dict, page: int, query: str, include_raw: bool) -> Any:
-    status, data = _http_multipart(TEPJF_BASE, fields, headers=_tepjf_headers())
+def _tepjf_buscar_response(status: int, data: Any, page: int, query: str, include_raw: bool) -> Any:
     if status >= 400:
         return JSONResponse(
             status_code=status,
@@ -2663,9 +4996,56 @@ def _tepjf_buscar_core(fields: dict, page: int, query: str, include_raw: bool) -
     }
 
 
+async def _tepjf_buscar_core_async(fields: dict, page: int, query: str, include_raw: bool) -> Any:
+    status, data = await _http_multipart_async(TEPJF_BASE, fields, headers=_tepjf_headers(), cache_policy="tepjf.search")
+    return _tepjf_buscar_response(status, data, page, query, include_raw)
+
+
+def _tepjf_post_form(payload: dict) -> tuple[int, dict]:
+    page = max(1, _to_int(payload.get("page") or payload.get("pagina"), 1))
+    fields = _tepjf_form(
+        and_terms=payload.get("and") or payload.get("q") or "",
+        or_terms=payload.get("or") or "",
+        tipo=_to_int(payload.get("type") or payload.get("tipo"), 2),
+        pagina=page,
+        sala=payload.get("sala") or "",
+        medio=payload.get("medio") or "",
+        anio=payload.get("anio") or "",
+        idmagistrado=payload.get("idmagistrado") or payload.get("idMagistrado") or "",
+        sentidoresolucion=payload.get("sentidoresolucion") or payload.get("sentidoResolucion") or "",
+    )
+    return page, fields
+
+
+def tepjf_sentencias_buscar(
+    q: str = Query(default="", description="Terminos AND; usa | para varios (ej. nulidad|computo)"),
+    page: int = Query(default=1, ge=1),
+    sala: str = Query(default="", description="sup, sg, sx, sdf, st, sm, scm, sre"),
+    medio: str = Query(default="", description="jdc, rec, jrc, rap, je..."),
+    anio: str = Query(default=""),
+    idMagistrado: str = Query(default=""),
+    sentidoResolucion: str = Query(default=""),
+    tipo: int = Query(default=2),
+    includeRaw: bool = Query(default=False),
+):
+    return _run_sync(
+        tepjf_sentencias_buscar_async(
+            q=q,
+            page=page,
+            sala=sala,
+            medio=medio,
+            anio=anio,
+            idMagistrado=idMagistrado,
+            sentidoResolucion=sentidoResolucion,
+            tipo=tipo,
+            includeRaw=includeRaw,
+        )
+    )
+
+
 @app.get("/sentencias/buscar")
 @app.get("/tepjf/sentencias/buscar")
-def tepjf_sentencias_buscar(
+async def tepjf_sentencias_buscar_async(
     q: str = Query(default="", description="Terminos AND; usa | para varios (ej. nulidad|computo)"),
     page: int = Query(default=1, ge=1),
     sala: str = Query(default="", description="sup, sg, sx, sdf, st, sm, scm, sre"),
@@ -2686,50 +5066,49 @@ def tepjf_sentencias_buscar(
         idmagistrado=idMagistrado,
         sentidoresolucion=sentidoResolucion,
     )
-    return _tepjf_buscar_core(fields, page, q, includeRaw)
+    return await _tepjf_buscar_core_async(fields, page, q, includeRaw)
+
+
+def tepjf_sentencias_buscar_post(
+    includeRaw: bool = Query(default=False),
+    payload: dict = Body(default={}),
+):
+    return _run_sync(tepjf_sentencias_buscar_post_async(includeRaw=includeRaw, payload=payload))
 
 
 @app.post("/sentencias/buscar")
 @app.post("/tepjf/sentencias/buscar")
-def tepjf_sentencias_buscar_post(
+async def tepjf_sentencias_buscar_post_async(
     includeRaw: bool = Query(default=False),
     payload: dict = Body(default={}),
 ):
     if not isinstance(payload, dict):
         return JSONResponse(status_code=400, content={"error": "Invalid payload"})
 
-    page = max(1, _to_int(payload.get("page") or payload.get("pagina"), 1))
-    fields = _tepjf_form(
-        and_terms=payload.get("and") or payload.get("q") or "",
-        or_terms=payload.get("or") or "",
-        tipo=_to_int(payload.get("type") or payload.get("tipo"), 2),
-        pagina=page,
-        sala=payload.get("sala") or "",
-        medio=payload.get("medio") or "",
-        anio=payload.get("anio") or "",
-        idmagistrado=payload.get("idmagistrado") or payload.get("idMagistrado") or "",
-        sentidoresolucion=payload.get("sentidoresolucion") or payload.get("sentidoResolucion") or "",
-    )
+    page, fields = _tepjf_post_form(payload)
     include_raw = _to_bool(payload.get("includeRaw"), includeRaw)
-    return _tepjf_buscar_core(fields, page, fields["and"], include_raw)
+    return await _tepjf_buscar_core_async(fields, page, fields["and"], include_raw)
 
 
-@app.get("/sentencias/detalle")
-@app.get("/tepjf/sentencias/detalle")
-def tepjf_sentencia_detalle(
-    filename: str = Query(default="", description="Ruta relativa de la sentencia (campo documentoFilename de la busqueda)"),
-    url: str = Query(default="", description="Alternativa: documentoUrl devuelto por la busqueda"),
-    includeRaw: bool = Query(default=False, description="Si es true, incluye tambien el PDF en base64"),
-):
-    rel = (filename or "").strip() or _tepjf_relpath_from_url(url)
-    if not rel:
-        return JSONResponse(
-            status_code=400,
-            content={"error": "Falta 'filename' o 'url' de la sentencia"},
-        )
+def _tepjf_convert_request(rel: str) -> dict:
+    return {
+        "url": TEPJF_CONVERT_PDF,
+        "method": "POST",
+        "body": {"filename": rel},
+        "headers": {**_tepjf_headers(), "Content-Type": "application/json"},
+        "cache_policy": "tepjf.documento",
+    }
+
+
+def _tepjf_missing_filename() -> JSONResponse:
+    return JSONResponse(
+        status_code=400,
+        content={"error": "Falta 'filename' o 'url' de la sentencia"},
+    )
+
 
-    headers = {**_tepjf_headers(), "Content-Type": "application/json"}
-    status, data = _http_json(TEPJF_CONVERT_PDF, method="POST", body={"filename": rel}, headers=headers)
+def _tepjf_pdf_bytes(status: int, data: Any, include_raw: bool) -> Any:
+    """Devuelve los bytes del PDF convertido o la JSONResponse de error correspondiente."""
     if status >= 400:
         return JSONResponse(
             status_code=status,
@@ -2740,15 +5119,16 @@ def tepjf_sentencia_detalle(
     if not b64:
         return JSONResponse(
             status_code=502,
-            content={"error": "Respuesta inesperada del conversor TEPJF", "upstream": data if includeRaw else None},
+            content={"error": "Respuesta inesperada del conversor TEPJF", "upstream": data if include_raw else None},
         )
 
     try:
-        pdf_bytes = base64.b64decode(b64)
+        return base64.b64decode(b64)
     except Exception:
         return JSONResponse(status_code=502, content={"error": "No se pudo decodificar el documento"})
 
-    texto, paginas = _pdf_to_text(pdf_bytes)
+
+def _tepjf_detalle_response(rel: str, url: str, data: dict, texto: str, paginas: int, include_raw: bool) -> dict:
     response = {
         "filename": rel,
         "documentoUrl": url or None,
@@ -2756,14 +5136,92 @@ def tepjf_sentencia_detalle(
         "texto": texto,
         "textoPlano": texto,
     }
-    if includeRaw:
-        response["pdfBase64"] = b64
+    if include_raw:
+        response["pdfBase64"] = data.get("Archivo")
     return response
 
 
+def tepjf_sentencia_detalle(
+    filename: str = Query(default="", description="Ruta relativa de la sentencia (campo documentoFilename de la busqueda)"),
+    url: str = Query(default="", description="Alternativa: documentoUrl devuelto por la busqueda"),
+    includeRaw: bool = Query(default=False, description="Si es true, incluye tambien el PDF en base64"),
+):
+    return _run_sync(tepjf_sentencia_detalle_async(filename=filename, url=url, includeRaw=includeRaw))
+
+
+@app.get("/sentencias/detalle")
+@app.get("/tepjf/sentencias/detalle")
+async def tepjf_sentencia_detalle_async(
+    filename: str = Query(default="", description="Ruta relativa de la sentencia (campo documentoFilename de la busqueda)"),
+    url: str = Query(default="", description="Alternativa: documentoUrl devuelto por la busqueda"),
+    includeRaw: bool = Query(default=False, description="Si es true, incluye tambien el PDF en base64"),
+):
+    rel = (filename or "").strip() or _tepjf_relpath_from_url(url)
+    if not rel:
+        return _tepjf_missing_filename()
+
+    status, data = await _http_json_async(**_tepjf_convert_request(rel))
+    pdf_bytes = _tepjf_pdf_bytes(status, data, includeRaw)
+    if isinstance(pdf_bytes, JSONResponse):
+        return pdf_bytes
+
+    # Extraer texto del PDF es CPU intensivo; se delega al threadpool para no bloquear el loop.
+    texto, paginas = await run_in_threadpool(_pdf_to_text, pdf_bytes)
+    return _tepjf_detalle_response(rel, url, data, texto, paginas, includeRaw)
+
+
+def _legislacion_post_payload(payload: dict) -> dict:
+    return _build_bj_legislacion_payload(
+        q=str(payload.get("q") or ""),
+        page=_to_int(payload.get("page"), 1),
+        size=_to_int(payload.get("size"), 10),
+        fuente=str(payload.get("fuente") or "SIL"),
+        indice=str(payload.get("indice") or "legislacion"),
+        extractos=_to_int(payload.get("extractos"), 200),
+        semantica=_to_int(payload.get("semantica"), 0),
+        filtros=payload.get("filtros") if isinstance(payload.get("filtros"), dict) else {},
+        sort_field=str(payload.get("sortField") or ""),
+        sort_direccion=str(payload.get("sortDireccion") or ""),
+    )
+
+
+def scjn_legislacion_buscar(
+    q: str = Query(default=""),
+    page: int = Query(default=1, ge=1),
+    size: int = Query(default=10, ge=1, le=50),
+    fuente: str = Query(default="SIL"),
+    indice: str = Query(default="legislacion"),
+    extractos: int = Query(default=200, ge=0, le=1000),
+    semantica: int = Query(default=0, ge=0, le=1),
+    categoriaOrdenamiento: Optional[str] = Query(default=None),
+    ambito: Optional[str] = Query(default=None),
+    estado: Optional[str] = Query(default=None),
+    materia: Optional[str] = Query(default=None),
+    vigencia: Optional[str] = Query(default=None),
+    includeRaw: bool = Query(default=False),
+):
+    return _run_sync(
+        scjn_legislacion_buscar_async(
+            q=q,
+            page=page,
+            size=size,
+            fuente=fuente,
+            indice=indice,
+            extractos=extractos,
+            semantica=semantica,
+            categoriaOrdenamiento=categoriaOrdenamiento,
+            ambito=ambito,
+            estado=estado,
+            materia=materia,
+            vigencia=vigencia,
+            includeRaw=includeRaw,
+        )
+    )
+
+
 @app.get("/legislacion/buscar")
 @app.get("/scjn/legislacion/buscar")
-def scjn_legislacion_buscar(
+async def scjn_legislacion_buscar_async(
     q: str = Query(default=""),
     page: int = Query(default=1, ge=1),
     size: int = Query(default=10, ge=1, le=50),
@@ -2794,36 +5252,31 @@ def scjn_legislacion_buscar(
             vigencia=vigencia,
         ),
     )
-    return _legislacion_buscar_core(req_payload, includeRaw)
+    return await _legislacion_buscar_core_async(req_payload, includeRaw)
+
+
+def scjn_legislacion_buscar_post(
+    includeRaw: bool = Query(default=False),
+    payload: dict = Body(default={}),
+):
+    return _run_sync(scjn_legislacion_buscar_post_async(includeRaw=includeRaw, payload=payload))
 
 
 @app.post("/legislacion/buscar")
 @app.post("/scjn/legislacion/buscar")
-def scjn_legislacion_buscar_post(
+async def scjn_legislacion_buscar_post_async(
     includeRaw: bool = Query(default=False),
     payload: dict = Body(default={}),
 ):
     if not isinstance(payload, dict):
         return JSONResponse(status_code=400, content={"error": "Invalid payload"})
-
-    req_payload = _build_bj_legislacion_payload(
-        q=str(payload.get("q") or ""),
-        page=_to_int(payload.get("page"), 1),
-        size=_to_int(payload.get("size"), 10),
-        fuente=str(payload.get("fuente") or "SIL"),
-        indice=str(payload.get("indice") or "legislacion"),
-        extractos=_to_int(payload.get("extractos"), 200),
-        semantica=_to_int(payload.get("semantica"), 0),
-        filtros=payload.get("filtros") if isinstance(payload.get("filtros"), dict) else {},
-        sort_field=str(payload.get("sortField") or ""),
-        sort_direccion=str(payload.get("sortDireccion") or ""),
-    )
-    return _legislacion_buscar_core(req_payload, _to_bool(payload.get("includeRaw"), includeRaw))
+    include_raw = _to_bool(payload.get("includeRaw"), includeRaw)
+    return await _legislacion_buscar_core_async(_legislacion_post_payload(payload), include_raw)
 
 
 @app.get("/normas/buscar")
 @app.get("/legislacion/unificada/buscar")
-def normas_buscar(
+async def normas_buscar(
     nombre: str = Query(default=""),
     page: int = Query(default=1, ge=1),
     size: int = Query(default=10, ge=1, le=50),
@@ -2837,7 +5290,7 @@ def normas_buscar(
 ):
     if not str(nombre or "").strip():
         return JSONResponse(status_code=400, content={"error": "nombre es requerido"})
-    return _normas_buscar_core(
+    return await _normas_buscar_core_async(
         nombre=str(nombre or ""),
         page=page,
         size=size,
@@ -2853,7 +5306,7 @@ def normas_buscar(
 
 @app.post("/normas/buscar")
 @app.post("/legislacion/unificada/buscar")
-def normas_buscar_post(
+async def normas_buscar_post(
     includeRaw: bool = Query(default=False),
     payload: dict = Body(default={}),
 ):
@@ -2862,7 +5315,7 @@ def normas_buscar_post(
     nombre = str(payload.get("nombre") or payload.get("q") or "")
     if not nombre.strip():
         return JSONResponse(status_code=400, content={"error": "nombre es requerido"})
-    return _normas_buscar_core(
+    return await _normas_buscar_core_async(
         nombre=nombre,
         page=max(1, _to_int(payload.get("page"), 1)),
         size=min(50, max(1, _to_int(payload.get("size"), 10))),
@@ -2877,7 +5330,7 @@ def normas_buscar_post(
 
 
 @app.get("/normas/articulos/buscar")
-def normas_articulos_buscar(
+async def normas_articulos_buscar(
     nombre: str = Query(default=""),
     articulo: Optional[str] = Query(default=None),
     q: Optional[str] = Query(default=None),
@@ -2893,7 +5346,7 @@ def normas_articulos_buscar(
 ):
     if not str(nombre or "").strip():
         return JSONResponse(status_code=400, content={"error": "nombre es requerido"})
-    return _normas_articulos_buscar_core(
+    return await _normas_articulos_buscar_core_async(
         nombre=str(nombre or ""),
         articulo=articulo,
         q=q,
@@ -2910,7 +5363,7 @@ def normas_articulos_buscar(
 
 
 @app.post("/normas/articulos/buscar")
-def normas_articulos_buscar_post(
+async def normas_articulos_buscar_post(
     includeRaw: bool = Query(default=False),
     payload: dict = Body(default={}),
 ):
@@ -2919,7 +5372,7 @@ def normas_articulos_buscar_post(
     nombre = str(payload.get("nombre") or payload.get("qNorma") or "")
     if not nombre.strip():
         return JSONResponse(status_code=400, content={"error": "nombre es requerido"})
-    return _normas_articulos_buscar_core(
+    return await _normas_articulos_buscar_core_async(
         nombre=nombre,
         articulo=str(payload.get("articulo") or "") or None,
         q=str(payload.get("q") or "") or None,
@@ -2936,7 +5389,7 @@ def normas_articulos_buscar_post(
 
 
 @app.get("/normas/articulos/detalle")
-def normas_articulos_detalle(
+async def normas_articulos_detalle(
     nombre: str = Query(default=""),
     articulo: Optional[str] = Query(default=None),
     q: Optional[str] = Query(default=None),
@@ -2952,7 +5405,7 @@ def normas_articulos_detalle(
 ):
     if not str(nombre or "").strip():
         return JSONResponse(status_code=400, content={"error": "nombre es requerido"})
-    return _normas_articulos_detalle_core(
+    return await _normas_articulos_detalle_core_async(
         nombre=str(nombre or ""),
         articulo=articulo,
         q=q,
@@ -2969,7 +5422,7 @@ def normas_articulos_detalle(
 
 
 @app.post("/normas/articulos/detalle")
-def normas_articulos_detalle_post(
+async def normas_articulos_detalle_post(
     includeRaw: bool = Query(default=False),
     payload: dict = Body(default={}),
 ):
@@ -2978,7 +5431,7 @@ def normas_articulos_detalle_post(
     nombre = str(payload.get("nombre") or payload.get("qNorma") or "")
     if not nombre.strip():
         return JSONResponse(status_code=400, content={"error": "nombre es requerido"})
-    return _normas_articulos_detalle_core(
+    return await _normas_articulos_detalle_core_async(
         nombre=nombre,
         articulo=str(payload.get("articulo") or "") or None,
         q=str(payload.get("q") or "") or None,
@@ -2994,53 +5447,71 @@ def normas_articulos_detalle_post(
     )
 
 
+def scjn_legislacion_detalle(
+    id: int = Query(..., gt=0),
+    includeRaw: bool = Query(default=False),
+):
+    return _run_sync(scjn_legislacion_detalle_async(id=id, includeRaw=includeRaw))
+
+
 @app.get("/legislacion/detalle")
 @app.get("/scjn/legislacion/detalle")
-def scjn_legislacion_detalle(
+async def scjn_legislacion_detalle_async(
+    id: int = Query(..., gt=0),
+    includeRaw: bool = Query(default=False),
+):
+    return await _legislacion_detalle_core_async(id, includeRaw)
+
+
+def scjn_legislacion_articulos_buscar(
     id: int = Query(..., gt=0),
+    articulo: Optional[str] = Query(default=None),
+    q: Optional[str] = Query(default=None),
     includeRaw: bool = Query(default=False),
 ):
-    return _legislacion_detalle_core(id, includeRaw)
+    return _run_sync(scjn_legislacion_articulos_buscar_async(id=id, articulo=articulo, q=q, includeRaw=includeRaw))
 
 
 @app.get("/legislacion/articulos/buscar")
 @app.get("/scjn/legislacion/articulos/buscar")
-def scjn_legislacion_articulos_buscar(
+async def scjn_legislacion_articulos_buscar_async(
     id: int = Query(..., gt=0),
     articulo: Optional[str] = Query(default=None),
     q: Optional[str] = Query(default=None),
     includeRaw: bool = Query(default=False),
 ):
-    return _legislacion_articulos_buscar_core(id, articulo, q, includeRaw)
+    return await _legislacion_articulos_buscar_core_async(id, articulo, q, includeRaw)
 
 
-@app.post("/sjf/search")
-@app.post("/jurisprudencia/buscar")
 def sjf_search_advanced(
     page: int = Query(default=0, ge=0),
     size: int = Query(default=10, ge=1, le=50),
     includeRaw: bool = Query(default=False),
     payload: dict = Body(default={}),
 ):
-    if not isinstance(payload, dict) or not payload:
-        return JSONResponse(status_code=400, content={"error": "Invalid or empty payload"})
-    return _sjf_search_core(payload, page, size, includeRaw)
+    return _run_sync(sjf_search_advanced_async(page=page, size=size, includeRaw=includeRaw, payload=payload))
 
 
-@app.get("/sjf/detail")
-@app.get("/jurisprudencia/detalle")
-def sjf_detail(
-    ius: int = Query(..., gt=0),
-    isSemanal: Optional[bool] = Query(default=None),
-    hostName: Optional[str] = Query(default="https://sjf2.scjn.gob.mx"),
-    includeRaw: Optional[bool] = Query(default=False),
-    debug: bool = Query(default=False),
+@app.post("/sjf/search")
+@app.post("/jurisprudencia/buscar")
+async def sjf_search_advanced_async(
+    page: int = Query(default=0, ge=0),
+    size: int = Query(default=10, ge=1, le=50),
+    includeRaw: bool = Query(default=False),
+    payload: dict = Body(default={}),
 ):
-    hostName = hostName or "https://sjf2.scjn.gob.mx"
-    includeRaw = bool(includeRaw)
-    debug = bool(debug)
+    if not isinstance(payload, dict) or not payload:
+        return JSONResponse(status_code=400, content={"error": "Invalid or empty payload"})
+    return await _sjf_search_core_async(payload, page, size, includeRaw)
+
 
-    result, attempts = _sjf_detail_attempts(ius, hostName, isSemanal)
+def _sjf_detail_mode() -> dict:
+    if _SJF_DETAIL_HEDGE_DELAY_MS < 0:
+        return {"name": "sequential"}
+    return {"name": "hedged", "hedgeDelayMs": _SJF_DETAIL_HEDGE_DELAY_MS}
+
+
+def _sjf_detail_response(ius: int, host_name: str, include_raw: bool, debug: bool, result: dict, attempts: list[dict]) -> Any:
     status = result["status"]
     data = result["data"]
     used = result["isSemanal"]
@@ -3053,6 +5524,7 @@ def sjf_detail(
         }
         if debug:
             error_content["debug"] = {
+                "mode": _sjf_detail_mode(),
                 "attempts": [
                     {
                         "status": attempt["status"],
@@ -3062,6 +5534,8 @@ def sjf_detail(
                         "durationMs": attempt["durationMs"],
                         "requestHeaders": attempt["requestHeaders"],
                         "upstream": attempt["data"],
+                        "outcome": attempt.get("outcome"),
+                        "startedAfterMs": attempt.get("startedAfterMs"),
                     }
                     for attempt in attempts
                 ]
@@ -3083,17 +5557,18 @@ def sjf_detail(
     response = {
         "ius": ius,
         "isSemanalUsed": used is True,
-        "hostName": hostName,
+        "hostName": host_name,
         "rubro": _strip_html(rubro_raw).upper(),
         "fechaPublicacion": str(data.get("fechaPublicacion") if isinstance(data, dict) else ""),
         "titulo": "" if titulo_raw in (None, "None") else str(titulo_raw),
         "texto": texto,
         "textoPlano": _strip_html(texto),
     }
-    if includeRaw:
+    if include_raw:
         response["raw"] = data
     if debug:
         response["debug"] = {
+            "mode": _sjf_detail_mode(),
             "attempts": [
                 {
                     "status": attempt["status"],
@@ -3101,6 +5576,8 @@ def sjf_detail(
                     "isSemanal": attempt["isSemanal"],
                     "hostNameIncluded": attempt["hostNameIncluded"],
                     "durationMs": attempt["durationMs"],
+                    "outcome": attempt.get("outcome"),
+                    "startedAfterMs": attempt.get("startedAfterMs"),
                 }
                 for attempt in attempts
             ]
@@ -3108,17 +5585,53 @@ def sjf_detail(
     return response
 
 
-@app.get("/jurislex/decretos")
-def jurislex_decretos(
-    idLegislacion: int = Query(..., gt=0),
-    idOrdenamiento: Optional[int] = Query(default=None, gt=0),
+def sjf_detail(
+    ius: int = Query(..., gt=0),
+    isSemanal: Optional[bool] = Query(default=None),
+    hostName: Optional[str] = Query(default="https://sjf2.scjn.gob.mx"),
+    includeRaw: Optional[bool] = Query(default=False),
+    debug: bool = Query(default=False),
+):
+    return _run_sync(
+        sjf_detail_async(
+            ius=ius,
+            isSemanal=isSemanal,
+            hostName=hostName,
+            includeRaw=includeRaw,
+            debug=debug,
+        )
+    )
+
+
+@app.get("/sjf/detail")
+@app.get("/jurisprudencia/detalle")
+async def sjf_detail_async(
+    ius: int = Query(..., gt=0),
+    isSemanal: Optional[bool] = Query(default=None),
+    hostName: Optional[str] = Query(default="https://sjf2.scjn.gob.mx"),
+    includeRaw: Optional[bool] = Query(default=False),
+    debug: bool = Query(default=False),
 ):
-    ordenamiento = idOrdenamiento if idOrdenamiento is not None else idLegislacion
-    url = (
+    hostName = hostName or "https://sjf2.scjn.gob.mx"
+
+    async def build():
+        result, attempts = await _sjf_detail_attempts_async(ius, hostName, isSemanal)
+        return _sjf_detail_response(ius, hostName, bool(includeRaw), bool(debug), result, attempts)
+
+    if debug:
+        return await build()  # el reporte de intentos debe reflejar llamadas reales
+    return await _response_cached_async("sjf.detail", [ius, hostName, isSemanal, bool(includeRaw)], build)
+
+
+def _jurislex_decretos_url(id_legislacion: int, id_ordenamiento: Optional[int]) -> str:
+    ordenamiento = id_ordenamiento if id_ordenamiento is not None else id_legislacion
+    return (
         f"{JURISLEX_BASE}/decrees/{ordenamiento}?"
-        f"idLegis={idLegislacion}&idOrdenamiento={ordenamiento}"
+        f"idLegis={id_legislacion}&idOrdenamiento={ordenamiento}"
     )
-    status, data = _http_json(url, method="GET", headers=_jurislex_headers(content_type=False))
+
+
+def _jurislex_decretos_response(status: int, data: Any) -> Any:
     if status >= 400:
         return JSONResponse(
             status_code=status,
@@ -3127,35 +5640,58 @@ def jurislex_decretos(
     return {"count": len(data) if isinstance(data, list) else 0, "items": data}
 
 
-@app.get("/jurislex/articulos/buscar")
-def jurislex_buscar_articulos(
-    categoria: int = Query(..., gt=0, description="Categoria Jurislex"),
-    idLegislacion: int = Query(..., gt=0, description="IdLegislacion validado"),
-    desc: str = Query(default="", description="Numero de articulo o palabra"),
-    soloArticulo: bool = Query(default=False),
-    indice: int = Query(default=0, ge=0),
-    elementos: int = Query(default=20, ge=1, le=50),
-    articuloNumero: Optional[int] = Query(default=None, gt=0, description="Numero base para filtro exacto"),
-    includeRaw: bool = Query(default=False),
+def jurislex_decretos(
+    idLegislacion: int = Query(..., gt=0),
+    idOrdenamiento: Optional[int] = Query(default=None, gt=0),
 ):
-    desc_value = _jurislex_desc_value(desc, articuloNumero)
-    payload = {
-        "datosArticulo": {
-            "Indice": indice,
-            "Elementos": elementos,
-            "Ordenamiento": "A desc",
-            "IdLegislacion": [int(idLegislacion)],
-            "SoloArticulo": _to_bool(soloArticulo, False),
-            "Desc": desc_value,
-            "SoloIndices": False,
-            "filterRaw": _jurislex_search_filter_raw(int(idLegislacion), articuloNumero, desc),
-            "BusquedaGeneralArticulo": None,
-            "bClipboard": False,
-        }
+    return _run_sync(jurislex_decretos_async(idLegislacion=idLegislacion, idOrdenamiento=idOrdenamiento))
+
+
+@app.get("/jurislex/decretos")
+async def jurislex_decretos_async(
+    idLegislacion: int = Query(..., gt=0),
+    idOrdenamiento: Optional[int] = Query(default=None, gt=0),
+):
+    url = _jurislex_decretos_url(idLegislacion, idOrdenamiento)
+    status, data = await _http_json_async(
+        url, method="GET", headers=_jurislex_headers(content_type=False), cache_policy="jurislex.decretos"
+    )
+    return _jurislex_decretos_response(status, data)
+
+
+def _jurislex_articulos_request(categoria: int, datos_articulo: dict) -> dict:
+    return {
+        "url": f"{JURISLEX_BASE}/ObtenerArticulos/{categoria}",
+        "method": "POST",
+        "body": {"datosArticulo": datos_articulo},
+        "headers": _jurislex_headers(content_type=True),
+        "cache_policy": "jurislex.articulos",
+    }
+
+
+def _jurislex_articulos_datos(
+    id_legislacion: int,
+    desc: str,
+    solo_articulo: bool,
+    indice: int,
+    elementos: int,
+    articulo_numero: Optional[int],
+) -> dict:
+    return {
+        "Indice": indice,
+        "Elementos": elementos,
+        "Ordenamiento": "A desc",
+        "IdLegislacion": [int(id_legislacion)],
+        "SoloArticulo": _to_bool(solo_articulo, False),
+        "Desc": _jurislex_desc_value(desc, articulo_numero),
+        "SoloIndices": False,
+        "filterRaw": _jurislex_search_filter_raw(int(id_legislacion), articulo_numero, desc),
+        "BusquedaGeneralArticulo": None,
+        "bClipboard": False,
     }
 
-    url = f"{JURISLEX_BASE}/ObtenerArticulos/{categoria}"
-    status, data = _http_json(url, method="POST", body=payload, headers=_jurislex_headers(content_type=True))
+
+def _jurislex_articulos_response(status: int, data: Any, include_raw: bool, header: dict) -> Any:
     if status >= 400:
         return JSONResponse(
             status_code=status,
@@ -3165,13 +5701,10 @@ def jurislex_buscar_articulos(
     resultado = data.get("Resultado") if isinstance(data, dict) else []
     if not isinstance(resultado, list):
         resultado = []
-    items = [_normalize_jurislex_result(item, include_raw=includeRaw) for item in resultado]
+    items = [_normalize_jurislex_result(item, include_raw=include_raw) for item in resultado]
 
     return {
-        "categoria": categoria,
-        "idLegislacion": idLegislacion,
-        "indice": indice,
-        "elementos": elementos,
+        **header,
         "count": len(items),
         "total": _to_int(data.get("Total") if isinstance(data, dict) else None, len(items)),
         "totalArticulos": _to_int(
@@ -3181,14 +5714,68 @@ def jurislex_buscar_articulos(
     }
 
 
-@app.post("/jurislex/articulos/buscar")
-def jurislex_buscar_articulos_post(payload: dict = Body(default={})):
-    categoria = _to_int(payload.get("categoria"), None)
-    datos = payload.get("datosArticulo") if isinstance(payload, dict) else None
-    if categoria is None or not isinstance(datos, dict):
-        return JSONResponse(status_code=400, content={"error": "categoria and datosArticulo are required"})
+async def _jurislex_buscar_articulos_core_async(
+    categoria: int,
+    id_legislacion: int,
+    desc: str,
+    solo_articulo: bool,
+    indice: int,
+    elementos: int,
+    articulo_numero: Optional[int],
+    include_raw: bool,
+) -> Any:
+    _record_warm_query(
+        "jurislex.articulos",
+        [categoria, id_legislacion, desc, solo_articulo, indice, elementos, articulo_numero, include_raw],
+    )
+    datos = _jurislex_articulos_datos(id_legislacion, desc, solo_articulo, indice, elementos, articulo_numero)
+    status, data = await _http_json_async(**_jurislex_articulos_request(categoria, datos))
+    header = {"categoria": categoria, "idLegislacion": id_legislacion, "indice": indice, "elementos": elementos}
+    return _jurislex_articulos_response(status, data, include_raw, header)
+
+
+def jurislex_buscar_articulos(
+    categoria: int = Query(..., gt=0, description="Categoria Jurislex"),
+    idLegislacion: int = Query(..., gt=0, description="IdLegislacion validado"),
+    desc: str = Query(default="", description="Numero de articulo o palabra"),
+    soloArticulo: bool = Query(default=False),
+    indice: int = Query(default=0, ge=0),
+    elementos: int = Query(default=20, ge=1, le=50),
+    articuloNumero: Optional[int] = Query(default=None, gt=0, description="Numero base para filtro exacto"),
+    includeRaw: bool = Query(default=False),
+):
+    return _run_sync(
+        jurislex_buscar_articulos_async(
+            categoria=categoria,
+            idLegislacion=idLegislacion,
+            desc=desc,
+            soloArticulo=soloArticulo,
+            indice=indice,
+            elementos=elementos,
+            articuloNumero=articuloNumero,
+            includeRaw=includeRaw,
+        )
+    )
+
+
+@app.get("/jurislex/articulos/buscar")
+async def jurislex_buscar_articulos_async(
+    categoria: int = Query(..., gt=0, description="Categoria Jurislex"),
+    idLegislacion: int = Query(..., gt=0, description="IdLegislacion validado"),
+    desc: str = Query(default="", description="Numero de articulo o palabra"),
+    soloArticulo: bool = Query(default=False),
+    indice: int = Query(default=0, ge=0),
+    elementos: int = Query(default=20, ge=1, le=50),
+    articuloNumero: Optional[int] = Query(default=None, gt=0, description="Numero base para filtro exacto"),
+    includeRaw: bool = Query(default=False),
+):
+    return await _jurislex_buscar_articulos_core_async(
+        categoria, idLegislacion, desc, soloArticulo, indice, elementos, articuloNumero, includeRaw
+    )
 
-    datos_articulo = {
+
+def _jurislex_post_datos(datos: dict) -> dict:
+    return {
         "Indice": _to_int(datos.get("Indice"), 0),
         "Elementos": _to_int(datos.get("Elementos"), 20),
         "Ordenamiento": "A desc",
@@ -3201,42 +5788,41 @@ def jurislex_buscar_articulos_post(payload: dict = Body(default={})):
         "bClipboard": _to_bool(datos.get("bClipboard"), False),
     }
 
-    req_body = {"datosArticulo": datos_articulo}
-    url = f"{JURISLEX_BASE}/ObtenerArticulos/{categoria}"
-    status, data = _http_json(url, method="POST", body=req_body, headers=_jurislex_headers(content_type=True))
-    if status >= 400:
-        return JSONResponse(
-            status_code=status,
-            content={"error": "Jurislex buscar articulos failed", "status": status, "upstream": data},
-        )
 
-    resultado = data.get("Resultado") if isinstance(data, dict) else []
-    if not isinstance(resultado, list):
-        resultado = []
+def jurislex_buscar_articulos_post(payload: dict = Body(default={})):
+    return _run_sync(jurislex_buscar_articulos_post_async(payload=payload))
+
+
+@app.post("/jurislex/articulos/buscar")
+async def jurislex_buscar_articulos_post_async(payload: dict = Body(default={})):
+    categoria = _to_int(payload.get("categoria"), None)
+    datos = payload.get("datosArticulo") if isinstance(payload, dict) else None
+    if categoria is None or not isinstance(datos, dict):
+        return JSONResponse(status_code=400, content={"error": "categoria and datosArticulo are required"})
+
+    status, data = await _http_json_async(**_jurislex_articulos_request(categoria, _jurislex_post_datos(datos)))
     include_raw = _to_bool(payload.get("includeRaw"), False)
-    items = [_normalize_jurislex_result(item, include_raw=include_raw) for item in resultado]
+    return _jurislex_articulos_response(status, data, include_raw, {"categoria": categoria})
 
+
+def _jurislex_detalle_request(categoria: int, id_legislacion: int, id_articulo: int) -> dict:
     return {
-        "categoria": categoria,
-        "count": len(items),
-        "total": _to_int(data.get("Total") if isinstance(data, dict) else None, len(items)),
-        "totalArticulos": _to_int(
-            data.get("TotalArticulos") if isinstance(data, dict) else None, len(items)
-        ),
-        "items": items,
+        "url": f"{JURISLEX_BASE}/ObtenerDetalleArticulos/{categoria}",
+        "method": "POST",
+        "body": {"datosArticulo": {"IdLegislacion": int(id_legislacion), "IdArticulo": int(id_articulo)}},
+        "headers": _jurislex_headers(content_type=True),
+        "cache_policy": "jurislex.detalle",
     }
 
 
-@app.get("/jurislex/articulos/detalle")
-def jurislex_detalle_articulo(
-    categoria: int = Query(..., gt=0),
-    idLegislacion: int = Query(..., gt=0),
-    idArticulo: int = Query(..., gt=0),
-    includeRaw: bool = Query(default=False),
-):
-    payload = {"datosArticulo": {"IdLegislacion": int(idLegislacion), "IdArticulo": int(idArticulo)}}
-    url = f"{JURISLEX_BASE}/ObtenerDetalleArticulos/{categoria}"
-    status, data = _http_json(url, method="POST", body=payload, headers=_jurislex_headers(content_type=True))
+def _jurislex_detalle_response(
+    status: int,
+    data: Any,
+    categoria: int,
+    id_legislacion: int,
+    id_articulo: int,
+    include_raw: bool,
+) -> Any:
     if status >= 400:
         return JSONResponse(
             status_code=status,
@@ -3246,8 +5832,8 @@ def jurislex_detalle_articulo(
     detail = data if isinstance(data, dict) else {}
     response = {
         "categoria": categoria,
-        "idLegislacion": detail.get("iIdLey") or idLegislacion,
-        "idArticulo": detail.get("iIdArticulo") or idArticulo,
+        "idLegislacion": detail.get("iIdLey") or id_legislacion,
+        "idArticulo": detail.get("iIdArticulo") or id_articulo,
         "ley": detail.get("sLey") or "",
         "libro": detail.get("sLibro") or "",
         "titulo": detail.get("sTitulo") or "",
@@ -3255,11 +5841,43 @@ def jurislex_detalle_articulo(
         "texto": detail.get("sDescArticulo") or "",
         "textoPlano": _strip_html(detail.get("sDescArticulo") or ""),
     }
-    if includeRaw:
+    if include_raw:
         response["raw"] = detail
     return response
 
 
+async def _jurislex_detalle_articulo_core_async(categoria: int, id_legislacion: int, id_articulo: int, include_raw: bool) -> Any:
+    _record_warm_query("jurislex.detalle", [categoria, id_legislacion, id_articulo, include_raw])
+    status, data = await _http_json_async(**_jurislex_detalle_request(categoria, id_legislacion, id_articulo))
+    return _jurislex_detalle_response(status, data, categoria, id_legislacion, id_articulo, include_raw)
+
+
+def jurislex_detalle_articulo(
+    categoria: int = Query(..., gt=0),
+    idLegislacion: int = Query(..., gt=0),
+    idArticulo: int = Query(..., gt=0),
+    includeRaw: bool = Query(default=False),
+):
+    return _run_sync(
+        jurislex_detalle_articulo_async(
+            categoria=categoria,
+            idLegislacion=idLegislacion,
+            idArticulo=idArticulo,
+            includeRaw=includeRaw,
+        )
+    )
+
+
+@app.get("/jurislex/articulos/detalle")
+async def jurislex_detalle_articulo_async(
+    categoria: int = Query(..., gt=0),
+    idLegislacion: int = Query(..., gt=0),
+    idArticulo: int = Query(..., gt=0),
+    includeRaw: bool = Query(default=False),
+):
+    return await _jurislex_detalle_articulo_core_async(categoria, idLegislacion, idArticulo, includeRaw)
+
+
 @app.post("/documentos/extraer-texto")
 def extraer_texto_documento(payload: dict = Body(default={})):
     file_name = str(payload.get("fileName") or "").strip()
@@ -3289,7 +5907,7 @@ def extraer_texto_documento(payload: dict = Body(default={})):
     }
 
 @app.post("/citas/extraer")
-def extraer_citas(payload: dict = Body(default={})):
+async def extraer_citas(payload: dict = Body(default={})):
     texto = str(payload.get("texto") or "")
     fuente = str(payload.get("fuente") or "texto")
     resolver = _to_bool(payload.get("resolver"), False)
@@ -3298,11 +5916,19 @@ def extraer_citas(payload: dict = Body(default={})):
     if not texto_limpio.strip():
         return JSONResponse(status_code=400, content={"error": "texto es requerido"})
 
-    abbreviations = _extract_document_abbreviations(texto_limpio)
-    citas = _extract_citas(texto_limpio, abbreviations=abbreviations)
+    abbreviations = await run_in_threadpool(_extract_document_abbreviations, texto_limpio)
+    citas = await run_in_threadpool(_extract_citas, texto_limpio, abbreviations=abbreviations)
+    # Cada consulta a las fuentes (busqueda SJF de claves y, con resolver, el detalle de cada cita)
+    # se cobra antes de hacerla.
+    consultas = len(_citas_por_enriquecer(citas)) + (len(citas) if resolver else 0)
+    rejected = await _charge_rate_cost(consultas * _RATE_LIMIT_CITA_COST)
+    if rejected is not None:
+        return rejected
+    await _enrich_citas(citas)
 
     if resolver:
-        citas = [_merge_cita_with_detalle(cita, _resolve_cita_detalle(cita)) for cita in citas]
+        detalles = await _gather_citas(_resolve_cita_detalle, citas)
+        citas = [_merge_cita_with_detalle(cita, detalle) for cita, detalle in zip(citas, detalles)]
 
     articulos_resueltos = [cita for cita in citas if cita.get("tipo") == "articulo" and cita.get("resuelta")]
 
@@ -3321,7 +5947,7 @@ def extraer_citas(payload: dict = Body(default={})):
         "items": citas,
     }
     if resolver:
-        response["reporte"] = _build_citas_report(citas)
+        response["reporte"] = _build_citas_report(citas, detalles)
     return response
 
 
@@ -3345,8 +5971,43 @@ def health_check():
     return {"status": "ok", "service": "Ordina-engine"}
 
 
-@app.get("/health/deep")
-def deep_health_check():
+def _deep_health_sjf_request() -> dict:
+    return {
+        "url": f"{SJF_BASE}/tesis?page=0&size=1",
+        "method": "POST",
+        "body": _default_sjf_payload("amparo"),
+        "headers": _sjf_headers(content_type=True),
+    }
+
+
+def _deep_health_jurislex_request() -> dict:
+    jurislex_payload = {
+        "datosArticulo": {
+            "Indice": 0,
+            "Elementos": 1,
+            "Ordenamiento": "A desc",
+            "IdLegislacion": [1000],
+            "SoloArticulo": True,
+            "Desc": "1",
+            "SoloIndices": False,
+            "filterRaw": _jurislex_filter_raw(1000, 1),
+            "BusquedaGeneralArticulo": None,
+            "bClipboard": False,
+        }
+    }
+    return {
+        "url": f"{JURISLEX_BASE}/ObtenerArticulos/1000",
+        "method": "POST",
+        "body": jurislex_payload,
+        "headers": _jurislex_headers(content_type=True),
+    }
+
+
+def _deep_health_response(
+    sjf_result: tuple[int, Any],
+    jurislex_result: tuple[int, Any],
+    tepjf_result: tuple[int, Any],
+) -> JSONResponse:
     checks = []
 
     catalog_ok = isinstance(leyes, list) and len(leyes) > 0
@@ -3358,14 +6019,7 @@ def deep_health_check():
         }
     )
 
-    sjf_payload = _default_sjf_payload("amparo")
-    sjf_url = f"{SJF_BASE}/tesis?page=0&size=1"
-    sjf_status, sjf_data = _http_json(
-        sjf_url,
-        method="POST",
-        body=sjf_payload,
-        headers=_sjf_headers(content_type=True),
-    )
+    sjf_status, sjf_data = sjf_result
     sjf_docs = _extract_docs(sjf_data)
     sjf_ok = sjf_status == 200 and len(sjf_docs) >= 1
     checks.append(
@@ -3376,27 +6030,7 @@ def deep_health_check():
         }
     )
 
-    jurislex_payload = {
-        "datosArticulo": {
-            "Indice": 0,
-            "Elementos": 1,
-            "Ordenamiento": "A desc",
-            "IdLegislacion": [1000],
-            "SoloArticulo": True,
-            "Desc": "1",
-            "SoloIndices": False,
-            "filterRaw": _jurislex_filter_raw(1000, 1),
-            "BusquedaGeneralArticulo": None,
-            "bClipboard": False,
-        }
-    }
-    jurislex_url = f"{JURISLEX_BASE}/ObtenerArticulos/1000"
-    jl_status, jl_data = _http_json(
-        jurislex_url,
-        method="POST",
-        body=jurislex_payload,
-        headers=_jurislex_headers(content_type=True),
-    )
+    jl_status, jl_data = jurislex_result
     jl_results = jl_data.get("Resultado") if isinstance(jl_data, dict) else []
     if not isinstance(jl_results, list):
         jl_results = []
@@ -3409,11 +6043,7 @@ def deep_health_check():
         }
     )
 
-    tepjf_status, tepjf_data = _http_multipart(
-        TEPJF_BASE,
-        _tepjf_form(and_terms="amparo", pagina=1),
-        headers=_tepjf_headers(),
-    )
+    tepjf_status, tepjf_data = tepjf_result
     tepjf_items = _extract_tepjf_items(tepjf_data)
     tepjf_ok = tepjf_status == 200 and isinstance(tepjf_data, dict)
     checks.append(
@@ -3434,9 +6064,239 @@ def deep_health_check():
             "status": status_text,
             "service": "Ordina-engine",
             "checks": checks,
+            "circuitBreakers": _breaker_snapshot(),
         },
     )
 
+
+def deep_health_check():
+    return _run_sync(deep_health_check_async())
+
+
+# Pre-calentamiento de cache: al arrancar se reproducen en segundo plano, con concurrencia y ritmo
+# acotados, las consultas de CACHE_WARM_SEED_PATH (lista fija) y las mas frecuentes registradas en
+# CACHE_WARM_LOG_PATH (que se reescribe al apagar con las CACHE_WARM_TOP_N mas pedidas).
+_CACHE_WARM_SEED_PATH = os.getenv("CACHE_WARM_SEED_PATH", "")
+_CACHE_WARM_LOG_PATH = os.getenv("CACHE_WARM_LOG_PATH", "")
+_CACHE_WARM_TOP_N = max(0, _env_int("CACHE_WARM_TOP_N", 100))
+_CACHE_WARM_CONCURRENCY = max(1, _env_int("CACHE_WARM_CONCURRENCY", 4))
+_CACHE_WARM_RATE = _env_float("CACHE_WARM_RATE", 5.0)  # consultas por segundo; <= 0 sin limite
+_CACHE_WARM_LOG_MAX = 5000
+_CACHE_WARMERS = {
+    "sjf.search": _sjf_search_core_async,
+    "bj.legislacion": _legislacion_detalle_core_async,
+    "jurislex.articulos": _jurislex_buscar_articulos_core_async,
+    "jurislex.detalle": _jurislex_detalle_articulo_core_async,
+}
+_warm_queries: dict[str, int] = {}  # json [kind, args] → frecuencia
+_warm_stats = {"queued": 0, "warmed": 0, "failed": 0}
+_warm_next_slot = 0.0
+_warm_lock = threading.Lock()
+_warming: contextvars.ContextVar[bool] = contextvars.ContextVar("warming", default=False)
+
+
+def _warm_query_key(kind: str, args: Any) -> Optional[str]:
+    try:
+        return json.dumps([kind, args], ensure_ascii=False, sort_keys=True)
+    except (TypeError, ValueError):
+        return None
+
+
+def _record_warm_query(kind: str, args: list) -> None:
+    # Las consultas del propio warmer no cuentan como trafico.
+    if not _CACHE_WARM_LOG_PATH or _warming.get():
+        return
+    key = _warm_query_key(kind, args)
+    if key is None:
+        return
+    with _warm_lock:
+        _warm_queries[key] = _warm_queries.get(key, 0) + 1
+        if len(_warm_queries) > _CACHE_WARM_LOG_MAX:
+            for rare in sorted(_warm_queries, key=_warm_queries.get)[: len(_warm_queries) // 2]:
+                del _warm_queries[rare]
+
+
+def _read_warm_file(path: str) -> list[dict]:
+    if not path or not os.path.exists(path):
+        return []
+    try:
+        with open(path, encoding="utf-8") as fh:
+            entries = json.load(fh)
+    except (OSError, ValueError) as exc:
+        logger.warning("archivo de pre-calentamiento invalido en %s: %s", path, exc)
+        return []
+    if not isinstance(entries, list):
+        logger.warning("archivo de pre-calentamiento invalido en %s: se esperaba una lista", path)
+        return []
+    return [entry for entry in entries if isinstance(entry, dict) and entry.get("kind") in _CACHE_WARMERS]
+
+
+def _warm_entries() -> list[tuple[str, Any]]:
+    """Semillas en orden de archivo y despues las consultas registradas mas frecuentes, sin duplicados."""
+    logged = _read_warm_file(_CACHE_WARM_LOG_PATH)
+    with _warm_lock:
+        for entry in logged:
+            key = _warm_query_key(entry["kind"], entry.get("args", []))
+            if key is not None:
+                # Decaimiento: las frecuencias de despliegues anteriores pesan la mitad.
+                _warm_queries[key] = max(_warm_queries.get(key, 0), max(1, _to_int(entry.get("hits"), 1) // 2))
+    logged.sort(key=lambda entry: _to_int(entry.get("hits"), 0), reverse=True)
+    entries, seen = [], set()
+    for entry in _read_warm_file(_CACHE_WARM_SEED_PATH) + logged[:_CACHE_WARM_TOP_N]:
+        key = _warm_query_key(entry["kind"], entry.get("args", []))
+        if key is not None and key not in seen:
+            seen.add(key)
+            entries.append((entry["kind"], entry.get("args", [])))
+    return entries
+
+
+async def _warm_wait_turn() -> None:
+    global _warm_next_slot
+    if _CACHE_WARM_RATE <= 0:
+        return
+    with _warm_lock:
+        now = time.monotonic()
+        slot = max(now, _warm_next_slot)
+        _warm_next_slot = slot + 1 / _CACHE_WARM_RATE
+    await asyncio.sleep(slot - now)
+
+
+async def _warm_one(kind: str, args: Any, slots: asyncio.Semaphore) -> None:
+    if kind == "sjf.search" and isinstance(args, dict) and "q" in args:
+        # Atajo para semillas: los mismos valores por defecto que /sjf/search.
+        args = [_default_sjf_payload(args["q"]), args.get("page", 0), args.get("size", 10), args.get("include_raw", False)]
+    async with slots:
+        await _warm_wait_turn()
+        token = _warming.set(True)
+        try:
+            result = await (_CACHE_WARMERS[kind](**args) if isinstance(args, dict) else _CACHE_WARMERS[kind](*args))
+            ok = not isinstance(result, JSONResponse)
+        except Exception as exc:  # noqa: BLE001 - una semilla invalida no debe detener al resto
+            logger.warning("pre-calentamiento de %s fallo: %s", kind, exc)
+            ok = False
+        finally:
+            _warming.reset(token)
+    with _warm_lock:
+        _warm_stats["warmed" if ok else "failed"] += 1
+
+
+async def _run_cache_warmer(entries: list[tuple[str, Any]]) -> None:
+    slots = asyncio.Semaphore(_CACHE_WARM_CONCURRENCY)
+    await asyncio.gather(*(_warm_one(kind, args, slots) for kind, args in entries))
+
+
+def _start_cache_warmer() -> int:
+    entries = _warm_entries()
+    if entries:
+        task = asyncio.get_running_loop().create_task(_run_cache_warmer(entries))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+        with _warm_lock:
+            _warm_stats["queued"] += len(entries)
+        logger.info("pre-calentando la cache con %d consultas", len(entries))
+    return len(entries)
+
+
+def _save_warm_log() -> None:
+    if not _CACHE_WARM_LOG_PATH:
+        return
+    with _warm_lock:
+        top = sorted(_warm_queries.items(), key=lambda item: item[1], reverse=True)[:_CACHE_WARM_TOP_N]
+    payload = [{"kind": kind, "args": args, "hits": hits} for (kind, args), hits in ((json.loads(k), h) for k, h in top)]
+    try:
+        _write_json_atomic(_CACHE_WARM_LOG_PATH, payload)
+    except OSError as exc:
+        logger.warning("no se pudo guardar el registro de consultas en %s: %s", _CACHE_WARM_LOG_PATH, exc)
+
+
+@app.get("/health/cache")
+def cache_health_check():
+    with _warm_lock:
+        warmer = {**_warm_stats, "trackedQueries": len(_warm_queries)}
+    return {"status": "ok", "service": "Ordina-engine", "cache": _cache_snapshot(), "warmer": warmer}
+
+
+@app.get("/admin/cache/stats")
+def cache_admin_stats(request: Request):
+    denied = _cache_admin_denied(request)
+    if denied is not None:
+        return denied
+    return {"status": "ok", "cache": _cache_snapshot(), **_cache_breakdown()}
+
+
+@app.get("/admin/cache/keys")
+def cache_admin_keys(
+    request: Request,
+    prefix: Optional[str] = None,
+    upstream: Optional[str] = None,
+    route: Optional[str] = None,
+    limit: int = Query(default=100, ge=1, le=1000),
+):
+    denied = _cache_admin_denied(request)
+    if denied is not None:
+        return denied
+    return {"keys": _cache_keys_snapshot(_cache_origin_matcher(prefix, upstream, route), limit)}
+
+
+@app.post("/admin/cache/purge")
+def cache_admin_purge(request: Request, payload: dict = Body(default={})):
+    denied = _cache_admin_denied(request)
+    if denied is not None:
+        return denied
+    criteria = {name: payload.get(name) for name in ("prefix", "upstream", "route")}
+    if any(value is not None and not isinstance(value, str) for value in criteria.values()):
+        return JSONResponse(status_code=400, content={"error": "Invalid payload"})
+    if all(value is None for value in criteria.values()) and payload.get("all") is not True:
+        return JSONResponse(status_code=400, content={"error": "prefix, upstream, route or all=true required"})
+    return {"status": "ok", "removed": _cache_purge(_cache_origin_matcher(**criteria))}
+
+
+@app.get("/admin/cache/snapshot")
+def cache_admin_snapshot(request: Request):
+    denied = _cache_admin_denied(request)
+    if denied is not None:
+        return denied
+    return Response(
+        content=_build_cache_snapshot(),
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": 'attachment; filename="ordina-cache.snapshot"'},
+    )
+
+
+@app.delete("/admin/cache/keys/{key}")
+def cache_admin_delete_key(request: Request, key: str):
+    denied = _cache_admin_denied(request)
+    if denied is not None:
+        return denied
+    removed = _cache_delete(key)
+    if not any(removed.values()):
+        return JSONResponse(status_code=404, content={"error": "key not found"})
+    return {"status": "ok", "removed": removed}
+
+
+@app.get("/health/pools")
+def pools_health_check():
+    with _inflight_lock:
+        single_flight = dict(_single_flight_stats)
+    return {
+        "status": "ok",
+        "service": "Ordina-engine",
+        "http2Available": _HTTP2_AVAILABLE,
+        "pools": _pool_snapshot(),
+        "singleFlight": single_flight,
+    }
+
+
+@app.get("/health/deep")
+async def deep_health_check_async():
+    # Las tres sondas son independientes; se lanzan en paralelo.
+    sjf_result, jurislex_result, tepjf_result = await asyncio.gather(
+        _http_json_async(**_deep_health_sjf_request()),
+        _http_json_async(**_deep_health_jurislex_request()),
+        _http_multipart_async(TEPJF_BASE, _tepjf_form(and_terms="amparo", pagina=1), headers=_tepjf_headers()),
+    )
+    return _deep_health_response(sjf_result, jurislex_result, tepjf_result)
+
 @app.get("/ley")
 def buscar_ley(id: Optional[int] = None, categoria: Optional[int] = None, nombre: Optional[str] = None):
     return JSONResponse(content=_buscar_ley_core(id=id, categoria=categoria, nombre=nombre))
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import heapq
 import json
 import re
 import sys
@@ -69,27 +70,30 @@ def _normalize_match_text(value: Any) -> str:
     return ordina_api._normalize_text(str(value or ""))
 
 
-# Cache for _rank_laws keyed on (nombre_norm, number_of_laws).
+# Cache for _rank_laws keyed on (nombre_norm, number_of_laws, limit).
 # Using a simple dict instead of lru_cache because leyes is a mutable list.
-_rank_laws_cache: dict[tuple[str, int], list[dict[str, Any]]] = {}
+_rank_laws_cache: dict[tuple[str, int, Optional[int]], list[dict[str, Any]]] = {}
 
 
-def _rank_laws(nombre: str, leyes: list[dict[str, Any]]) -> list[dict[str, Any]]:
+def _rank_laws(nombre: str, leyes: list[dict[str, Any]], limit: Optional[int] = None) -> list[dict[str, Any]]:
     nombre_norm = _normalize_match_text(nombre)
     if not nombre_norm:
-        return leyes
+        return leyes if limit is None else leyes[:limit]
 
-    cache_key = (nombre_norm, len(leyes))
+    cache_key = (nombre_norm, len(leyes), limit)
     if cache_key in _rank_laws_cache:
         return _rank_laws_cache[cache_key]
 
     query_tokens = [token for token in nombre_norm.split(" ") if token]
     whole_query_pattern = re.compile(rf"\b{re.escape(nombre_norm)}\b")
+    # One compiled pattern per distinct token, shared by every law scored below.
+    token_patterns = {token: re.compile(rf"\b{re.escape(token)}\b") for token in query_tokens}
+    query_patterns = [token_patterns[token] for token in query_tokens]
 
     def score(item: dict[str, Any]) -> tuple[int, int, str]:
         law_name = str(item.get("nombre") or "")
         law_norm = _normalize_match_text(law_name)
-        token_count = sum(1 for token in query_tokens if re.search(rf"\b{re.escape(token)}\b", law_norm))
+        token_count = sum(1 for pattern in query_patterns if pattern.search(law_norm))
         if law_norm == nombre_norm:
             return (0, len(law_name), law_norm)
         if law_norm.startswith(f"{nombre_norm} "):
@@ -102,7 +106,8 @@ def _rank_laws(nombre: str, leyes: list[dict[str, Any]]) -> list[dict[str, Any]]
             return (4, len(law_name), law_norm)
         return (5, -token_count, len(law_name), law_norm)
 
-    result = sorted(leyes, key=score)
+    # Callers only keep the first few laws: select them without sorting the whole list.
+    result = sorted(leyes, key=score) if limit is None else heapq.nsmallest(limit, leyes, key=score)
     _rank_laws_cache[cache_key] = result
     return result
 
@@ -446,8 +451,7 @@ def buscar_ley(id: Optional[int] = None, categoria: Optional[int] = None, nombre
 
 
 def resolver_ley_por_nombre(nombre: str, maxResultados: int = 5) -> Any:
-    leyes = _rank_laws(nombre, _law_matches(nombre))
-    top = leyes[: max(1, min(maxResultados, 20))]
+    top = _rank_laws(nombre, _law_matches(nombre), max(1, min(maxResultados, 20)))
     return {
         "query": nombre,
         "count": len(top),
@@ -708,7 +712,7 @@ def buscar_articulo_por_ley_y_numero(
     includeRaw: bool = False,
     articuloSufijo: Optional[str] = None,
 ) -> Any:
-    leyes = _rank_laws(nombreLey, _law_matches(nombreLey))[: max(1, min(maxLeyes, 20))]
+    leyes = _rank_laws(nombreLey, _law_matches(nombreLey), max(1, min(maxLeyes, 20)))
     if not leyes:
         return {
             "query": {"nombreLey": nombreLey, "numeroArticulo": numeroArticulo},
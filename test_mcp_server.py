@@ -1,13 +1,20 @@
 from __future__ import annotations
 
+import asyncio
 import sys
+import threading
 import time
 import unittest
+import fnmatch
 import json
 import subprocess
+import tempfile
 from pathlib import Path
+import httpx
 from fastapi import HTTPException
-from unittest.mock import patch
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+from unittest.mock import AsyncMock, patch
 
 
 ROOT = Path(__file__).resolve().parent
@@ -19,6 +26,25 @@ import mcp_http_server
 import api
 
 
+def _reset_cache() -> None:
+    """Empty the in-memory cache together with its side tables and byte count."""
+    for table in (api._cache, api._cache_sizes, api._cache_ttls, api._cache_origins, api._cache_access, api._cache_variants):
+        table.clear()
+    api._cache_bytes = 0
+
+
+def _client(status: int = 200, payload=None, *, handler=None, calls: list | None = None) -> httpx.AsyncClient:
+    """Async client on a mock transport: `handler` if given, else a fixed JSON reply recorded in `calls`."""
+    if handler is None:
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            if calls is not None:
+                calls.append(request)
+            return httpx.Response(status, json={} if payload is None else payload)
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
 class McpServerTests(unittest.TestCase):
     def test_buscar_ley_matches_oaxaca_with_partial_tokens(self) -> None:
         result = api.buscar_ley(nombre="penal Oaxaca")
@@ -385,7 +411,7 @@ class ApiHelperTests(unittest.TestCase):
     # --- TTL cache ---
 
     def setUp(self) -> None:
-        api._cache.clear()
+        _reset_cache()
 
     def test_set_cached_stores_entry(self) -> None:
         key = api._cache_key("http://example.com", "GET", None)
@@ -423,6 +449,1546 @@ class ApiHelperTests(unittest.TestCase):
         self.assertEqual(k1, k2)  # sort_keys ensures stability
 
 
+class BoundedCacheTests(unittest.TestCase):
+    """Tests for the size-bounded LRU response cache."""
+
+    def setUp(self) -> None:
+        _reset_cache()
+
+    def test_lru_evicts_least_recently_used_entry(self) -> None:
+        with patch.object(api, "_CACHE_MAX_ENTRIES", 2):
+            api._set_cached("a", 200, {"v": 1})
+            api._set_cached("b", 200, {"v": 2})
+            api._get_cached("a")
+            evictions = api._cache_stats["evictions"]
+            api._set_cached("c", 200, {"v": 3})
+        self.assertEqual(list(api._cache), ["a", "c"])
+        self.assertEqual(api._cache_stats["evictions"], evictions + 1)
+
+    def test_byte_budget_limits_total_size(self) -> None:
+        payload = {"texto": "x" * 100}
+        size = api._estimate_size(payload)
+        with patch.object(api, "_CACHE_MAX_BYTES", size * 2 + 1):
+            for key in ("a", "b", "c"):
+                api._set_cached(key, 200, payload)
+            api._set_cached("big", 200, {"texto": "x" * (size * 3)})
+        self.assertEqual(list(api._cache), ["b", "c"])
+        self.assertEqual(api._cache_snapshot()["bytes"], size * 2)
+
+    def test_sweep_removes_expired_entries_without_reads(self) -> None:
+        api._set_cached("old", 200, {"v": 1})
+        api._cache["old"] = (time.time() - api._CACHE_TTL - 1, 200, {"v": 1})
+        with patch.object(api, "_CACHE_SWEEP_INTERVAL", 0):
+            api._set_cached("new", 200, {"v": 2})
+        self.assertEqual(list(api._cache), ["new"])
+        self.assertEqual(api._cache_snapshot()["bytes"], api._estimate_size({"v": 2}))
+
+    def test_replace_delete_and_purge_keep_byte_accounting_exact(self) -> None:
+        api._set_cached("a", 200, {"v": 1}, api._cache_policy("sjf.detail"), "http://upstream/a")
+        api._set_cached("a", 200, {"v": "otro"}, api._cache_policy("sjf.detail"), "http://upstream/a")
+        api._set_cached("b", 200, {"v": 2}, api._cache_policy("sjf.detail"), "http://upstream/b")
+        self.assertEqual(api._cache_bytes, api._estimate_size({"v": "otro"}) + api._estimate_size({"v": 2}))
+        api._cache_delete("a")
+        api._cache_purge(lambda origin: True)
+        self.assertEqual(api._cache_bytes, 0)
+        self.assertEqual((api._cache_sizes, api._cache_ttls, api._cache_origins), ({}, {}, {}))
+
+
+class DiskCacheTests(unittest.TestCase):
+    """Tests for the optional SQLite cache tier."""
+
+    def setUp(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        patcher = patch.object(api, "_CACHE_DISK_PATH", str(Path(tmp.name) / "cache.sqlite"))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self._reset_connection()
+        self.addCleanup(self._reset_connection)
+        _reset_cache()
+
+    def _reset_connection(self) -> None:
+        # Simula otro worker/proceso: nueva conexion y memoria vacia.
+        if api._disk_conn is not None:
+            api._disk_conn.close()
+        api._disk_conn = None
+
+    def test_entry_survives_restart_and_is_promoted_to_memory(self) -> None:
+        api._set_cached("k", 200, {"items": [1, 2]})
+        _reset_cache()
+        self._reset_connection()
+        disk_hits = api._cache_stats["diskHits"]
+        self.assertEqual(api._get_cached("k"), (200, {"items": [1, 2]}))
+        self.assertIn("k", api._cache)
+        self.assertEqual(api._cache_stats["diskHits"], disk_hits + 1)
+
+    def test_disk_tier_respects_ttl(self) -> None:
+        api._set_cached("k", 200, {"v": 1})
+        _reset_cache()
+        with patch.object(api, "_CACHE_TTL", -1):
+            self.assertIsNone(api._get_cached("k"))
+
+
+class StaleCacheTests(unittest.TestCase):
+    """Tests for stale-while-revalidate and stale-if-error cache serving."""
+
+    URL = "http://upstream/search"
+
+    def setUp(self) -> None:
+        _reset_cache()
+        api._breakers.clear()
+        self.key = api._cache_key(self.URL, "GET", None)
+        api._cache[self.key] = (time.time() - api._CACHE_TTL - 5, 200, {"v": "old"})
+
+    def test_stale_entry_is_served_and_refreshed_in_background(self) -> None:
+        client = _client(200, {"v": "new"})
+        with patch.object(api, "_CACHE_STALE_WHILE_REVALIDATE", 60), patch.object(
+            api, "_get_async_http_client", lambda upstream: client
+        ):
+            self.assertEqual(api._run_sync(api._http_json_async(self.URL, use_cache=True)), (200, {"v": "old"}))
+            deadline = time.time() + 2
+            while api._cache[self.key][2] != {"v": "new"} and time.time() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(api._run_sync(api._http_json_async(self.URL, use_cache=True)), (200, {"v": "new"}))
+        self.assertEqual(api._refreshing, set())
+
+    def test_stale_entry_is_served_when_upstream_fails(self) -> None:
+        client = _client(500, {"error": "boom"})
+        with patch.object(api, "_CACHE_STALE_IF_ERROR", 60), patch.object(api, "_get_async_http_client", lambda upstream: client):
+            self.assertEqual(api._run_sync(api._http_json_async(self.URL, use_cache=True)), (200, {"v": "old"}))
+        with patch.object(api, "_get_async_http_client", lambda upstream: client):
+            self.assertEqual(api._run_sync(api._http_json_async(self.URL, use_cache=True))[0], 500)
+
+    def test_route_flags_stale_if_error_in_headers(self) -> None:
+        url = f"{api.BJ_SCJN_BASE}/documento/legislacion/42"
+        key = api._cache_key(url, "GET", None)
+        api._cache[key] = (time.time() - api._CACHE_TTL - 5, 200, {"titulo": "Ley vieja"})
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(503, json={"error": "down"})
+
+        client = _client(handler=handler)
+        with patch.object(api, "_CACHE_STALE_IF_ERROR", 60), patch.object(
+            api, "_get_async_http_client", lambda upstream: client
+        ):
+            response = TestClient(api.app).get("/scjn/legislacion/detalle", params={"id": 42})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers.get("x-cache"), "STALE-IF-ERROR")
+        self.assertGreaterEqual(int(response.headers.get("age")), api._CACHE_TTL)
+
+
+class CachePolicyTests(unittest.TestCase):
+    """Tests for the per-endpoint cache policy table."""
+
+    def setUp(self) -> None:
+        _reset_cache()
+        api._breakers.clear()
+        self.calls = []
+
+    def test_detail_policy_outlives_default_ttl(self) -> None:
+        url = f"{api.SJF_BASE}/tesis/2030687"
+        with patch.object(api, "_get_async_http_client", lambda upstream: _client(200, {"rubro": "tesis"}, calls=self.calls)):
+            api._run_sync(api._http_json_async(url, cache_policy="sjf.detail"))
+        key = api._cache_key(url, "GET", None)
+        ts, status, data = api._cache[key]
+        api._cache[key] = (ts - api._CACHE_TTL - 60, status, data)
+        self.assertEqual(api._get_cached(key), (200, {"rubro": "tesis"}))
+
+    def test_not_found_is_negatively_cached_only_with_policy(self) -> None:
+        client = _client(404, {"error": "no existe"}, calls=self.calls)
+        with patch.object(api, "_get_async_http_client", lambda upstream: client):
+            for _ in range(2):
+                self.assertEqual(api._run_sync(api._http_json_async(f"{api.SJF_BASE}/tesis/1", cache_policy="sjf.detail"))[0], 404)
+            for _ in range(2):
+                api._run_sync(api._http_json_async(f"{api.SJF_BASE}/tesis?page=0", "POST", {"q": "x"}, cache_policy="sjf.search"))
+        self.assertEqual(len(self.calls), 3)
+
+    def test_disabled_policy_and_entry_size_limit(self) -> None:
+        policies = {
+            **api._CACHE_POLICIES,
+            "off": {"cache": False, "ttl": None, "negativeTtl": 0, "maxBytes": None},
+            "tiny": {"cache": True, "ttl": None, "negativeTtl": 0, "maxBytes": 10},
+        }
+        client = _client(200, {"texto": "x" * 50}, calls=self.calls)
+        with patch.object(api, "_CACHE_POLICIES", policies), patch.object(api, "_get_async_http_client", lambda upstream: client):
+            api._run_sync(api._http_json_async("http://upstream/a", cache_policy="off"))
+            api._run_sync(api._http_json_async("http://upstream/b", cache_policy="tiny"))
+        self.assertEqual(len(api._cache), 0)
+
+    def test_cache_policies_env_overrides_fields(self) -> None:
+        policies = {name: dict(policy) for name, policy in api._CACHE_POLICIES.items()}
+        with patch.object(api, "_CACHE_POLICIES", policies), patch.dict(
+            "os.environ", {"CACHE_POLICIES": '{"sjf.detail": {"ttl": 60}, "nueva": {"ttl": 5}}'}
+        ):
+            api._load_cache_policies()
+            self.assertEqual(api._cache_policy("sjf.detail")["ttl"], 60)
+            self.assertEqual(api._cache_policy("sjf.detail")["negativeTtl"], 3600)
+            self.assertEqual(api._cache_policy("nueva")["ttl"], 5)
+
+
+class ResponseCacheTests(unittest.TestCase):
+    """Tests for caching normalized route responses."""
+
+    SJF_BODY = {"documents": [{"ius": 2030687, "rubro": "<b>amparo</b>", "semanal": 1}], "total": 1, "totalPages": 1}
+
+    def setUp(self) -> None:
+        _reset_cache()
+        api._breakers.clear()
+
+    def test_hit_skips_normalization(self) -> None:
+        client = _client(200, self.SJF_BODY)
+        with patch.object(api, "_get_async_http_client", lambda upstream: client), patch.object(
+            api, "_normalize_doc", wraps=api._normalize_doc
+        ) as normalize:
+            first = api.sjf_search(q="amparo", page=0, size=10, includeRaw=False)
+            second = api.sjf_search(q="amparo", page=0, size=10, includeRaw=False)
+            api.sjf_search(q="amparo", page=0, size=10, includeRaw=True)
+        self.assertEqual(first, second)
+        self.assertEqual(first["items"][0]["rubro"], "AMPARO")
+        self.assertEqual(normalize.call_count, 2)
+
+    def test_responses_built_from_stale_data_are_not_stored(self) -> None:
+        url = f"{api.BJ_SCJN_BASE}/documento/legislacion/7"
+        api._cache[api._cache_key(url, "GET", None)] = (time.time() - 10 * 86400, 200, {"titulo": "Ley"})
+        client = _client(500, {})
+        with patch.object(api, "_CACHE_STALE_IF_ERROR", 30 * 86400), patch.object(
+            api, "_get_async_http_client", lambda upstream: client
+        ):
+            detail = api._run_sync(api._legislacion_detalle_core_async(7, False))
+        self.assertIsInstance(detail, dict)
+        self.assertIsNone(api._get_cached(api._response_cache_key("bj.legislacion", [7, False])))
+
+    def test_debug_detail_is_not_cached(self) -> None:
+        client = _client(200, {"rubro": "tesis", "texto": "t"})
+        with patch.object(api, "_get_async_http_client", lambda upstream: client):
+            api.sjf_detail(ius=5, isSemanal=True, hostName="h", includeRaw=False, debug=True)
+        key = api._response_cache_key("sjf.detail", [5, "h", True, False])
+        self.assertIsNone(api._get_cached(key))
+
+
+class CacheAdminTests(unittest.TestCase):
+    """Tests for the token-protected cache administration API."""
+
+    HEADERS = {"Authorization": "Bearer secreto"}
+
+    def setUp(self) -> None:
+        _reset_cache()
+        api._breakers.clear()
+        api._cache_route_stats.clear()
+        api._cache_upstream_stats.clear()
+        patcher = patch.object(api, "_CACHE_ADMIN_TOKEN", "secreto")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = TestClient(api.app)
+
+    def _fill(self) -> None:
+        for url, route in (
+            (f"{api.SJF_BASE}/detalle/1", "sjf.detail"),
+            (f"{api.BJ_SCJN_BASE}/documento/legislacion/7", "bj.legislacion"),
+        ):
+            api._set_cached(api._cache_key(url, "GET", None), 200, {"url": url}, api._cache_policy(route), url)
+        source = api._cache_key(f"{api.BJ_SCJN_BASE}/documento/legislacion/7", "GET", None)
+        api._set_cached(
+            api._response_cache_key("bj.legislacion", [7, False]),
+            200,
+            {"id": 7},
+            api._cache_policy("bj.legislacion"),
+            api._response_origin_url("bj.legislacion", {source}),
+        )
+
+    def test_requires_configured_token(self) -> None:
+        self.assertEqual(self.client.get("/admin/cache/stats").status_code, 401)
+        self.assertEqual(self.client.get("/admin/cache/stats", headers={"X-Admin-Token": "otro"}).status_code, 401)
+        self.assertEqual(self.client.get("/admin/cache/stats", headers={"X-Admin-Token": "secreto"}).status_code, 200)
+        with patch.object(api, "_CACHE_ADMIN_TOKEN", ""):
+            self.assertEqual(self.client.get("/admin/cache/stats", headers=self.HEADERS).status_code, 404)
+
+    def test_stats_group_entries_by_route_and_upstream(self) -> None:
+        self._fill()
+        body = self.client.get("/admin/cache/stats", headers=self.HEADERS).json()
+        self.assertEqual(body["cache"]["entries"], 3)
+        self.assertEqual(body["byRoute"]["bj.legislacion"]["entries"], 2)
+        self.assertEqual(body["byUpstream"]["sjf"]["entries"], 1)
+        self.assertEqual(body["byUpstream"]["response"]["stores"], 1)
+        self.assertGreater(body["byUpstream"]["bj_scjn"]["bytes"], 0)
+
+    def test_purge_by_upstream_invalidates_dependent_responses(self) -> None:
+        self._fill()
+        response = self.client.post("/admin/cache/purge", headers=self.HEADERS, json={"upstream": "bj_scjn"})
+        self.assertEqual(response.json()["removed"]["memory"], 2)
+        keys = self.client.get("/admin/cache/keys", headers=self.HEADERS).json()["keys"]
+        self.assertEqual([entry["route"] for entry in keys], ["sjf.detail"])
+        self.assertEqual(self.client.post("/admin/cache/purge", headers=self.HEADERS, json={}).status_code, 400)
+
+    def test_purge_only_invalidates_responses_built_from_purged_keys(self) -> None:
+        def handler(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(200, json={"titulo": request.url.path})
+
+        client = _client(handler=handler)
+        with patch.object(api, "_get_async_http_client", lambda upstream: client):
+            for documento_id in (7, 8):
+                api.scjn_legislacion_detalle(id=documento_id, includeRaw=False)
+        response_keys = [api._response_cache_key("bj.legislacion", [documento_id, False]) for documento_id in (7, 8)]
+        source = api._cache_key(f"{api.BJ_SCJN_BASE}/documento/legislacion/7", "GET", None)
+        self.assertIn(source, api._cache_origins[response_keys[0]][1])
+
+        removed = api._cache_purge(api._cache_origin_matcher(prefix=f"{api.BJ_SCJN_BASE}/documento/legislacion/7"))
+        self.assertEqual(removed["memory"], 2)
+        self.assertNotIn(response_keys[0], api._cache)
+        self.assertIn(response_keys[1], api._cache)
+
+    def test_purge_by_prefix_and_delete_key(self) -> None:
+        self._fill()
+        self.client.post("/admin/cache/purge", headers=self.HEADERS, json={"prefix": f"{api.SJF_BASE}/detalle/"})
+        self.assertEqual(len(api._cache), 2)
+        key = api._response_cache_key("bj.legislacion", [7, False])
+        self.assertEqual(self.client.delete(f"/admin/cache/keys/{key}", headers=self.HEADERS).status_code, 200)
+        self.assertEqual(self.client.delete(f"/admin/cache/keys/{key}", headers=self.HEADERS).status_code, 404)
+        self.assertNotIn(key, api._cache)
+
+
+class CacheWarmerTests(unittest.TestCase):
+    """Tests for startup cache pre-warming."""
+
+    def setUp(self) -> None:
+        _reset_cache()
+        api._breakers.clear()
+        api._warm_queries.clear()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+        for name, value in (
+            ("_CACHE_WARM_SEED_PATH", str(self.dir / "seed.json")),
+            ("_CACHE_WARM_LOG_PATH", str(self.dir / "log.json")),
+            ("_CACHE_WARM_RATE", 0),
+        ):
+            patcher = patch.object(api, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_seed_entries_fill_the_response_cache(self) -> None:
+        (self.dir / "seed.json").write_text(
+            json.dumps(
+                [
+                    {"kind": "bj.legislacion", "args": {"documento_id": 7, "include_raw": False}},
+                    {"kind": "sjf.search", "args": {"q": "amparo"}},
+                    {"kind": "desconocido", "args": []},
+                ]
+            ),
+            encoding="utf-8",
+        )
+        client = _client(200, {"documents": []})
+        done = api._warm_stats["warmed"] + api._warm_stats["failed"]
+
+        async def run() -> None:
+            self.assertEqual(api._start_cache_warmer(), 2)
+            loop = asyncio.get_running_loop()
+            await asyncio.gather(*(task for task in list(api._background_tasks) if task.get_loop() is loop))
+
+        with patch.object(api, "_get_async_http_client", lambda upstream: client):
+            asyncio.run(run())
+        self.assertEqual(api._warm_stats["warmed"] + api._warm_stats["failed"], done + 2)
+        self.assertIsNotNone(api._get_cached(api._response_cache_key("bj.legislacion", [7, False])))
+        sjf_key = api._response_cache_key("sjf.search", [api._default_sjf_payload("amparo"), 0, 10, False])
+        self.assertIsNotNone(api._get_cached(sjf_key))
+        self.assertEqual(api._warm_queries, {})
+
+    def test_query_log_keeps_top_queries_with_decay(self) -> None:
+        for _ in range(4):
+            api._record_warm_query("bj.legislacion", [7, False])
+        api._record_warm_query("bj.legislacion", [8, False])
+        with patch.object(api, "_CACHE_WARM_TOP_N", 1):
+            api._save_warm_log()
+            self.assertEqual([path.name for path in self.dir.iterdir()], ["log.json"])
+            api._warm_queries.clear()
+            entries = api._warm_entries()
+        self.assertEqual(entries, [("bj.legislacion", [7, False])])
+        self.assertEqual(list(api._warm_queries.values()), [2])
+
+
+class CacheSnapshotTests(unittest.TestCase):
+    """Tests for portable cache snapshots."""
+
+    def setUp(self) -> None:
+        _reset_cache()
+        api._sjf_plan_by_ius.clear()
+        api._sjf_plan_buckets.clear()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / "cache.snapshot"
+        self.addCleanup(self._unload)
+
+    def _unload(self) -> None:
+        api._snapshot_index.clear()
+        if api._snapshot_map is not None:
+            api._snapshot_map.close()
+        api._snapshot_map = None
+
+    def test_snapshot_restores_entries_lazily_and_plans(self) -> None:
+        url = f"{api.BJ_SCJN_BASE}/documento/legislacion/7"
+        key = api._cache_key(url, "GET", None)
+        api._set_cached(key, 200, {"titulo": "Constitución"}, api._cache_policy("bj.legislacion"), url)
+        api._cache["vencida"] = (time.time() - 10 * 86400, 200, {"v": 1})
+        api._remember_sjf_plan(2030687, (False, True))
+        self.path.write_bytes(api._build_cache_snapshot())
+        _reset_cache()
+        api._sjf_plan_by_ius.clear()
+        api._sjf_plan_buckets.clear()
+
+        self.assertEqual(api._load_cache_snapshot(str(self.path)), 1)
+        self.assertEqual(api._cache, {})
+        self.assertEqual(api._sjf_plan_for(2030687), ((False, True), "ius"))
+        hits = api._cache_stats["snapshotHits"]
+        self.assertEqual(api._get_cached(key), (200, {"titulo": "Constitución"}))
+        self.assertEqual(api._cache_stats["snapshotHits"], hits + 1)
+        self.assertEqual(api._cache_origins[key], ("bj.legislacion", url))
+        self.assertEqual(api._snapshot_index, {})
+
+    def test_invalid_snapshot_is_ignored(self) -> None:
+        self.path.write_bytes(b"not a snapshot")
+        self.assertEqual(api._load_cache_snapshot(str(self.path)), 0)
+        self.assertIsNone(api._snapshot_map)
+
+
+class CacheCompressionTests(unittest.TestCase):
+    """Tests for transparent compression of large cache values."""
+
+    DOC = {"titulo": "Ley", "texto": "<p>Artículo 1. Texto repetido de la ley.</p>" * 200}
+
+    def setUp(self) -> None:
+        _reset_cache()
+        patcher = patch.object(api, "_CACHE_COMPRESS_MIN_BYTES", 1024)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_large_values_are_stored_compressed(self) -> None:
+        api._set_cached("grande", 200, self.DOC)
+        api._set_cached("chico", 200, {"v": 1})
+        self.assertIsInstance(api._cache["grande"][2], bytes)
+        self.assertEqual(api._cache["chico"][2], {"v": 1})
+        self.assertLess(api._cache_sizes["grande"], api._estimate_size(self.DOC) // 4)
+        decompressions = api._compression_stats["decompressions"]
+        self.assertEqual(api._get_cached("grande"), (200, self.DOC))
+        self.assertEqual(api._compression_stats["decompressions"], decompressions + 1)
+        compression = api._cache_snapshot()["compression"]
+        self.assertEqual(compression["entries"], 1)
+        self.assertGreater(compression["savedBytes"], 0)
+
+    def test_value_is_serialized_once_for_size_compression_and_second_tier(self) -> None:
+        redis = FakeRedis()
+        with patch.object(api, "_CACHE_BACKEND", "redis"), patch.object(api, "_redis_client", redis), patch.object(
+            api, "_redis_cache_state", {"retryAt": 0.0}
+        ), patch.object(api.json, "dumps", wraps=json.dumps) as dumps:
+            api._set_cached("grande", 200, self.DOC)
+        serialized = [call for call in dumps.call_args_list if call.args[0] is self.DOC]
+        self.assertEqual(len(serialized), 1)
+        _reset_cache()
+        with patch.object(api, "_CACHE_BACKEND", "redis"), patch.object(api, "_redis_client", redis), patch.object(
+            api, "_redis_cache_state", {"retryAt": 0.0}
+        ):
+            self.assertEqual(api._get_cached("grande"), (200, self.DOC))
+
+    def test_compressed_values_round_trip_through_snapshots(self) -> None:
+        api._set_cached("grande", 200, self.DOC)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "cache.snapshot"
+            path.write_bytes(api._build_cache_snapshot())
+            _reset_cache()
+            try:
+                api._load_cache_snapshot(str(path))
+                self.assertEqual(api._get_cached("grande"), (200, self.DOC))
+            finally:
+                api._snapshot_index.clear()
+                api._snapshot_map.close()
+                api._snapshot_map = None
+
+
+class RefreshAheadTests(unittest.TestCase):
+    """Tests for refreshing popular cache entries before they expire."""
+
+    URL = "https://sjf2.scjn.gob.mx/refresh-ahead"
+
+    def setUp(self) -> None:
+        _reset_cache()
+        api._breakers.clear()
+        self.calls = []
+        for name, value in (
+            ("_CACHE_REFRESH_AHEAD_HITS", 2),
+            ("_CACHE_REFRESH_AHEAD_FRACTION", 0.5),
+            ("_CACHE_REFRESH_AHEAD_RATE", 100.0),
+            ("_CACHE_TTL", 300),
+        ):
+            patcher = patch.object(api, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.key = api._cache_key(self.URL, "GET", None)
+
+    def _get(self):
+        return api._run_sync(api._http_json_async(self.URL, cache_policy="sjf.search"))
+
+    def test_hot_entry_is_refreshed_before_expiry(self) -> None:
+        api._set_cached(self.key, 200, {"v": "viejo"}, api._cache_policy("sjf.search"), self.URL)
+        api._cache[self.key] = (time.time() - 200, 200, {"v": "viejo"})
+        client = _client(200, {"v": "nuevo"}, calls=self.calls)
+        with patch.object(api, "_get_async_http_client", lambda upstream: client):
+            self.assertEqual(self._get(), (200, {"v": "viejo"}))
+            self.assertEqual(self._get(), (200, {"v": "viejo"}))
+            deadline = time.time() + 5
+            while (not self.calls or self.key in api._refreshing) and time.time() < deadline:
+                time.sleep(0.01)
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(api._get_cached(self.key), (200, {"v": "nuevo"}))
+        self.assertEqual(api._cache_access.get(self.key, 0), 0)
+
+    def test_cold_or_young_entries_are_not_refreshed(self) -> None:
+        api._set_cached(self.key, 200, {"v": "viejo"}, api._cache_policy("sjf.search"), self.URL)
+        client = _client(200, {"v": "nuevo"}, calls=self.calls)
+        with patch.object(api, "_get_async_http_client", lambda upstream: client):
+            for _ in range(3):
+                self._get()
+        self.assertEqual(self.calls, [])
+        self.assertEqual(api._cache_access[self.key], 3)
+
+    def test_refresh_budget_throttles(self) -> None:
+        api._cache[self.key] = (time.time() - 200, 200, {"v": "viejo"})
+        api._cache_access[self.key] = 5
+        api._refresh_ahead_budget.update(tokens=0.0, updated=time.monotonic())
+        throttled = api._cache_stats["refreshAheadThrottled"]
+        with patch.object(api, "_CACHE_REFRESH_AHEAD_RATE", 0.001):
+            self.assertFalse(api._refresh_ahead_due(self.key, (200.0, 300, 200, {})))
+        self.assertEqual(api._cache_stats["refreshAheadThrottled"], throttled + 1)
+
+
+class FakeRedis:
+    """In-process stand-in for the subset of redis-py used by the Redis cache backend."""
+
+    def __init__(self) -> None:
+        self.store: dict[str, tuple[bytes, float]] = {}
+        self.hashes: dict[str, tuple[float, float]] = {}
+        self.fields: dict[str, dict[str, str]] = {}
+        self.zsets: dict[str, dict[str, float]] = {}
+        self.expires: dict[str, float] = {}
+
+    def get(self, name: str):
+        value = self.store.get(name)
+        if value is None or value[1] < time.time():
+            self.store.pop(name, None)
+            return None
+        return value[0]
+
+    def set(self, name: str, value: bytes, ex: int) -> bool:
+        self.store[name] = (value, time.time() + ex)
+        return True
+
+    def delete(self, *names: str) -> int:
+        return sum(self.store.pop(name, None) is not None for name in names)
+
+    def scan_iter(self, match: str):
+        return [name for name in [*self.store, *self.fields, *self.zsets] if fnmatch.fnmatch(name, match)]
+
+    def hset(self, name: str, key: str, value: str) -> int:
+        self.fields.setdefault(name, {})[key] = value
+        return 1
+
+    def hgetall(self, name: str) -> dict[str, str]:
+        return dict(self.fields.get(name, {}))
+
+    def hdel(self, name: str, *keys: str) -> int:
+        fields = self.fields.get(name, {})
+        return sum(fields.pop(key, None) is not None for key in keys)
+
+    def zadd(self, name: str, mapping: dict[str, float]) -> int:
+        zset = self.zsets.setdefault(name, {})
+        added = sum(member not in zset for member in mapping)
+        zset.update(mapping)
+        return added
+
+    def zrangebyscore(self, name: str, low, high, start: int = 0, num: int | None = None) -> list[bytes]:
+        low, high = float(low), float(high)
+        members = sorted((score, member) for member, score in self.zsets.get(name, {}).items() if low <= score <= high)
+        members = members[start:] if num is None else members[start : start + num]
+        return [member.encode() for _, member in members]
+
+    def zrem(self, name: str, *members: str) -> int:
+        zset = self.zsets.get(name, {})
+        return sum(zset.pop(member, None) is not None for member in members)
+
+    def expire(self, name: str, seconds: int, nx: bool = False, gt: bool = False) -> bool:
+        current = self.expires.get(name)
+        if (nx and current is not None) or (gt and (current is None or time.time() + seconds <= current)):
+            return False
+        self.expires[name] = time.time() + seconds
+        return True
+
+    def pipeline(self):
+        redis = self
+
+        class Pipeline:
+            def __init__(self) -> None:
+                self.calls = []
+
+            def __getattr__(self, name):
+                return lambda *args, **kwargs: self.calls.append((getattr(redis, name), args, kwargs))
+
+            def execute(self):
+                return [call(*args, **kwargs) for call, args, kwargs in self.calls]
+
+        return Pipeline()
+
+    def eval(self, script: str, numkeys: int, key: str, capacity, rate, now, cost):
+        # Reproduce en Python el token bucket del script Lua del limitador.
+        state = self.hashes.get(key)
+        allowed, tokens, _ = api._token_bucket(state and state[0], state[1] if state else now, now, cost)
+        self.hashes[key] = (tokens, now)
+        return [int(allowed), str(tokens).encode()]
+
+
+class RedisCacheBackendTests(unittest.TestCase):
+    """Tests for the shared Redis-protocol cache backend."""
+
+    def setUp(self) -> None:
+        _reset_cache()
+        self.redis = FakeRedis()
+        for name, value in (
+            ("_CACHE_BACKEND", "redis"),
+            ("_redis_client", self.redis),
+            ("_redis_cache_state", {"retryAt": 0.0}),
+        ):
+            patcher = patch.object(api, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_replicas_share_entries(self) -> None:
+        url = f"{api.BJ_SCJN_BASE}/documento/legislacion/7"
+        key = api._cache_key(url, "GET", None)
+        api._set_cached(key, 200, {"titulo": "Ley"}, api._cache_policy("bj.legislacion"), url)
+        self.assertEqual(len(self.redis.store), 1)
+        _reset_cache()  # otra replica: memoria vacia, mismo Redis
+        disk_hits = api._cache_stats["diskHits"]
+        self.assertEqual(api._get_cached(key), (200, {"titulo": "Ley"}))
+        self.assertEqual(api._cache_stats["diskHits"], disk_hits + 1)
+        self.assertEqual(api._cache_origins[key], ("bj.legislacion", url))
+        self.assertEqual(api._cache_snapshot()["backend"], "redis")
+
+    def test_purge_and_delete_reach_redis(self) -> None:
+        for ius in (1, 2):
+            url = f"{api.SJF_BASE}/detalle/{ius}"
+            api._set_cached(api._cache_key(url, "GET", None), 200, {"ius": ius}, api._cache_policy("sjf.detail"), url)
+        removed = api._cache_purge(api._cache_origin_matcher(prefix=f"{api.SJF_BASE}/detalle/1"))
+        self.assertEqual(removed, {"memory": 1, "disk": 1})
+        key = api._cache_key(f"{api.SJF_BASE}/detalle/2", "GET", None)
+        self.assertEqual(api._cache_delete(key), {"memory": 1, "disk": 1})
+        self.assertEqual(self.redis.store, {})
+
+    def test_purge_filters_on_origin_metadata_without_reading_values(self) -> None:
+        for ius in (1, 2):
+            url = f"{api.SJF_BASE}/detalle/{ius}"
+            api._set_cached(api._cache_key(url, "GET", None), 200, {"ius": ius}, api._cache_policy("sjf.detail"), url)
+        self.assertEqual(len(self.redis.fields["ordina:cache:origin:sjf.detail"]), 2)
+        _reset_cache()
+        with patch.object(self.redis, "get", side_effect=AssertionError("purge leyo un valor")):
+            removed = api._cache_purge(api._cache_origin_matcher(prefix=f"{api.SJF_BASE}/detalle/1"))
+        self.assertEqual(removed, {"memory": 0, "disk": 1})
+        self.assertEqual(list(self.redis.fields["ordina:cache:origin:sjf.detail"].values()), [f"{api.SJF_BASE}/detalle/2"])
+
+    def test_delete_and_expiry_prune_origin_fields(self) -> None:
+        origins, expiries = "ordina:cache:origin:sjf.detail", "ordina:cache:expiry:sjf.detail"
+        for ius in (1, 2, 3):
+            url = f"{api.SJF_BASE}/detalle/{ius}"
+            api._set_cached(api._cache_key(url, "GET", None), 200, {"ius": ius}, api._cache_policy("sjf.detail"), url)
+        first, second, third = (api._cache_key(f"{api.SJF_BASE}/detalle/{ius}", "GET", None) for ius in (1, 2, 3))
+        self.assertEqual(api._cache_delete(first), {"memory": 1, "disk": 1})
+        self.assertNotIn(first, self.redis.fields[origins])
+        self.assertNotIn(first, self.redis.zsets[expiries])
+
+        # La clave vencio en Redis sin que nadie la borrara: la siguiente escritura de la ruta la retira.
+        self.redis.zsets[expiries][second] = time.time() - 1
+        self.redis.store.pop("ordina:cache:" + second)
+        url = f"{api.SJF_BASE}/detalle/4"
+        api._set_cached(api._cache_key(url, "GET", None), 200, {"ius": 4}, api._cache_policy("sjf.detail"), url)
+        self.assertEqual(len(self.redis.fields[origins]), 2)
+        self.assertNotIn(second, self.redis.fields[origins])
+        self.assertEqual(set(self.redis.zsets[expiries]), set(self.redis.fields[origins]))
+        self.assertIn(third, self.redis.fields[origins])
+
+    def test_unreachable_redis_degrades_to_memory(self) -> None:
+        class DownRedis(FakeRedis):
+            def get(self, name):
+                raise ConnectionError("down")
+
+            def set(self, name, value, ex):
+                raise ConnectionError("down")
+
+        broken = DownRedis()
+        errors = api._cache_stats["diskErrors"]
+        with patch.object(api, "_redis_client", broken):
+            api._set_cached("k", 200, {"v": 1})
+            _reset_cache()
+            self.assertIsNone(api._get_cached("k"))
+        self.assertEqual(api._cache_stats["diskErrors"], errors + 1)
+
+    def test_failed_redis_is_skipped_until_retry(self) -> None:
+        calls = []
+
+        class DownRedis(FakeRedis):
+            def get(self, name):
+                calls.append(name)
+                raise ConnectionError("down")
+
+        with patch.object(api, "_redis_client", DownRedis()), patch.object(api, "_CACHE_REDIS_RETRY", 30):
+            for _ in range(3):
+                self.assertIsNone(api._get_cached("k"))
+            self.assertEqual(len(calls), 1)
+            api._redis_cache_state["retryAt"] = time.monotonic() - 1
+            self.assertIsNone(api._get_cached("k"))
+        self.assertEqual(len(calls), 2)
+
+    def test_async_paths_keep_redis_io_off_the_event_loop(self) -> None:
+        threads = []
+
+        class ThreadRecordingRedis(FakeRedis):
+            def get(self, name):
+                threads.append(threading.current_thread())
+                return super().get(name)
+
+            def set(self, name, value, ex):
+                threads.append(threading.current_thread())
+                return super().set(name, value, ex)
+
+        redis = ThreadRecordingRedis()
+
+        async def run():
+            api._set_cached("k", 200, {"v": 1})
+            while not redis.store:  # la escritura es fire-and-forget
+                await asyncio.sleep(0.01)
+            _reset_cache()
+            cached = await api._get_cached_async("k")
+            return threading.current_thread(), cached
+
+        with patch.object(api, "_redis_client", redis):
+            loop_thread, cached = asyncio.run(run())
+        self.assertEqual(cached, (200, {"v": 1}))
+        self.assertEqual(len(threads), 2)
+        self.assertNotIn(loop_thread, threads)
+
+
+class CanonicalCacheKeyTests(unittest.TestCase):
+    """Tests for canonicalized search cache keys."""
+
+    def setUp(self) -> None:
+        _reset_cache()
+        api._breakers.clear()
+        self.calls = []
+
+    def test_sjf_search_terms_share_one_entry(self) -> None:
+        client = _client(200, {"documents": [], "total": 0, "totalPages": 0}, calls=self.calls)
+        hits = api._cache_stats["canonicalHits"]
+        with patch.object(api, "_get_async_http_client", lambda upstream: client):
+            for q in ("Amparo  Indirecto", "amparo indirecto ", "AMPARO INDIRECTO"):
+                api._run_sync(api._http_json_async(**api._sjf_search_request(api._default_sjf_payload(q), 0, 10)))
+        self.assertEqual(len(self.calls), 1)
+        self.assertIn("Amparo  Indirecto", self.calls[0].content.decode("utf-8"))
+        self.assertEqual(api._cache_stats["canonicalHits"], hits + 2)
+
+    def test_operators_accents_and_filters(self) -> None:
+        policy = api._cache_policy("bj.search")
+        filtros = {"ambito": ["Federal", "Local"]}
+        base = api._build_bj_legislacion_payload("amparo Y suspensión", 1, 10, filtros=filtros)
+        same = {**base, "q": "Amparo Y  suspensión", "filtros": {"ambito": ["Local", "Federal", "Local"]}}
+        other = {**base, "q": "amparo y suspensión"}
+        key = api._request_cache_key("u", "POST", base, policy)[0]
+        self.assertEqual(api._request_cache_key("u", "POST", same, policy)[0], key)
+        self.assertNotEqual(api._request_cache_key("u", "POST", other, policy)[0], key)
+        self.assertNotEqual(api._request_cache_key("u", "POST", {**base, "q": "amparo Y suspension"}, policy)[0], key)
+        folded = {**policy, "foldAccents": True}
+        self.assertEqual(
+            api._request_cache_key("u", "POST", {**base, "q": "amparo Y suspension"}, folded)[0],
+            api._request_cache_key("u", "POST", base, folded)[0],
+        )
+
+    def test_tepjf_form_fields(self) -> None:
+        policy = api._cache_policy("tepjf.search")
+        first = api._request_cache_key("u", "POST", api._tepjf_form(and_terms="Nulidad de  Elección"), policy)
+        second = api._request_cache_key("u", "POST", api._tepjf_form(and_terms="nulidad de elección "), policy)
+        self.assertEqual(first[0], second[0])
+        detail_key = api._request_cache_key("u", "GET", None, api._cache_policy("sjf.detail"))
+        self.assertEqual(detail_key, (api._cache_key("u", "GET", None), None))
+
+
+class LeyesTokenIndexTests(unittest.TestCase):
+    """Tests for the inverted token index behind the law catalog search."""
+
+    CATALOG = [
+        {"id": 1, "categoria": 1, "nombre": "Código Civil Federal"},
+        {"id": 2, "categoria": 2, "nombre": "Ley de Amparo"},
+        {"id": 3, "categoria": 1, "nombre": "Código Civil para el Estado de Oaxaca"},
+        {"id": 4, "categoria": 1, "nombre": ""},
+    ]
+
+    def setUp(self) -> None:
+        patcher = patch.object(api, "leyes", list(self.CATALOG))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _ids(self, **kwargs) -> list[int]:
+        return [ley["id"] for ley in api._buscar_ley_core(**kwargs)]
+
+    def test_matches_accents_partial_tokens_and_catalog_order(self) -> None:
+        self.assertEqual(self._ids(nombre="codigo CIV"), [1, 3])
+        self.assertEqual(self._ids(nombre="oaxaca civil"), [3])
+        self.assertEqual(self._ids(nombre="amparo civil"), [])
+        self.assertEqual(self._ids(nombre="   "), [])
+
+    def test_filters_combine_with_name(self) -> None:
+        self.assertEqual(self._ids(nombre="civil", categoria=1, id=3), [3])
+        self.assertEqual(self._ids(categoria=1), [1, 3, 4])
+
+    def test_index_rebuilds_when_catalog_changes(self) -> None:
+        self.assertEqual(self._ids(nombre="fiscal"), [])
+        api.leyes.append({"id": 5, "categoria": 1, "nombre": "Código Fiscal de la Federación"})
+        self.assertEqual(self._ids(nombre="fiscal"), [5])
+
+    def test_every_catalog_structure_rebuilds_together(self) -> None:
+        api.leyes.append({"id": 5, "categoria": 1, "nombre": "Código Fiscal de la Federación"})
+        texto = api._normalize_text("Artículo 27 del Código Fiscal de la Federación")
+        self.assertEqual(api._leyes_contained_in(texto)["id"], 5)
+        self.assertEqual(api._leyes_containing("codigo fiscal")["id"], 5)
+        self.assertEqual(api._leyes_similares("Codigo Fiscal de la Federacoin")[0][1]["id"], 5)
+        self.assertEqual(api._resolve_ley_reference("Código Fiscal de la Federación")["id"], 5)
+        catalog = api._leyes_catalog()
+        self.assertIs(catalog["source"], api.leyes)
+        self.assertEqual(len(catalog["index"]), 4)
+
+
+class LeyesAutomatonTests(unittest.TestCase):
+    """Tests for the catalog name automaton used by law reference resolution."""
+
+    def test_contained_names_match_linear_scan(self) -> None:
+        texto = api._normalize_text(
+            "Artículo 5 de la Ley Federal del Trabajo, en relación con la Ley de Amparo y el Código Civil Federal"
+        )
+        expected = next(c for c in api._leyes_catalog()["index"] if c["nombreNormalizado"] in texto)
+        self.assertIs(api._leyes_contained_in(texto), expected)
+        self.assertIsNone(api._leyes_contained_in("zzz qqq"))
+
+    def test_containing_name_prefers_shortest_then_catalog_order(self) -> None:
+        for fragmento in ("ley de amparo", "codigo civil", "federal del trabajo", "oaxaca"):
+            matches = [c for c in api._leyes_catalog()["index"] if fragmento in c["nombreNormalizado"]]
+            expected = min(matches, key=lambda item: len(item["nombreNormalizado"])) if matches else None
+            self.assertIs(api._leyes_containing(fragmento), expected, fragmento)
+
+    def test_resolve_ley_reference_uses_exact_name_first(self) -> None:
+        ley = api._resolve_ley_reference("LEY DE AMPARO, REGLAMENTARIA DE LOS ARTÍCULOS 103 Y 107 DE LA CONSTITUCIÓN POLÍTICA DE LOS ESTADOS UNIDOS MEXICANOS")
+        self.assertIsNotNone(ley)
+        self.assertTrue(ley["nombreNormalizado"].startswith("ley de amparo"))
+        self.assertEqual(
+            api._resolve_constitucion_reference()["nombreNormalizado"],
+            "constitucion politica de los estados unidos mexicanos",
+        )
+
+
+class LawScoringTests(unittest.TestCase):
+    """Tests that bitset and top-k law scoring rank exactly like the linear versions."""
+
+    QUERIES = [
+        "ley federal del trabajo reformada",
+        "codigo civil estado oaxaca",
+        "reglamento ley general salud materia",
+        "ley organica poder judicial",
+        "constitucion estados unidos",
+        "zzzz qqqq wwww",
+    ]
+
+    def test_token_overlap_matches_linear_scan(self) -> None:
+        for query in self.QUERIES:
+            tokens = [token for token in query.split(" ") if len(token) > 2]
+            scores = [sum(1 for token in tokens if token in c["nombreNormalizado"]) for c in api._leyes_catalog()["index"]]
+            best_score, best_bits = api._leyes_best_token_overlap(tokens)
+            self.assertEqual(best_score, max(scores), query)
+            expected = [position for position, score in enumerate(scores) if score == best_score] if best_score else []
+            self.assertEqual([p for p in range(len(api._leyes_catalog()["index"])) if best_bits >> p & 1], expected, query)
+
+    def test_rank_laws_top_k_matches_full_sort(self) -> None:
+        mcp_server._rank_laws_cache.clear()
+        self.addCleanup(mcp_server._rank_laws_cache.clear)
+        for query in self.QUERIES + ["ley de amparo", "codigo"]:
+            full = mcp_server._rank_laws(query, api.leyes)
+            self.assertEqual(mcp_server._rank_laws(query, api.leyes, 5), full[:5], query)
+
+
+class LeyTrigramTests(unittest.TestCase):
+    """Tests for the typo-tolerant trigram fallback over the law catalog."""
+
+    def test_misspelled_names_resolve_locally(self) -> None:
+        self.assertEqual(api._resolve_document_law_reference("Codigo Civil Federla")["nombre"], "Código Civil Federal")
+        ley = api._resolve_document_law_reference("Ley de Amparo reglamentaria de los articulos 103 y 107")
+        self.assertTrue(ley["nombreNormalizado"].startswith("ley de amparo, reglamentaria"))
+
+    def test_threshold_and_short_queries(self) -> None:
+        self.assertEqual(api._leyes_similares("la ley aplicable"), [])
+        self.assertEqual(api._leyes_similares("ley"), [])
+        with patch.object(api, "_LEY_TRIGRAM_THRESHOLD", 0.95):
+            self.assertIsNone(api._resolve_ley_trigram("Ley Federal del Trabjo"))
+        similitud, ley = api._leyes_similares("Ley Federal del Trabjo")[0]
+        self.assertEqual(ley["nombre"], "Ley Federal del Trabajo")
+        self.assertGreater(similitud, 0.8)
+
+    def test_normas_buscar_uses_trigram_fallback_before_sil(self) -> None:
+        with patch.object(api, "_LEY_TRIGRAM_SKIP_SIL", 1.0), patch.object(
+            api, "_legislacion_buscar_core_async", AsyncMock(return_value={"items": []})
+        ) as sil:
+            result = api._run_sync(api._normas_buscar_core_async("Ley Genral de Salud", 1, 10))
+        sil.assert_called_once()
+        self.assertEqual(result["jurislexCount"], 1)
+        self.assertEqual(result["items"][0]["nombre"], "Ley General de Salud")
+        self.assertEqual(result["items"][0]["rutaSugerida"], "jurislex")
+
+    def test_confident_trigram_match_skips_sil(self) -> None:
+        with patch.object(api, "_legislacion_buscar_core_async", AsyncMock(return_value={"items": []})) as sil:
+            result = api._run_sync(api._normas_buscar_core_async("Ley Genral de Salud", 1, 10))
+            api._run_sync(api._normas_buscar_core_async("Ley Genral de Salud", 1, 10, ambito="Federal"))
+        self.assertEqual(sil.call_count, 1)  # solo la busqueda con filtros del SIL
+        self.assertEqual(result["silCount"], 0)
+        self.assertEqual(result["items"][0]["nombre"], "Ley General de Salud")
+
+
+class AsyncTransportTests(unittest.TestCase):
+    """Tests for the asyncio upstream layer used by the FastAPI routes."""
+
+    SJF_BODY = {"documents": [{"ius": 2030687, "rubro": "<b>amparo</b>", "semanal": 1}], "total": 1, "totalPages": 1}
+
+    def setUp(self) -> None:
+        _reset_cache()
+        api._sjf_plan_by_ius.clear()
+        api._sjf_plan_buckets.clear()
+
+    def _run_with_async_handler(self, handler, coro_factory):
+        async def runner():
+            client = _client(handler=handler)
+            try:
+                with patch.object(api, "_get_async_http_client", lambda upstream: client):
+                    return await coro_factory()
+            finally:
+                await client.aclose()
+
+        return asyncio.run(runner())
+
+    def test_http_json_async_parses_and_caches(self) -> None:
+        calls = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            calls.append(request.url)
+            return httpx.Response(200, json={"ok": True})
+
+        async def twice():
+            first = await api._http_json_async("http://upstream/x", use_cache=True)
+            second = await api._http_json_async("http://upstream/x", use_cache=True)
+            return first, second
+
+        first, second = self._run_with_async_handler(handler, twice)
+        self.assertEqual(first, (200, {"ok": True}))
+        self.assertEqual(second, first)
+        self.assertEqual(len(calls), 1)
+
+    def test_http_json_async_maps_timeout_to_504(self) -> None:
+        def handler(request: httpx.Request) -> httpx.Response:
+            raise httpx.ReadTimeout("slow upstream", request=request)
+
+        status, data = self._run_with_async_handler(handler, lambda: api._http_json_async("http://upstream/slow"))
+        self.assertEqual(status, 504)
+        self.assertEqual(data["errorType"], "ReadTimeout")
+
+    def test_http_multipart_async_sends_form_fields(self) -> None:
+        bodies = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            bodies.append(request.read().decode("utf-8"))
+            return httpx.Response(200, json={"resultados": []})
+
+        status, _ = self._run_with_async_handler(
+            handler, lambda: api._http_multipart_async("http://upstream/tepjf", {"and": "amparo", "pagina": 1})
+        )
+        self.assertEqual(status, 200)
+        self.assertIn('name="and"', bodies[0])
+        self.assertIn("amparo", bodies[0])
+
+    def test_sync_wrapper_matches_async_core(self) -> None:
+        def handler(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(200, json=self.SJF_BODY)
+
+        client = _client(handler=handler)
+        with patch.object(api, "_get_async_http_client", lambda upstream: client):
+            expected = api.sjf_search(q="amparo", page=0, size=10, includeRaw=False)
+        _reset_cache()
+        result = self._run_with_async_handler(
+            handler, lambda: api._sjf_search_core_async(api._default_sjf_payload("amparo"), 0, 10, False)
+        )
+        self.assertEqual(result, expected)
+        self.assertEqual(result["items"][0]["rubro"], "AMPARO")
+
+    def test_sjf_detail_attempts_async_stops_at_first_success(self) -> None:
+        def handler(request: httpx.Request) -> httpx.Response:
+            if request.url.params.get("isSemanal") == "true":
+                return httpx.Response(404, json={"error": "not found"})
+            return httpx.Response(200, json={"rubro": "tesis", "texto": "texto"})
+
+        result, attempts = self._run_with_async_handler(
+            handler, lambda: api._sjf_detail_attempts_async(123, "https://sjf2.scjn.gob.mx", None)
+        )
+        self.assertEqual(result["status"], 200)
+        self.assertFalse(result["isSemanal"])
+        self.assertEqual(len(attempts), 2)
+
+    def test_sync_route_functions_remain_callable(self) -> None:
+        def handler(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(503, json={"error": "down"})
+
+        client = _client(handler=handler)
+        with patch.object(api, "_get_async_http_client", lambda upstream: client):
+            result = api.jurislex_detalle_articulo(categoria=1000, idLegislacion=1000, idArticulo=1, includeRaw=False)
+        self.assertIsInstance(result, JSONResponse)
+        self.assertEqual(result.status_code, 503)
+
+
+class UpstreamPoolTests(unittest.TestCase):
+    """Tests for the per-upstream connection pools."""
+
+    def test_upstream_for_url_maps_each_base_to_its_pool(self) -> None:
+        self.assertEqual(api._upstream_for_url(f"{api.SJF_BASE}/tesis/1"), "sjf")
+        self.assertEqual(api._upstream_for_url(f"{api.JURISLEX_BASE}/ObtenerArticulos/1"), "jurislex")
+        self.assertEqual(api._upstream_for_url(f"{api.BJ_SCJN_BASE}/busqueda"), "bj_scjn")
+        self.assertEqual(api._upstream_for_url(api.TEPJF_CONVERT_PDF), "tepjf")
+        self.assertEqual(api._upstream_for_url("http://otro.example/x"), "default")
+
+    def test_upstream_pool_config_reads_prefixed_env(self) -> None:
+        env = {"SJF_POOL_MAX_CONNECTIONS": "7", "SJF_POOL_MAX_KEEPALIVE": "30", "SJF_POOL_KEEPALIVE_EXPIRY": "2.5"}
+        with patch.dict("os.environ", env):
+            config = api._upstream_pool_config("SJF")
+        self.assertEqual(config["maxConnections"], 7)
+        self.assertEqual(config["maxKeepalive"], 7)
+        self.assertEqual(config["keepaliveExpiry"], 2.5)
+
+    def test_http2_is_disabled_when_h2_is_missing(self) -> None:
+        with patch.object(api, "_HTTP2_AVAILABLE", False), patch.dict("os.environ", {"TEPJF_HTTP2": "true"}):
+            self.assertFalse(api._upstream_pool_config("TEPJF")["http2"])
+
+    def test_pool_stats_track_requests_per_upstream(self) -> None:
+        client = _client(200, {})
+        before = api._pool_snapshot()["jurislex"]["requests"]
+        with patch.object(api, "_get_async_http_client", lambda upstream: client):
+            api._run_sync(api._http_json_async(f"{api.JURISLEX_BASE}/decrees/1"))
+        snapshot = api._pool_snapshot()["jurislex"]
+        self.assertEqual(snapshot["requests"], before + 1)
+        self.assertEqual(snapshot["inFlight"], 0)
+        self.assertGreaterEqual(snapshot["peakInFlight"], 1)
+
+
+class CircuitBreakerTests(unittest.TestCase):
+    """Tests for the per-upstream circuit breaker."""
+
+    def setUp(self) -> None:
+        api._breakers.clear()
+        self.addCleanup(api._breakers.clear)
+        self.calls = []
+
+    def test_breaker_opens_after_consecutive_failures_and_fails_fast(self) -> None:
+        client = _client(500, {"error": "boom"}, calls=self.calls)
+        with patch.object(api, "_BREAKER_FAILURE_THRESHOLD", 3), patch.object(api, "_get_async_http_client", lambda upstream: client):
+            for _ in range(3):
+                api._run_sync(api._http_json_async(f"{api.SJF_BASE}/tesis/1"))
+            status, data = api._run_sync(api._http_json_async(f"{api.SJF_BASE}/tesis/1"))
+        self.assertEqual(len(self.calls), 3)
+        self.assertEqual(status, 503)
+        self.assertEqual(data["upstream"], "sjf")
+        self.assertEqual(api._breaker_snapshot()["sjf"]["state"], "open")
+        self.assertEqual(api._breaker_snapshot()["jurislex"]["state"], "closed")
+
+    def test_client_errors_do_not_open_breaker(self) -> None:
+        client = _client(404, {"error": "boom"}, calls=self.calls)
+        with patch.object(api, "_BREAKER_FAILURE_THRESHOLD", 2), patch.object(api, "_get_async_http_client", lambda upstream: client):
+            for _ in range(3):
+                status, _ = api._run_sync(api._http_json_async(f"{api.SJF_BASE}/tesis/1"))
+        self.assertEqual(status, 404)
+        self.assertEqual(len(self.calls), 3)
+
+    def test_half_open_probe_closes_or_reopens_breaker(self) -> None:
+        api._breakers["jurislex"] = {**api._new_breaker(), "state": "open", "failures": 5, "openedAt": time.time() - 60}
+        with patch.object(api, "_get_async_http_client", lambda upstream: _client(500, {"error": "boom"}, calls=self.calls)):
+            status, _ = api._run_sync(api._http_json_async(f"{api.JURISLEX_BASE}/decrees/1"))
+        self.assertEqual(status, 500)
+        self.assertEqual(api._breakers["jurislex"]["state"], "open")
+
+        api._breakers["jurislex"]["openedAt"] = time.time() - 60
+        retry_after, probe = api._breaker_acquire("jurislex")
+        self.assertIsNone(retry_after)
+        self.assertIsNotNone(probe)
+        self.assertEqual(api._breaker_acquire("jurislex"), (1, None))
+        api._breaker_record("jurislex", True, probe)
+        self.assertEqual(api._breakers["jurislex"]["state"], "closed")
+
+    def test_only_the_probe_holder_changes_half_open_state(self) -> None:
+        api._breakers["jurislex"] = {**api._new_breaker(), "state": "open", "failures": 5, "openedAt": time.time() - 60}
+        _, probe = api._breaker_acquire("jurislex")
+        # Una peticion lanzada antes de abrirse el circuito termina durante la sonda.
+        api._breaker_record("jurislex", True)
+        api._breaker_record("jurislex", False)
+        self.assertEqual(api._breakers["jurislex"]["state"], "half_open")
+        self.assertTrue(api._breaker_snapshot()["jurislex"]["probeInFlight"])
+        api._breaker_record("jurislex", False, probe)
+        self.assertEqual(api._breakers["jurislex"]["state"], "open")
+        self.assertFalse(api._breaker_snapshot()["jurislex"]["probeInFlight"])
+
+    def test_in_flight_results_after_opening_do_not_change_state(self) -> None:
+        async def run() -> tuple[dict, dict]:
+            release = asyncio.Event()
+
+            async def handler(request: httpx.Request) -> httpx.Response:
+                if request.url.path.endswith("/lenta"):
+                    await release.wait()
+                    return httpx.Response(200 if "ok" in request.url.params else 500, json={})
+                return httpx.Response(500, json={"error": "boom"})
+
+            client = _client(handler=handler)
+            with patch.object(api, "_get_async_http_client", lambda upstream: client):
+                slow = [
+                    asyncio.ensure_future(api._http_json_async(f"{api.JURISLEX_BASE}/lenta?{flag}=1"))
+                    for flag in ("ok", "error")
+                ]
+                await asyncio.sleep(0.05)
+                for _ in range(api._BREAKER_FAILURE_THRESHOLD):
+                    await api._http_json_async(f"{api.JURISLEX_BASE}/decrees/1")
+                opened = dict(api._breakers["jurislex"])
+                release.set()
+                await asyncio.gather(*slow)
+            await client.aclose()
+            return opened, api._breakers["jurislex"]
+
+        opened, after = asyncio.run(run())
+        self.assertEqual(opened["state"], "open")
+        self.assertEqual(after["state"], "open")
+        self.assertEqual(after["openedAt"], opened["openedAt"])
+        self.assertEqual(after["failures"], opened["failures"])
+
+    def test_route_returns_retry_after_while_open(self) -> None:
+        api._breakers["jurislex"] = {**api._new_breaker(), "state": "open", "failures": 5, "openedAt": time.time()}
+        response = TestClient(api.app).get("/jurislex/decretos", params={"idLegislacion": 1})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers.get("retry-after"), str(int(api._BREAKER_RESET_SECONDS)))
+        self.assertEqual(response.headers.get_list("retry-after"), [str(int(api._BREAKER_RESET_SECONDS))])
+        self.assertEqual([m.cls for m in api.app.user_middleware if m.cls.__name__ == "BaseHTTPMiddleware"], [])
+
+
+class SingleFlightTests(unittest.TestCase):
+    """Tests for coalescing identical in-flight upstream calls."""
+
+    def setUp(self) -> None:
+        _reset_cache()
+        api._breakers.clear()
+
+    def test_concurrent_sync_calls_share_one_upstream_request(self) -> None:
+        calls = []
+        coalesced_before = api._single_flight_stats["coalesced"]
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            calls.append(request.url)
+            deadline = time.time() + 2
+            while api._single_flight_stats["coalesced"] < coalesced_before + 4 and time.time() < deadline:
+                await asyncio.sleep(0.01)
+            return httpx.Response(200, json={"ok": True})
+
+        client = _client(handler=handler)
+        results = []
+        with patch.object(api, "_get_async_http_client", lambda upstream: client):
+            threads = [
+                threading.Thread(target=lambda: results.append(api._run_sync(api._http_json_async("http://upstream/x", "POST", {"q": "amparo"}))))
+                for _ in range(5)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [(200, {"ok": True})] * 5)
+        self.assertEqual(api._inflight_async, {})
+
+    def test_concurrent_async_calls_share_one_upstream_request(self) -> None:
+        calls = []
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            calls.append(request.url)
+            await asyncio.sleep(0.05)
+            return httpx.Response(200, json={"ok": True})
+
+        async def burst():
+            client = _client(handler=handler)
+            try:
+                with patch.object(api, "_get_async_http_client", lambda upstream: client):
+                    return await asyncio.gather(
+                        *(api._http_json_async("http://upstream/x", "POST", {"q": "amparo"}, use_cache=True) for _ in range(5))
+                    )
+            finally:
+                await client.aclose()
+
+        results = asyncio.run(burst())
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [(200, {"ok": True})] * 5)
+        self.assertEqual(api._inflight_async, {})
+
+    def test_different_bodies_are_not_coalesced(self) -> None:
+        calls = []
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            calls.append(request.content)
+            await asyncio.sleep(0.01)
+            return httpx.Response(200, json={})
+
+        async def burst():
+            client = _client(handler=handler)
+            try:
+                with patch.object(api, "_get_async_http_client", lambda upstream: client):
+                    return await asyncio.gather(
+                        api._http_json_async("http://upstream/x", "POST", {"q": "amparo"}),
+                        api._http_json_async("http://upstream/x", "POST", {"q": "nulidad"}),
+                    )
+            finally:
+                await client.aclose()
+
+        asyncio.run(burst())
+        self.assertEqual(len(calls), 2)
+
+
+class CitasResolutionTests(unittest.TestCase):
+    """Tests for the bounded citation lookups behind /citas/extraer."""
+
+    TEXTO = (
+        "Véanse los artículos 1, 14, 16 y 17 de la Constitución Política de los Estados Unidos Mexicanos "
+        "y el artículo 5 de la Ley Federal del Trabajo."
+    )
+
+    def setUp(self) -> None:
+        api._rate_buckets.clear()
+        self.addCleanup(api._rate_buckets.clear)
+
+    def test_each_citation_is_resolved_once_within_the_concurrency_limit(self) -> None:
+        active = {"now": 0, "peak": 0}
+        resolved = []
+
+        async def resolve(cita: dict) -> dict:
+            resolved.append(id(cita))
+            active["now"] += 1
+            active["peak"] = max(active["peak"], active["now"])
+            await asyncio.sleep(0.01)
+            active["now"] -= 1
+            return {"texto": "t", "referencia": "r"}
+
+        with patch.object(api, "_CITAS_CONCURRENCY", 2), patch.object(api, "_RATE_LIMIT_MAX", 100), patch.object(
+            api, "_resolve_cita_detalle", resolve
+        ):
+            response = TestClient(api.app).post("/citas/extraer", json={"texto": self.TEXTO, "resolver": True})
+        body = response.json()
+        self.assertGreater(body["resumen"]["totalCitas"], 2)
+        self.assertEqual(len(resolved), body["resumen"]["totalCitas"])
+        self.assertEqual(len(set(resolved)), len(resolved))
+        self.assertEqual(active["peak"], 2)
+        self.assertEqual(len(body["reporte"]["articulosCitados"]), body["resumen"]["articulos"])
+
+
+class SjfDetailHedgingTests(unittest.TestCase):
+    """Tests for the hedged SJF detail attempt plans."""
+
+    def setUp(self) -> None:
+        _reset_cache()
+        api._breakers.clear()
+        api._sjf_plan_by_ius.clear()
+        api._sjf_plan_buckets.clear()
+
+    def test_hedged_async_takes_first_success_and_cancels_the_rest(self) -> None:
+        async def handler(request: httpx.Request) -> httpx.Response:
+            if request.url.params.get("isSemanal") == "false" and "hostName" in request.url.params:
+                return httpx.Response(200, json={"rubro": "tesis", "texto": "texto"})
+            await asyncio.sleep(1)
+            return httpx.Response(200, json={"rubro": "lenta"})
+
+        async def run():
+            client = _client(handler=handler)
+            try:
+                with patch.object(api, "_get_async_http_client", lambda upstream: client), patch.object(
+                    api, "_SJF_DETAIL_HEDGE_DELAY_MS", 0
+                ):
+                    return await api._sjf_detail_attempts_async(123, "https://sjf2.scjn.gob.mx", None)
+            finally:
+                await client.aclose()
+
+        started = time.time()
+        result, attempts = asyncio.run(run())
+        self.assertLess(time.time() - started, 0.9)
+        self.assertEqual(result["status"], 200)
+        self.assertFalse(result["isSemanal"])
+        self.assertEqual([attempt["outcome"] for attempt in attempts], ["cancelled", "won", "cancelled", "cancelled"])
+        self.assertEqual(api._pool_snapshot()["sjf"]["inFlight"], 0)
+
+    def test_sync_caller_launches_next_plan_after_delay(self) -> None:
+        async def handler(request: httpx.Request) -> httpx.Response:
+            if request.url.params.get("isSemanal") == "true":
+                await asyncio.sleep(0.3)
+            return httpx.Response(200, json={"rubro": "tesis"})
+
+        client = _client(handler=handler)
+        with patch.object(api, "_get_async_http_client", lambda upstream: client), patch.object(
+            api, "_SJF_DETAIL_HEDGE_DELAY_MS", 50
+        ):
+            result, attempts = api._run_sync(api._sjf_detail_attempts_async(123, "https://sjf2.scjn.gob.mx", None))
+        self.assertFalse(result["isSemanal"])
+        self.assertEqual(len(attempts), 2)
+        self.assertEqual(attempts[0]["outcome"], "cancelled")
+        self.assertEqual(attempts[1]["outcome"], "won")
+        self.assertGreaterEqual(attempts[1]["startedAfterMs"], 40)
+
+    def test_debug_report_lists_race_outcomes(self) -> None:
+        attempts = [
+            {"status": None, "data": None, "url": "u1", "isSemanal": True, "hostNameIncluded": True, "durationMs": 5,
+             "requestHeaders": {}, "outcome": "cancelled", "startedAfterMs": 0},
+            {"status": 200, "data": {"rubro": "x"}, "url": "u2", "isSemanal": False, "hostNameIncluded": True,
+             "durationMs": 3, "requestHeaders": {}, "outcome": "won", "startedAfterMs": 0},
+        ]
+        with patch.object(api, "_SJF_DETAIL_HEDGE_DELAY_MS", 0):
+            response = api._sjf_detail_response(123, "h", False, True, attempts[1], attempts)
+        self.assertEqual(response["debug"]["mode"], {"name": "hedged", "hedgeDelayMs": 0})
+        self.assertEqual([a["outcome"] for a in response["debug"]["attempts"]], ["cancelled", "won"])
+
+
+class SjfPlanMemoryTests(unittest.TestCase):
+    """Tests for the learned SJF detail attempt plans."""
+
+    def setUp(self) -> None:
+        _reset_cache()
+        api._breakers.clear()
+        api._sjf_plan_by_ius.clear()
+        api._sjf_plan_buckets.clear()
+
+    def test_second_lookup_starts_with_learned_plan(self) -> None:
+        urls = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            urls.append(request.url)
+            if request.url.params.get("isSemanal") == "false" and "hostName" not in request.url.params:
+                return httpx.Response(200, json={"rubro": "tesis"})
+            return httpx.Response(404, json={})
+
+        client = _client(handler=handler)
+        with patch.object(api, "_get_async_http_client", lambda upstream: client):
+            _, first_attempts = api._run_sync(api._sjf_detail_attempts_async(2030687, "https://sjf2.scjn.gob.mx", None))
+            result, second_attempts = api._run_sync(api._sjf_detail_attempts_async(2030687, "https://sjf2.scjn.gob.mx", None))
+        self.assertEqual(len(first_attempts), 4)
+        self.assertEqual(len(second_attempts), 1)
+        self.assertEqual((result["isSemanal"], result["hostNameIncluded"]), (False, False))
+
+    def test_bucket_fallback_and_explicit_is_semanal(self) -> None:
+        api._remember_sjf_plan(2030687, (False, True))
+        self.assertEqual(api._sjf_plan_for(2030690), ((False, True), "bucket"))
+        self.assertEqual(api._sjf_detail_plans(None, 2030690)[0], (False, True))
+        self.assertEqual(api._sjf_detail_plans(True, 2030690), [(True, True), (True, False)])
+        self.assertEqual(api._sjf_plan_for(160000), (None, "default"))
+
+    def test_plan_memory_round_trips_through_disk(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = str(Path(tmp) / "plans.json")
+            with patch.object(api, "_SJF_PLAN_MEMORY_PATH", path):
+                api._remember_sjf_plan(2030687, (False, True))
+                api._save_sjf_plan_memory()
+                api._sjf_plan_by_ius.clear()
+                api._sjf_plan_buckets.clear()
+                api._load_sjf_plan_memory()
+        self.assertEqual(api._sjf_plan_for(2030687), ((False, True), "ius"))
+        self.assertEqual(api._sjf_plan_for(2030000), ((False, True), "bucket"))
+
+    def test_periodic_save_runs_off_the_event_loop_with_unique_temp_files(self) -> None:
+        saved_from = []
+
+        def save() -> None:
+            original_save()
+            saved_from.append(threading.current_thread())
+
+        async def run():
+            for ius in range(3):
+                api._remember_sjf_plan(2030000 + ius, (False, True))
+            loop_thread = threading.current_thread()
+            while len(saved_from) < 1:
+                await asyncio.sleep(0.01)
+            return loop_thread
+
+        original_save = api._save_sjf_plan_memory
+        with tempfile.TemporaryDirectory() as tmp:
+            path = str(Path(tmp) / "plans.json")
+            with patch.object(api, "_SJF_PLAN_MEMORY_PATH", path), patch.object(api, "_SJF_PLAN_SAVE_EVERY", 3), patch.object(
+                api, "_save_sjf_plan_memory", save
+            ):
+                loop_thread = asyncio.run(run())
+            self.assertEqual(sorted(p.name for p in Path(tmp).iterdir()), ["plans.json"])
+        self.assertNotIn(loop_thread, saved_from)
+
+
+class RateLimitTests(unittest.TestCase):
+    """Tests for the per-IP token-bucket rate limiter."""
+
+    def setUp(self) -> None:
+        api._rate_buckets.clear()
+        self.addCleanup(api._rate_buckets.clear)
+
+    def test_rejects_when_bucket_is_empty(self) -> None:
+        client = TestClient(api.app)
+        with patch.object(api, "_RATE_LIMIT_MAX", 2), patch.object(api, "_RATE_LIMIT_WINDOW", 60), patch.dict(
+            api._RATE_LIMIT_COSTS, {"/health": 1.0}
+        ):
+            self.assertEqual(client.get("/health").status_code, 200)
+            self.assertEqual(client.get("/health").status_code, 200)
+            response = client.get("/health")
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers["Retry-After"], "30")
+        self.assertEqual(response.json()["retryAfterSeconds"], 30)
+
+    def test_refills_and_forgets_idle_clients(self) -> None:
+        with patch.object(api, "_RATE_LIMIT_MAX", 2), patch.object(api, "_RATE_LIMIT_WINDOW", 60):
+            self.assertTrue(api._rate_limit_take("a", 0.0)[0])
+            self.assertTrue(api._rate_limit_take("a", 0.0)[0])
+            self.assertFalse(api._rate_limit_take("a", 1.0)[0])
+            self.assertTrue(api._rate_limit_take("a", 31.0)[0])
+            api._rate_limit_take("b", 100.0)
+        self.assertEqual(list(api._rate_buckets), ["b"])
+
+    def test_routes_have_costs_and_report_remaining_budget(self) -> None:
+        client = TestClient(api.app)
+        with patch.object(api, "_RATE_LIMIT_MAX", 10), patch.object(api, "_RATE_LIMIT_WINDOW", 10):
+            health = client.get("/health")
+            with patch.object(api, "_http_json_async", AsyncMock(return_value=(500, {}))), patch.object(
+                api, "_http_multipart_async", AsyncMock(return_value=(500, {}))
+            ):
+                deep = client.get("/health/deep")
+        self.assertEqual(health.headers["X-RateLimit-Cost"], "0.2")
+        self.assertEqual(health.headers["X-RateLimit-Remaining"], "9")
+        self.assertEqual(deep.headers["X-RateLimit-Cost"], "3")
+        self.assertEqual(deep.headers["X-RateLimit-Limit"], "10")
+
+    def test_resolved_citations_are_charged_before_resolving(self) -> None:
+        client = TestClient(api.app)
+        texto = "Véase el artículo 14 de la Constitución Política de los Estados Unidos Mexicanos."
+        with patch.object(api, "_RATE_LIMIT_MAX", 50), patch.object(
+            api, "_resolve_cita_detalle", return_value={}
+        ), patch.object(api, "_merge_cita_with_detalle", side_effect=lambda cita, detalle: cita):
+            response = client.post("/citas/extraer", json={"texto": texto, "resolver": True})
+            citas = response.json()["resumen"]["totalCitas"]
+        self.assertGreater(citas, 0)
+        self.assertEqual(response.headers["X-RateLimit-Cost"], f"{1 + citas:g}")
+        self.assertLessEqual(api._rate_buckets["testclient"][0], 50 - 1 - citas + 0.1)
+
+    def test_citations_that_exceed_the_budget_are_rejected_without_resolving(self) -> None:
+        client = TestClient(api.app)
+        texto = "Véanse los artículos 14 y 16 de la Constitución Política de los Estados Unidos Mexicanos."
+        with patch.object(api, "_RATE_LIMIT_MAX", 4), patch.object(api, "_resolve_cita_detalle", return_value={}) as resolve:
+            response = client.post("/citas/extraer", json={"texto": texto, "resolver": True})
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response.headers)
+        resolve.assert_not_called()
+        self.assertGreaterEqual(api._rate_buckets["testclient"][0], 0)
+
+    JURIS_TEXTO = (
+        "Conforme a la jurisprudencia 2a./J. 15/2020 (10a.) y la tesis aislada 1a. CCX/2019 (10a.), "
+        "así como el artículo 14 de la Constitución Política de los Estados Unidos Mexicanos."
+    )
+
+    def test_jurisprudence_lookups_are_charged_before_calling_sjf(self) -> None:
+        calls = []
+        upstream = _client(200, {"documents": [], "total": 0, "totalPages": 0}, calls=calls)
+        with patch.object(api, "_RATE_LIMIT_MAX", 5), patch.object(
+            api, "_get_async_http_client", lambda name: upstream
+        ), patch.object(api, "_resolve_cita_detalle", return_value=None) as resolve:
+            response = TestClient(api.app).post("/citas/extraer", json={"texto": self.JURIS_TEXTO, "resolver": True})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.json()["requestedCost"], 5)
+        self.assertEqual(response.headers["X-RateLimit-Cost"], "1")
+        self.assertEqual(calls, [])
+        resolve.assert_not_called()
+
+    def test_cost_above_capacity_is_rejected_instead_of_clamped(self) -> None:
+        calls = []
+        upstream = _client(200, {"documents": [], "total": 0, "totalPages": 0}, calls=calls)
+        with patch.object(api, "_RATE_LIMIT_MAX", 3), patch.object(api, "_get_async_http_client", lambda name: upstream):
+            response = TestClient(api.app).post("/citas/extraer", json={"texto": self.JURIS_TEXTO, "resolver": True})
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(response.json()["requestedCost"], 5)
+        self.assertEqual(calls, [])
+        self.assertEqual(api._rate_buckets["testclient"][0], 2)
+
+    def test_enrichment_without_resolver_is_charged(self) -> None:
+        upstream = _client(200, {"documents": [], "total": 0, "totalPages": 0})
+        with patch.object(api, "_RATE_LIMIT_MAX", 10), patch.object(api, "_get_async_http_client", lambda name: upstream):
+            response = TestClient(api.app).post("/citas/extraer", json={"texto": self.JURIS_TEXTO})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["X-RateLimit-Cost"], "3")
+
+    def test_post_body_size_adds_cost(self) -> None:
+        scope = {"path": "/documentos/extraer-texto", "method": "POST", "headers": [(b"content-length", b"200000")]}
+        with patch.object(api, "_RATE_LIMIT_BYTES_PER_TOKEN", 65536):
+            self.assertEqual(api._rate_limit_cost(scope), 4.0)
+
+
+class RateLimitStoreTests(unittest.TestCase):
+    """Tests for the shared rate-limit stores and their local fallback."""
+
+    def setUp(self) -> None:
+        api._rate_buckets.clear()
+        api._rate_store_state.update(retryAt=0.0, errors=0)
+        self.addCleanup(api._rate_buckets.clear)
+        for name, value in (("_RATE_LIMIT_MAX", 2), ("_RATE_LIMIT_WINDOW", 60)):
+            patcher = patch.object(api, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _acquire(self, client: str = "1.2.3.4", cost: float = 1.0) -> bool:
+        return asyncio.run(api._rate_limit_acquire(client, cost))[0]
+
+    def _reset_sqlite(self) -> None:
+        if api._rate_sqlite_conn is not None:
+            api._rate_sqlite_conn.close()
+        api._rate_sqlite_conn = None
+
+    def test_sqlite_store_is_shared_between_workers(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.addCleanup(self._reset_sqlite)
+        with patch.object(api, "_RATE_LIMIT_SQLITE_PATH", str(Path(tmp.name) / "rate.sqlite")):
+            self.assertTrue(self._acquire())
+            self._reset_sqlite()  # otro worker: conexion nueva, buckets locales vacios
+            self.assertTrue(self._acquire())
+            self.assertFalse(self._acquire())
+        self.assertEqual(api._rate_buckets, {})
+
+    def test_redis_store_is_shared_between_replicas(self) -> None:
+        redis = FakeRedis()
+        with patch.object(api, "_RATE_LIMIT_STORE", "redis"), patch.object(api, "_rate_redis_client", redis):
+            self.assertTrue(self._acquire())
+            self.assertTrue(self._acquire())
+            self.assertFalse(self._acquire())
+            self.assertTrue(self._acquire("5.6.7.8"))
+        self.assertEqual(set(redis.hashes), {"ordina:rate:1.2.3.4", "ordina:rate:5.6.7.8"})
+
+    def test_unavailable_store_falls_back_to_local_buckets(self) -> None:
+        class DownRedis(FakeRedis):
+            def eval(self, *args):
+                raise ConnectionError("down")
+
+        redis = DownRedis()
+        with patch.object(api, "_RATE_LIMIT_STORE", "redis"), patch.object(api, "_rate_redis_client", redis), patch.object(
+            redis, "eval", wraps=redis.eval
+        ) as store_eval:
+            self.assertTrue(self._acquire())
+            self.assertTrue(self._acquire())
+            self.assertFalse(self._acquire())
+        self.assertEqual(store_eval.call_count, 1)
+        self.assertEqual(api._rate_store_state["errors"], 1)
+        self.assertIn("1.2.3.4", api._rate_buckets)
+
+
 class McpSuffixTests(unittest.TestCase):
     """Tests for article suffix extraction and matching."""
 